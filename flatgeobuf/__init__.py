@@ -3,3 +3,5 @@ from flatgeobuf.geojson.reader import Reader  # noqa: F401
 from flatgeobuf.geojson.reader import load  # noqa: F401
 from flatgeobuf.geojson.reader import load_http_async  # noqa: F401
 from flatgeobuf.geojson.reader import load_http  # noqa: F401
+from flatgeobuf.geojson.writer import dump  # noqa: F401
+from flatgeobuf.geojson.writer import dumps  # noqa: F401
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import math
+import threading
+from collections import deque
+from logging import getLogger
+from typing import Deque, Iterable, List, Tuple, Union
+
+import numpy as np
+
+from flatgeobuf.config import Config
+
+logger = getLogger(__name__)
+
+FeatureRange = Tuple[int, int]
+Batch = List[FeatureRange]
+
+# Completed fetches the adaptive policy estimates latency and throughput from
+ADAPTIVE_WINDOW = 256
+# Fetches needed before the estimate replaces the configured threshold
+ADAPTIVE_MIN_SAMPLES = 8
+
+
+def build_batches(
+    feature_ranges: Iterable[Tuple[int, Union[int, None]]],
+    extra_request_threshold: Union[float, None] = None,
+    max_batch_bytes: Union[float, None] = None,
+) -> List[Batch]:
+    """Group (offset, length) feature ranges into batches fetched by one request each.
+
+    Gaps larger than `extra_request_threshold` (by default the configured one)
+    start a new batch, and so do features that would take a batch past
+    `max_batch_bytes` (by default unbounded) from its first byte.
+    """
+    if extra_request_threshold is None:
+        extra_request_threshold = Config.global_instance.extra_request_threshold()
+    if max_batch_bytes is None:
+        max_batch_bytes = math.inf
+
+    batches: List[Batch] = []
+    current_batch: Batch = []
+
+    for feature_offset, feature_length in feature_ranges:
+        if not feature_length:
+            logger.info("final feature")
+            # Normally we get the feature length by subtracting between
+            # adjacent nodes from the index, which we can't do for the
+            # _very_ last feature in a dataset.
+            #
+            # We could *guess* the size, but we'd risk overshooting the length,
+            # which will cause some webservers to return HTTP 416: Unsatisfiable range
+            #
+            # So instead we fetch only the final features byte length, stored in the
+            # first 4 bytes.
+            feature_length = 4
+
+        if not current_batch:
+            current_batch.append((feature_offset, feature_length))
+            continue
+
+        prev_feature = current_batch[-1]
+        gap = feature_offset - (prev_feature[0] + prev_feature[1])
+
+        batch_bytes = feature_offset + feature_length - current_batch[0][0]
+
+        if gap > extra_request_threshold:
+            logger.info(
+                f"Pushing new feature batch, since gap {gap} was too large",
+            )
+            batches.append(current_batch)
+            current_batch = []
+        elif batch_bytes > max_batch_bytes:
+            logger.info(
+                f"Pushing new feature batch, since it would span {batch_bytes} bytes",
+            )
+            batches.append(current_batch)
+            current_batch = []
+
+        current_batch.append((feature_offset, feature_length))
+
+    if current_batch:
+        batches.append(current_batch)
+
+    return batches
+
+
+def group_batches(batches: List[Batch], max_batches: int) -> List[List[Batch]]:
+    """Split batches into consecutive groups fetched by one request each, as
+    a multi-range request when a group holds several batches."""
+    return [batches[i : i + max_batches] for i in range(0, len(batches), max_batches)]
+
+
+class BatchingPolicy:
+    """How far apart ranges of a reader may be and still share a request, and
+    how large a batch may get.
+
+    Thresholds left as None are the configured ones, read on each use.
+    """
+
+    def __init__(
+        self,
+        extra_request_threshold: float | None = None,
+        max_batch_bytes: float | None = None,
+    ):
+        self._extra_request_threshold = extra_request_threshold
+        self._max_batch_bytes = max_batch_bytes
+
+    @staticmethod
+    def from_config() -> BatchingPolicy:
+        if Config.global_instance.adaptive_batching():
+            return AdaptiveBatchingPolicy()
+        return BatchingPolicy()
+
+    def extra_request_threshold(self) -> float:
+        if self._extra_request_threshold is None:
+            return Config.global_instance.extra_request_threshold()
+        return self._extra_request_threshold
+
+    def max_batch_bytes(self) -> float:
+        if self._max_batch_bytes is None:
+            return Config.global_instance.max_batch_bytes()
+        return self._max_batch_bytes
+
+    def record(self, length: int, seconds: float) -> None:
+        """Note a completed fetch of `length` bytes."""
+
+    def build_batches(
+        self,
+        feature_ranges: Iterable[Tuple[int, Union[int, None]]],
+        extra_request_threshold: float | None = None,
+    ) -> List[Batch]:
+        if extra_request_threshold is None:
+            extra_request_threshold = self.extra_request_threshold()
+        return build_batches(
+            feature_ranges, extra_request_threshold, self.max_batch_bytes()
+        )
+
+
+class AdaptiveBatchingPolicy(BatchingPolicy):
+    """Sets the gap threshold from the fetches of the reader as they complete.
+
+    Fetch times are fitted as `latency + length / throughput`. Reading over
+    a gap costs `gap / throughput`, and splitting the request instead costs
+    another `latency`, so the total expected time is least with gaps up to
+    `latency * throughput` read over. Until enough fetches have completed,
+    or when they don't tell latency and throughput apart, the configured
+    threshold is used. The threshold never exceeds the batch size cap.
+    """
+
+    def __init__(
+        self,
+        max_batch_bytes: float | None = None,
+        window: int = ADAPTIVE_WINDOW,
+    ):
+        super().__init__(None, max_batch_bytes)
+        # (length, seconds) of the most recent fetches
+        self.samples: Deque[Tuple[int, float]] = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, length: int, seconds: float) -> None:
+        with self.lock:
+            self.samples.append((length, seconds))
+
+    def estimate(self) -> Tuple[float, float] | None:
+        """Latency in seconds and throughput in bytes per second, if known."""
+        with self.lock:
+            samples = np.array(self.samples, dtype=np.float64)
+        if len(samples) < ADAPTIVE_MIN_SAMPLES:
+            return None
+        lengths = samples[:, 0]
+        seconds = samples[:, 1]
+        if np.ptp(lengths) == 0:
+            return None
+
+        # Least squares fit of seconds = latency + length * seconds_per_byte
+        seconds_per_byte, latency = np.polyfit(lengths, seconds, 1)
+        latency = max(float(latency), 0.0)
+        if seconds_per_byte <= 0:
+            # Transfer time is lost in the noise of the latency
+            return latency, math.inf
+        return latency, 1.0 / float(seconds_per_byte)
+
+    def extra_request_threshold(self) -> float:
+        estimate = self.estimate()
+        if estimate is None:
+            return super().extra_request_threshold()
+        latency, throughput = estimate
+        threshold = latency * throughput if latency > 0 else 0.0
+        return min(threshold, self.max_batch_bytes())
@@ -1,5 +1,9 @@
+import math
+from typing import Tuple
+
 from geojson import Feature
 
+from flatgeobuf.FlatGeobuf.Geometry import Geometry
 from flatgeobuf.packedrtree import Rect
 
 try:
@@ -28,3 +32,33 @@ class BBoxFilter:
         shape = shapely.geometry.shape(feature.geometry)
 
         return self.prep_bbox.intersects(shape)
+
+
+def geometry_bbox(geometry: Geometry) -> Tuple[float, float, float, float]:
+    """Bounding box of a Geometry, inverted and infinite when it is empty."""
+    if geometry.PartsLength() > 0:
+        bboxes = [
+            geometry_bbox(geometry.Parts(i)) for i in range(geometry.PartsLength())
+        ]
+        return (
+            min(bbox[0] for bbox in bboxes),
+            min(bbox[1] for bbox in bboxes),
+            max(bbox[2] for bbox in bboxes),
+            max(bbox[3] for bbox in bboxes),
+        )
+
+    xy = geometry.XyAsNumpy()
+    if isinstance(xy, int) or len(xy) == 0:
+        return (math.inf, math.inf, -math.inf, -math.inf)
+
+    coordinates = xy.reshape(-1, 2)
+    min_x, min_y = coordinates.min(axis=0).tolist()
+    max_x, max_y = coordinates.max(axis=0).tolist()
+    return (min_x, min_y, max_x, max_y)
+
+
+def bbox_intersects(bbox: Tuple[float, float, float, float], rect: Rect) -> bool:
+    min_x, min_y, max_x, max_y = rect
+    return not (
+        max_x < bbox[0] or max_y < bbox[1] or min_x > bbox[2] or min_y > bbox[3]
+    )
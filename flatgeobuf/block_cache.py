@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Union
+
+from flatgeobuf.config import Config
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class BlockCache:
+    """LRU cache of fixed-size, aligned blocks of a file, under a byte budget.
+
+    One cache is shared by the header, index and feature clients of a reader,
+    so that alternating index and feature reads, or interleaved batches, are
+    served from memory instead of refetching the same bytes. The last block
+    of a fetch may be short; it only serves ranges it covers.
+
+    Readers of local files, which the OS already caches, and of memory maps
+    don't use one.
+    """
+
+    def __init__(self, block_size: int, max_bytes: int):
+        if block_size <= 0:
+            raise ValueError("block_size must be positive")
+        self.block_size = block_size
+        self.max_bytes = max_bytes
+        self.blocks: OrderedDict[int, bytes] = OrderedDict()
+        self.bytes_held = 0
+        # Size of the file, once a fetch has come back short
+        self.size: int | None = None
+        self.hits = 0
+        self.misses = 0
+        # Readers fetching batches on a thread pool share the cache
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def from_config() -> BlockCache | None:
+        config = Config.global_instance
+        if config.block_cache_max_bytes() == 0:
+            return None
+        return BlockCache(config.block_size(), config.block_cache_max_bytes())
+
+    def block_start(self, offset: int) -> int:
+        return offset - offset % self.block_size
+
+    def read(self, start: int, length: int) -> Buffer | None:
+        """The range if all its blocks are held, None otherwise."""
+        with self.lock:
+            return self._read(start, length)
+
+    def store(self, begin: int, data: Buffer, requested_length: int) -> None:
+        """Keep the blocks of `data`, fetched from the block aligned `begin`."""
+        with self.lock:
+            self._store(begin, data, requested_length)
+
+    def _read(self, start: int, length: int) -> Buffer | None:
+        end = start + length
+        if self.size is not None:
+            end = min(end, self.size)
+        if end <= start:
+            self.hits += 1
+            return b""
+
+        first_block = start // self.block_size
+        last_block = (end - 1) // self.block_size
+        parts = []
+        for block in range(first_block, last_block + 1):
+            data = self.blocks.get(block)
+            block_start = block * self.block_size
+            needed = min(end, block_start + self.block_size) - block_start
+            if data is None or len(data) < needed:
+                self.misses += 1
+                return None
+            parts.append(memoryview(data)[max(start - block_start, 0) : needed])
+
+        for block in range(first_block, last_block + 1):
+            self.blocks.move_to_end(block)
+        self.hits += 1
+
+        if len(parts) == 1:
+            return parts[0]
+        return b"".join(parts)
+
+    def _store(self, begin: int, data: Buffer, requested_length: int) -> None:
+        if len(data) < requested_length:
+            self.size = begin + len(data)
+
+        # A fetch larger than the whole budget would only evict itself
+        if len(data) > self.max_bytes:
+            return
+
+        for i in range(0, len(data), self.block_size):
+            block = (begin + i) // self.block_size
+            chunk = data[i : i + self.block_size]
+            held = self.blocks.get(block)
+            if held is not None:
+                self.blocks.move_to_end(block)
+                if len(held) >= len(chunk):
+                    continue
+                self.bytes_held -= len(held)
+            self.blocks[block] = bytes(chunk)
+            self.bytes_held += len(chunk)
+
+        while self.bytes_held > self.max_bytes:
+            _, evicted = self.blocks.popitem(last=False)
+            self.bytes_held -= len(evicted)
@@ -6,6 +6,27 @@ class Config:
 
     def __init__(self):
         self._extra_request_threshold = 256 * 1024
+        self._scan_chunk_size = 4 * 1024 * 1024
+        self._index_prefetch_levels = 3
+        self._index_prefetch_max_bytes = 0
+        self._block_size = 64 * 1024
+        self._block_cache_max_bytes = 16 * 1024 * 1024
+        self._fetch_concurrency = 4
+        self._max_bytes_in_flight = 64 * 1024 * 1024
+        self._http_max_connections_per_host = 8
+        self._http_timeout = 30.0
+        self._http_retries = 3
+        self._http_retry_backoff = 0.1
+        self._http_hedge_percentile = None
+        self._max_ranges_per_request = 16
+        self._max_batch_bytes = 16 * 1024 * 1024
+        self._adaptive_batching = False
+        self._disk_cache_dir = None
+        self._disk_cache_max_bytes = 1024 * 1024 * 1024
+        self._disk_cache_max_age = 3600.0
+        # NOTE: Off by default, as files replaced within the TTL go unnoticed
+        self._reader_state_cache_max_entries = 0
+        self._reader_state_ttl = 300.0
 
     def extra_request_threshold(self):
         return self._extra_request_threshold
@@ -15,5 +36,171 @@ class Config:
             raise ValueError("extra_request_threshold cannot be negative")
         self._extra_request_threshold = bytes
 
+    def scan_chunk_size(self):
+        return self._scan_chunk_size
+
+    def set_scan_chunk_size(self, bytes):
+        if bytes <= 0:
+            raise ValueError("scan_chunk_size must be positive")
+        self._scan_chunk_size = bytes
+
+    def index_prefetch_levels(self):
+        return self._index_prefetch_levels
+
+    def set_index_prefetch_levels(self, levels):
+        if levels < 0:
+            raise ValueError("index_prefetch_levels cannot be negative")
+        self._index_prefetch_levels = levels
+
+    def index_prefetch_max_bytes(self):
+        return self._index_prefetch_max_bytes
+
+    def set_index_prefetch_max_bytes(self, bytes):
+        if bytes < 0:
+            raise ValueError("index_prefetch_max_bytes cannot be negative")
+        self._index_prefetch_max_bytes = bytes
+
+    def block_size(self):
+        return self._block_size
+
+    def set_block_size(self, bytes):
+        if bytes <= 0:
+            raise ValueError("block_size must be positive")
+        self._block_size = bytes
+
+    def block_cache_max_bytes(self):
+        return self._block_cache_max_bytes
+
+    def set_block_cache_max_bytes(self, bytes):
+        # NOTE: 0 disables the block cache
+        if bytes < 0:
+            raise ValueError("block_cache_max_bytes cannot be negative")
+        self._block_cache_max_bytes = bytes
+
+    def fetch_concurrency(self):
+        return self._fetch_concurrency
+
+    def set_fetch_concurrency(self, requests):
+        # NOTE: 1 fetches batches one after another, as they are read
+        if requests < 1:
+            raise ValueError("fetch_concurrency must be at least 1")
+        self._fetch_concurrency = requests
+
+    def max_bytes_in_flight(self):
+        return self._max_bytes_in_flight
+
+    def set_max_bytes_in_flight(self, bytes):
+        if bytes <= 0:
+            raise ValueError("max_bytes_in_flight must be positive")
+        self._max_bytes_in_flight = bytes
+
+    def http_max_connections_per_host(self):
+        return self._http_max_connections_per_host
+
+    def set_http_max_connections_per_host(self, connections):
+        if connections < 1:
+            raise ValueError("http_max_connections_per_host must be at least 1")
+        self._http_max_connections_per_host = connections
+
+    def http_timeout(self):
+        return self._http_timeout
+
+    def set_http_timeout(self, seconds):
+        if seconds <= 0:
+            raise ValueError("http_timeout must be positive")
+        self._http_timeout = seconds
+
+    def http_retries(self):
+        return self._http_retries
+
+    def set_http_retries(self, retries):
+        # NOTE: 0 fails on the first transient error
+        if retries < 0:
+            raise ValueError("http_retries cannot be negative")
+        self._http_retries = retries
+
+    def http_retry_backoff(self):
+        return self._http_retry_backoff
+
+    def set_http_retry_backoff(self, seconds):
+        if seconds < 0:
+            raise ValueError("http_retry_backoff cannot be negative")
+        self._http_retry_backoff = seconds
+
+    def http_hedge_percentile(self):
+        return self._http_hedge_percentile
+
+    def set_http_hedge_percentile(self, percentile):
+        # NOTE: None disables hedging
+        if percentile is not None and not 0 < percentile <= 100:
+            raise ValueError("http_hedge_percentile must be within (0, 100]")
+        self._http_hedge_percentile = percentile
+
+    def max_ranges_per_request(self):
+        return self._max_ranges_per_request
+
+    def set_max_ranges_per_request(self, ranges):
+        # NOTE: 1 disables multi-range requests
+        if ranges < 1:
+            raise ValueError("max_ranges_per_request must be at least 1")
+        self._max_ranges_per_request = ranges
+
+    def max_batch_bytes(self):
+        return self._max_batch_bytes
+
+    def set_max_batch_bytes(self, bytes):
+        if bytes <= 0:
+            raise ValueError("max_batch_bytes must be positive")
+        self._max_batch_bytes = bytes
+
+    def adaptive_batching(self):
+        return self._adaptive_batching
+
+    def set_adaptive_batching(self, enabled):
+        # NOTE: readers then set their extra request threshold from the latency
+        # and throughput of their own requests
+        self._adaptive_batching = enabled
+
+    def disk_cache_dir(self):
+        return self._disk_cache_dir
+
+    def set_disk_cache_dir(self, path):
+        # NOTE: None disables the disk cache
+        self._disk_cache_dir = path
+
+    def disk_cache_max_bytes(self):
+        return self._disk_cache_max_bytes
+
+    def set_disk_cache_max_bytes(self, bytes):
+        if bytes < 0:
+            raise ValueError("disk_cache_max_bytes cannot be negative")
+        self._disk_cache_max_bytes = bytes
+
+    def disk_cache_max_age(self):
+        return self._disk_cache_max_age
+
+    def set_disk_cache_max_age(self, seconds):
+        # NOTE: 0 revalidates cached ranges with a request every time
+        if seconds < 0:
+            raise ValueError("disk_cache_max_age cannot be negative")
+        self._disk_cache_max_age = seconds
+
+    def reader_state_cache_max_entries(self):
+        return self._reader_state_cache_max_entries
+
+    def set_reader_state_cache_max_entries(self, entries):
+        # NOTE: 0 disables the reader state cache
+        if entries < 0:
+            raise ValueError("reader_state_cache_max_entries cannot be negative")
+        self._reader_state_cache_max_entries = entries
+
+    def reader_state_ttl(self):
+        return self._reader_state_ttl
+
+    def set_reader_state_ttl(self, seconds):
+        if seconds < 0:
+            raise ValueError("reader_state_ttl cannot be negative")
+        self._reader_state_ttl = seconds
+
 
 Config.global_instance = Config()
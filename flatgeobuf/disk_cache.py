@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+from logging import getLogger
+from typing import List, Tuple
+
+from flatgeobuf.config import Config
+
+logger = getLogger(__name__)
+
+SEGMENT_SUFFIX = ".bin"
+META_FILE = "meta.json"
+
+# Segments never span these aligned blocks of a resource, which bounds what
+# storing a range rewrites.
+BLOCK_SIZE = 256 * 1024
+# Eviction goes this far below max_bytes, so that the directory is only
+# scanned once in a while.
+EVICT_TO = 0.9
+
+# (begin, end, path) of a cached segment of a resource
+Segment = Tuple[int, int, str]
+
+
+@dataclass
+class Validators:
+    """What identifies a version of a remote file."""
+
+    etag: str | None = None
+    last_modified: str | None = None
+    size: int | None = None
+
+    def matches(self, other: Validators) -> bool:
+        # Only compare what both responses reported
+        return all(
+            mine is None or theirs is None or mine == theirs
+            for mine, theirs in [
+                (self.etag, other.etag),
+                (self.last_modified, other.last_modified),
+                (self.size, other.size),
+            ]
+        )
+
+
+class DiskRangeCache:
+    """Byte ranges of remote files, kept in a local directory across processes.
+
+    Each URL gets a directory of segment files named `<begin>-<end>.bin`,
+    and the validators (ETag, Last-Modified and size) of the version they
+    belong to. Stored ranges are split at `block_size` aligned boundaries,
+    and merged with the overlapping and adjacent segments of the same block.
+    A response reporting other validators drops the cached segments of the
+    URL. Cached ranges are served without any request for `max_age` seconds
+    after the URL was last validated by a response, and least recently used
+    segments are evicted beyond `max_bytes` in total.
+
+    The total is tracked as segments are written and removed, and only
+    recounted from the directory when it goes over `max_bytes`, which also
+    catches up with what other processes stored meanwhile.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int,
+        max_age: float,
+        block_size: int = BLOCK_SIZE,
+    ):
+        if block_size <= 0:
+            raise ValueError("block_size must be positive")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.block_size = block_size
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Bytes in segment files, counted on the first store
+        self.total_bytes: int | None = None
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def from_config() -> DiskRangeCache | None:
+        config = Config.global_instance
+        directory = config.disk_cache_dir()
+        if directory is None:
+            return None
+        return DiskRangeCache(
+            directory, config.disk_cache_max_bytes(), config.disk_cache_max_age()
+        )
+
+    def resource_dir(self, url: str) -> str:
+        return os.path.join(
+            self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest()
+        )
+
+    def read_meta(self, url: str) -> dict | None:
+        try:
+            with open(os.path.join(self.resource_dir(url), META_FILE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def write_meta(self, url: str, meta: dict) -> None:
+        self._write_atomic(
+            os.path.join(self.resource_dir(url), META_FILE),
+            json.dumps(meta).encode("utf-8"),
+        )
+
+    def segments(self, url: str) -> List[Segment]:
+        resource_dir = self.resource_dir(url)
+        try:
+            names = os.listdir(resource_dir)
+        except FileNotFoundError:
+            return []
+
+        segments = []
+        for name in names:
+            if not name.endswith(SEGMENT_SUFFIX):
+                continue
+            begin, _, end = name[: -len(SEGMENT_SUFFIX)].partition("-")
+            segments.append((int(begin), int(end), os.path.join(resource_dir, name)))
+        return sorted(segments)
+
+    def block_start(self, offset: int) -> int:
+        return offset - offset % self.block_size
+
+    def read(self, url: str, begin: int, length: int) -> bytes | None:
+        """The range, if cached and validated within max_age, None otherwise."""
+        with self.lock:
+            data = self._read(url, begin, length)
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    def _read(self, url: str, begin: int, length: int) -> bytes | None:
+        meta = self.read_meta(url)
+        if meta is None or time.time() - meta["validated_at"] > self.max_age:
+            return None
+
+        end = begin + length
+        size = meta["validators"]["size"]
+        if size is not None:
+            end = min(end, size)
+        if end <= begin:
+            return b""
+
+        segments = self.segments(url)
+        parts = []
+        for block_begin in range(self.block_start(begin), end, self.block_size):
+            part_begin = max(begin, block_begin)
+            part_end = min(end, block_begin + self.block_size)
+            part = self._read_part(segments, part_begin, part_end)
+            if part is None:
+                return None
+            parts.append(part)
+        return b"".join(parts)
+
+    def _read_part(self, segments: List[Segment], begin: int, end: int) -> bytes | None:
+        for segment_begin, segment_end, path in segments:
+            if segment_begin <= begin and end <= segment_end:
+                try:
+                    with open(path, "rb") as f:
+                        f.seek(begin - segment_begin)
+                        data = f.read(end - begin)
+                    # Recently read segments are the last to be evicted
+                    os.utime(path)
+                except FileNotFoundError:
+                    # Merged or evicted by another process meanwhile
+                    return None
+                return data
+        return None
+
+    def store(self, url: str, begin: int, data: bytes, validators: Validators) -> None:
+        """Keep a range fetched in a response with the given validators."""
+        with self.lock:
+            self._validate(url, validators)
+            if data:
+                self._store(url, begin, data)
+                self._evict()
+
+    def _validate(self, url: str, validators: Validators) -> None:
+        meta = self.read_meta(url)
+        if meta is not None:
+            cached = Validators(**meta["validators"])
+            if not cached.matches(validators):
+                logger.info(f"{url} changed, dropping its cached ranges")
+                for begin, end, path in self.segments(url):
+                    self._remove_segment(begin, end, path)
+                meta = None
+
+        os.makedirs(self.resource_dir(url), exist_ok=True)
+        if meta is not None:
+            # Keep what earlier responses reported and this one didn't
+            cached_validators = meta["validators"]
+            for name, value in asdict(validators).items():
+                if value is not None:
+                    cached_validators[name] = value
+        else:
+            meta = {"url": url, "validators": asdict(validators)}
+        meta["validated_at"] = time.time()
+        self.write_meta(url, meta)
+
+    def _store(self, url: str, begin: int, data: bytes) -> None:
+        segments = self.segments(url)
+        end = begin + len(data)
+        for block_begin in range(self.block_start(begin), end, self.block_size):
+            part_begin = max(begin, block_begin)
+            part_end = min(end, block_begin + self.block_size)
+            self._store_part(
+                url,
+                segments,
+                part_begin,
+                memoryview(data)[part_begin - begin : part_end - begin],
+            )
+
+    def _store_part(
+        self, url: str, segments: List[Segment], begin: int, data: memoryview
+    ) -> None:
+        # Merges the part with the segments of its block that it overlaps or
+        # touches.
+        end = begin + len(data)
+        block_begin = self.block_start(begin)
+        merged = [
+            segment
+            for segment in segments
+            if self.block_start(segment[0]) == block_begin
+            and segment[0] <= end
+            and begin <= segment[1]
+        ]
+
+        merged_begin = min([begin] + [segment[0] for segment in merged])
+        merged_end = max([end] + [segment[1] for segment in merged])
+        buffer = bytearray(merged_end - merged_begin)
+        for segment_begin, segment_end, path in merged:
+            try:
+                with open(path, "rb") as f:
+                    buffer[
+                        segment_begin - merged_begin : segment_end - merged_begin
+                    ] = f.read()
+            except FileNotFoundError:
+                pass
+        buffer[begin - merged_begin : end - merged_begin] = data
+
+        path = os.path.join(
+            self.resource_dir(url), f"{merged_begin}-{merged_end}{SEGMENT_SUFFIX}"
+        )
+        replaced = any(merged_path == path for _, _, merged_path in merged)
+        self._write_atomic(path, buffer)
+        if not replaced:
+            self._count(len(buffer))
+        for segment_begin, segment_end, segment_path in merged:
+            if segment_path != path:
+                self._remove_segment(segment_begin, segment_end, segment_path)
+
+    def _count(self, delta: int) -> None:
+        if self.total_bytes is None:
+            self.total_bytes = sum(size for _, size, _ in self._scan())
+        else:
+            self.total_bytes += delta
+
+    def _scan(self) -> List[Tuple[float, int, str]]:
+        # (mtime, size, path) of every segment in the directory
+        segments = []
+        for resource in os.listdir(self.directory):
+            resource_dir = os.path.join(self.directory, resource)
+            if not os.path.isdir(resource_dir):
+                continue
+            for name in os.listdir(resource_dir):
+                if name.endswith(SEGMENT_SUFFIX):
+                    path = os.path.join(resource_dir, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    segments.append((stat.st_mtime, stat.st_size, path))
+        return segments
+
+    def _evict(self) -> None:
+        self._count(0)
+        if self.total_bytes <= self.max_bytes:
+            return
+
+        segments = self._scan()
+        total = sum(size for _, size, _ in segments)
+        target = self.max_bytes * EVICT_TO
+        for _, size, path in sorted(segments):
+            if total <= target:
+                break
+            self._remove(path)
+            total -= size
+        self.total_bytes = total
+
+    def _write_atomic(self, path: str, data: bytes) -> None:
+        # Written aside and renamed, so that other processes never see a
+        # partial file.
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def _remove_segment(self, begin: int, end: int, path: str) -> None:
+        if self._remove(path):
+            self._count(-(end - begin))
+
+    def _remove(self, path: str) -> bool:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
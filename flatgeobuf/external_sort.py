@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import heapq
+import os
+import shutil
+import struct
+import tempfile
+from logging import getLogger
+from typing import BinaryIO, Generator, List, Tuple
+
+import numpy as np
+
+from flatgeobuf.constants import SIZE_PREFIX_LEN
+from flatgeobuf.packedrtree import hilbert_values
+
+logger = getLogger(__name__)
+
+Bbox = Tuple[float, float, float, float]
+# (bbox, size-prefixed feature)
+SortedFeature = Tuple[Bbox, bytes]
+
+# Each spilled feature is stored as its Hilbert key and bbox, followed by the
+# size-prefixed feature flatbuffer. Staged (not yet sorted) features have no
+# meaningful key.
+SPILL_RECORD = struct.Struct("<I4d")
+
+# Maximum number of runs merged at once, to bound open files and read buffers
+MERGE_FAN_IN = 64
+
+MIN_READ_BUFFER_SIZE = 64 * 1024
+
+
+class SpillStore:
+    """Encoded features spilled to temporary files, merged back in Hilbert order.
+
+    Features whose Hilbert keys can be computed (the extent is known) are
+    written as sorted runs. Otherwise they are staged as written, and cut
+    into sorted runs by `sort_staged` once the extent is known.
+    """
+
+    def __init__(self, memory_budget: int, temp_dir: str | None = None):
+        self.memory_budget = memory_budget
+        self.temp_dir = tempfile.mkdtemp(prefix="flatgeobuf-", dir=temp_dir)
+        self.runs: List[str] = []
+        self.staging: BinaryIO | None = None
+        self.spilled_bytes = 0
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.temp_dir, name)
+
+    def cleanup(self) -> None:
+        if self.staging is not None:
+            self.staging.close()
+            self.staging = None
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def spill_sorted(
+        self, features: List[bytes], bboxes: List[Bbox], extent: Bbox
+    ) -> None:
+        keys = hilbert_values(np.array(bboxes, dtype=np.float64), extent)
+        order = np.argsort(-keys.astype(np.int64), kind="stable").tolist()
+        keys = keys.tolist()
+
+        path = self._path(f"run-{len(self.runs)}")
+        with open(path, "wb") as run:
+            for i in order:
+                run.write(SPILL_RECORD.pack(keys[i], *bboxes[i]))
+                run.write(features[i])
+            self.spilled_bytes += run.tell()
+        self.runs.append(path)
+        logger.debug(f"spilled run {len(self.runs) - 1} of {len(features)} features")
+
+    def spill_unsorted(self, features: List[bytes], bboxes: List[Bbox]) -> None:
+        if self.staging is None:
+            self.staging = open(self._path("staging"), "w+b")
+        for feature, bbox in zip(features, bboxes):
+            self.spilled_bytes += self.staging.write(SPILL_RECORD.pack(0, *bbox))
+            self.spilled_bytes += self.staging.write(feature)
+
+    def staged(self) -> Generator[bytes, None, None]:
+        """Staged features, in the order they were written."""
+        if self.staging is None:
+            return
+        self.staging.seek(0)
+        for _, _, feature in _read_records(self.staging):
+            yield feature
+
+    def sort_staged(self, extent: Bbox) -> None:
+        """Cut the staged features into sorted runs, a memory budget at a time."""
+        if self.staging is None:
+            return
+
+        self.staging.seek(0)
+        features: List[bytes] = []
+        bboxes: List[Bbox] = []
+        buffered_bytes = 0
+        for _, bbox, feature in _read_records(self.staging):
+            features.append(feature)
+            bboxes.append(bbox)
+            buffered_bytes += len(feature) + SPILL_RECORD.size
+            if buffered_bytes >= self.memory_budget:
+                self.spill_sorted(features, bboxes, extent)
+                features, bboxes, buffered_bytes = [], [], 0
+        if features:
+            self.spill_sorted(features, bboxes, extent)
+
+        self.staging.close()
+        self.staging = None
+        os.remove(self._path("staging"))
+
+    def _read_buffer_size(self, num_runs: int) -> int:
+        return max(MIN_READ_BUFFER_SIZE, self.memory_budget // max(num_runs, 1))
+
+    def _merge_runs(
+        self, runs: List[str]
+    ) -> Generator[Tuple[int, Bbox, bytes], None, None]:
+        buffer_size = self._read_buffer_size(len(runs))
+        files = [open(path, "rb", buffering=buffer_size) for path in runs]
+        try:
+            # Ties are broken by run and then position, so that features with
+            # the same key keep the order they were written in.
+            merged = heapq.merge(
+                *(
+                    (
+                        (-key, run_idx, position, bbox, feature)
+                        for position, (key, bbox, feature) in enumerate(
+                            _read_records(file)
+                        )
+                    )
+                    for run_idx, file in enumerate(files)
+                )
+            )
+            for negated_key, _, _, bbox, feature in merged:
+                yield -negated_key, bbox, feature
+        finally:
+            for file in files:
+                file.close()
+            for path in runs:
+                os.remove(path)
+
+    def merge(self) -> Generator[SortedFeature, None, None]:
+        """All spilled features, in descending Hilbert key order."""
+        # Merge consecutive runs into larger ones until they can be merged at
+        # once. Runs stay in order, so ties are still broken by write order.
+        level = 0
+        while len(self.runs) > MERGE_FAN_IN:
+            merged_runs = []
+            for start in range(0, len(self.runs), MERGE_FAN_IN):
+                path = self._path(f"merged-{level}-{start}")
+                with open(path, "wb") as run:
+                    for key, bbox, feature in self._merge_runs(
+                        self.runs[start : start + MERGE_FAN_IN]
+                    ):
+                        run.write(SPILL_RECORD.pack(key, *bbox))
+                        run.write(feature)
+                merged_runs.append(path)
+            logger.debug(f"merged {len(self.runs)} runs into {len(merged_runs)}")
+            self.runs = merged_runs
+            level += 1
+
+        runs, self.runs = self.runs, []
+        for _, bbox, feature in self._merge_runs(runs):
+            yield bbox, feature
+
+
+def _read_records(file: BinaryIO) -> Generator[Tuple[int, Bbox, bytes], None, None]:
+    while True:
+        head = file.read(SPILL_RECORD.size + SIZE_PREFIX_LEN)
+        if not head:
+            return
+        key, *bbox = SPILL_RECORD.unpack_from(head)
+        feature_length = int.from_bytes(head[SPILL_RECORD.size :], "little")
+        feature = head[SPILL_RECORD.size :] + file.read(feature_length)
+        yield key, tuple(bbox), feature
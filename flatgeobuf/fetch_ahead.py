@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Deque,
+    Generator,
+    Iterable,
+    Tuple,
+    TypeVar,
+)
+
+T = TypeVar("T")
+
+# A fetch to run, and the number of bytes it holds until consumed
+FetchTask = Tuple[Callable[[], T], int]
+AsyncFetchTask = Tuple[Callable[[], Awaitable[T]], int]
+
+# Threads can't be started under Pyodide, where fetches run one at a time
+threads_supported = sys.platform != "emscripten"
+
+_executor: ThreadPoolExecutor | None = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def shared_executor(workers: int) -> ThreadPoolExecutor | None:
+    """The thread pool shared by every reader in the process, with at least
+    `workers` threads, or None where threads can't be started."""
+    global _executor, _executor_workers, threads_supported
+    with _executor_lock:
+        if not threads_supported:
+            return None
+        if _executor is None or _executor_workers < workers:
+            executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="flatgeobuf-fetch"
+            )
+            try:
+                executor.submit(lambda: None).result()
+            except RuntimeError:
+                threads_supported = False
+                return None
+            # Fetches already running on the smaller pool still complete
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = executor
+            _executor_workers = workers
+        return _executor
+
+
+def fetch_ahead(
+    tasks: Iterable[FetchTask[T]], concurrency: int, max_bytes_in_flight: int
+) -> Generator[T, None, None]:
+    """Run fetches on the shared thread pool ahead of the consumer, yielding
+    their results in the order of `tasks`.
+
+    At most `concurrency` fetches are running or waiting to be consumed, and
+    they hold at most `max_bytes_in_flight` between them, except for a single
+    fetch larger than that. Without threads, fetches run one at a time as
+    results are consumed.
+    """
+    tasks = iter(tasks)
+    executor = shared_executor(concurrency) if concurrency > 1 else None
+    if executor is None:
+        for fetch, _ in tasks:
+            yield fetch()
+        return
+
+    pending: Deque[Tuple[Future[T], int]] = deque()
+    bytes_in_flight = 0
+    next_task = next(tasks, None)
+
+    try:
+        while True:
+            while next_task is not None and len(pending) < concurrency:
+                fetch, length = next_task
+                if pending and bytes_in_flight + length > max_bytes_in_flight:
+                    break
+                pending.append((executor.submit(fetch), length))
+                bytes_in_flight += length
+                next_task = next(tasks, None)
+
+            if not pending:
+                return
+
+            future, length = pending.popleft()
+            result = future.result()
+            bytes_in_flight -= length
+            yield result
+    finally:
+        # Stopped early, fetches that have not started yet are dropped
+        for future, _ in pending:
+            future.cancel()
+
+
+async def fetch_ahead_async(
+    tasks: Iterable[AsyncFetchTask[T]], concurrency: int, max_bytes_in_flight: int
+) -> AsyncGenerator[T, None]:
+    """Run fetches concurrently on the event loop ahead of the consumer,
+    yielding their results in the order of `tasks`, within the same limits
+    as fetch_ahead().
+
+    Tasks are only taken from `tasks` as earlier results are consumed.
+    """
+    tasks = iter(tasks)
+    pending: Deque[Tuple[asyncio.Future[T], int]] = deque()
+    bytes_in_flight = 0
+    next_task = next(tasks, None)
+
+    try:
+        while True:
+            while next_task is not None and len(pending) < concurrency:
+                fetch, length = next_task
+                if pending and bytes_in_flight + length > max_bytes_in_flight:
+                    break
+                pending.append((asyncio.ensure_future(fetch()), length))
+                bytes_in_flight += length
+                next_task = next(tasks, None)
+
+            if not pending:
+                return
+
+            future, length = pending.popleft()
+            result = await future
+            bytes_in_flight -= length
+            yield result
+    finally:
+        # Stopped early, or a fetch failed, the rest are cancelled
+        for future, _ in pending:
+            future.cancel()
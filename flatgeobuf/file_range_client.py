@@ -1,51 +1,104 @@
 from __future__ import annotations
 
+import mmap
+import os
+import threading
+import time
 from io import BufferedIOBase
 from logging import getLogger
 
+from flatgeobuf.batching import BatchingPolicy
+from flatgeobuf.block_cache import BlockCache
+from flatgeobuf.range_source import RangeSource
+
 logger = getLogger(__name__)
 
 
 class BufferedFileRangeClient:
-    def __init__(self, source: BufferedIOBase | FileRangeClient):
+    def __init__(
+        self,
+        source: BufferedIOBase | RangeSource,
+        cache: BlockCache | None = None,
+        batching: BatchingPolicy | None = None,
+    ):
         self.bytes_ever_used = 0
         self.bytes_ever_fetched = 0
-        self.buffer = bytearray()
+        # Ranges served from the buffer or the block cache, and fetched
+        self.hits = 0
+        self.misses = 0
+        self.cache = cache
+        # Told how long each fetch took, to adapt the batching of the reader
+        self.batching = batching or BatchingPolicy()
+        # Held as a memoryview, so that ranges within it are sliced without copies
+        self.buffer = memoryview(b"")
         self.head = 0
 
+        self.file_client: RangeSource
         if isinstance(source, BufferedIOBase):
             self.file_client = FileRangeClient(source)
-        elif isinstance(source, FileRangeClient):
+        elif isinstance(source, RangeSource):
             self.file_client = source
         else:
             raise ValueError("Unknown source")
 
     def get_range(
         self, start: int, length: int, min_req_length: int, purpose: str
-    ) -> bytes:
+    ) -> memoryview:
         self.bytes_ever_used += length
 
         start_i = start - self.head
         end_i = start_i + length
         if start_i >= 0 and end_i <= len(self.buffer):
+            self.hits += 1
             return self.buffer[start_i:end_i]
 
-        length_to_fetch = max(length, min_req_length)
+        if self.cache is not None:
+            cached = self.cache.read(start, length)
+            if cached is not None:
+                self.hits += 1
+                return cached
+        self.misses += 1
+
+        self.fetch(start, max(length, min_req_length), purpose)
+        return self.buffer[start - self.head : start - self.head + length]
+
+    def fill(self, start: int, length: int, purpose: str) -> None:
+        """Buffer the range, so that reads within it need no further request."""
+        if self.cache is not None:
+            cached = self.cache.read(start, length)
+            if cached is not None:
+                self.hits += 1
+                self.buffer = memoryview(cached)
+                self.head = start
+                return
+        self.misses += 1
+
+        self.fetch(start, length, purpose)
+
+    def fetch(self, start: int, length: int, purpose: str) -> None:
+        # Fetch from the start of the block, so that the fetch fills whole
+        # blocks other reads may share.
+        begin = start if self.cache is None else self.cache.block_start(start)
+        length_to_fetch = start - begin + length
 
         self.bytes_ever_fetched += length_to_fetch
-        self.buffer = self.file_client.get_range(start, length_to_fetch, purpose)
-        self.head = start
-
-        return self.buffer[:length]
+        fetch_start = time.perf_counter()
+        self.buffer = memoryview(
+            self.file_client.get_range(begin, length_to_fetch, purpose)
+        )
+        self.batching.record(length_to_fetch, time.perf_counter() - fetch_start)
+        self.head = begin
+        if self.cache is not None:
+            self.cache.store(begin, self.buffer, length_to_fetch)
 
     def log_usage(self, purpose: str) -> None:
         category = purpose.split(" ")[0]
         used = self.bytes_ever_used
         requested = self.bytes_ever_fetched
-        efficiency = f"{(100.0 * used / requested):.2f}"
+        efficiency = f"{(100.0 * used / requested):.2f}" if requested else "-"
 
         logger.info(
-            f"{category} bytes used/requested: {used} / {requested} = {efficiency}%"
+            f"{category} bytes used/requested: {used} / {requested} = {efficiency}%, hits/misses: {self.hits} / {self.misses}"
         )
 
 
@@ -55,9 +108,81 @@ class FileRangeClient:
         self.requests_ever_made = 0
         self.bytes_ever_requested = 0
 
+        # Positional reads leave the file position alone, so ranges can be
+        # read from several threads at once. Files without a descriptor, such
+        # as BytesIO, seek and read under a lock instead.
+        self.fileno: int | None = None
+        if hasattr(os, "pread"):
+            try:
+                self.fileno = file.fileno()
+            except OSError:
+                pass
+        self.lock = threading.Lock()
+
     def get_range(self, begin: int, length: int, purpose: str) -> bytes:
         self.requests_ever_made += 1
         self.bytes_ever_requested += length
 
-        self.file.seek(begin)
-        return self.file.read(length)
+        if self.fileno is None:
+            with self.lock:
+                self.file.seek(begin)
+                return self.file.read(length)
+
+        data = os.pread(self.fileno, length, begin)
+        # A single read may return less than asked for before the end of file
+        while 0 < len(data) < length:
+            more = os.pread(self.fileno, length - len(data), begin + len(data))
+            if not more:
+                break
+            data += more
+        return data
+
+    def size(self) -> int:
+        # Seeking would move the position other threads read at
+        if self.fileno is not None:
+            return os.fstat(self.fileno).st_size
+        with self.lock:
+            return self.file.seek(0, os.SEEK_END)
+
+
+class MmapFileRangeClient:
+    """Serves ranges as views over a read-only memory map of the file.
+
+    No range is ever copied, and the pages of the file are shared through the
+    OS page cache with any other process mapping it.
+    """
+
+    def __init__(self, file: BufferedIOBase):
+        self.file = file
+        self.requests_ever_made = 0
+        self.bytes_ever_requested = 0
+        self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+
+    def get_range(self, begin: int, length: int, purpose: str) -> memoryview:
+        self.requests_ever_made += 1
+        self.bytes_ever_requested += length
+
+        return self.view[begin : begin + length]
+
+    def size(self) -> int:
+        return len(self.view)
+
+    def close(self) -> None:
+        """Unmap the file, once no range served from it is still in use.
+
+        The file itself is left open, as it belongs to the caller.
+        """
+        self.view.release()
+        try:
+            self.mmap.close()
+        except BufferError:
+            # Views of ranges are still held, and keep the mapping until they
+            # are garbage collected.
+            logger.debug("memory map still in use, left to be released later")
+
+    def __enter__(self) -> MmapFileRangeClient:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, List, Sequence
+
+from flatgeobuf.config import Config
+from flatgeobuf.range_source import ByteRange
+
+try:
+    import fsspec
+    import fsspec.core
+except ImportError:
+    fsspec = None
+
+
+class FsspecRangeSource:
+    """A RangeSource over a file of an fsspec filesystem.
+
+    Any filesystem works, including caching, parallel or object-store ones
+    (e.g. "simplecache::s3://bucket/file.fgb"). Several ranges are fetched
+    with `cat_ranges`, which filesystems may serve concurrently or in fewer
+    requests, and async filesystems created with `asynchronous=True` are
+    awaited directly by the async readers.
+    """
+
+    def __init__(self, fs: Any, path: str):
+        self.fs = fs
+        self.path = path
+        # Identifies the file to the caches shared across readers
+        self.url = fs.unstrip_protocol(path)
+        self.requests_ever_made = 0
+        self.bytes_ever_requested = 0
+        self._size: int | None = None
+
+    @staticmethod
+    def open(urlpath: str, **storage_options: Any) -> FsspecRangeSource:
+        """The file at a URL or chained URL, with the filesystem's options."""
+        if fsspec is None:
+            raise ImportError("fsspec is required to read from fsspec filesystems")
+        fs, path = fsspec.core.url_to_fs(urlpath, **storage_options)
+        return FsspecRangeSource(fs, path)
+
+    def is_async(self) -> bool:
+        return getattr(self.fs, "async_impl", False) and getattr(
+            self.fs, "asynchronous", False
+        )
+
+    def size(self) -> int | None:
+        # Async filesystems can't be asked from sync code, and the size stays
+        # unknown to the readers.
+        if self._size is None and not self.is_async():
+            self._size = self.fs.size(self.path)
+        return self._size
+
+    def max_ranges_per_request(self) -> int:
+        return Config.global_instance.max_ranges_per_request()
+
+    def get_range(self, begin: int, length: int, purpose: str) -> bytes:
+        self.requests_ever_made += 1
+        self.bytes_ever_requested += length
+        return self.fs.cat_file(self.path, start=begin, end=begin + length)
+
+    async def get_range_async(self, begin: int, length: int, purpose: str) -> bytes:
+        if not self.is_async():
+            return await asyncio.to_thread(self.get_range, begin, length, purpose)
+
+        self.requests_ever_made += 1
+        self.bytes_ever_requested += length
+        return await self.fs._cat_file(self.path, start=begin, end=begin + length)
+
+    def get_ranges(self, ranges: Sequence[ByteRange], purpose: str) -> List[bytes]:
+        self.requests_ever_made += 1
+        self.bytes_ever_requested += sum(length for _, length in ranges)
+        return self.fs.cat_ranges(
+            [self.path] * len(ranges),
+            [begin for begin, _ in ranges],
+            [begin + length for begin, length in ranges],
+        )
+
+    async def get_ranges_async(
+        self, ranges: Sequence[ByteRange], purpose: str
+    ) -> List[bytes]:
+        if not self.is_async():
+            return await asyncio.to_thread(self.get_ranges, ranges, purpose)
+
+        self.requests_ever_made += 1
+        self.bytes_ever_requested += sum(length for _, length in ranges)
+        return await self.fs._cat_ranges(
+            [self.path] * len(ranges),
+            [begin for begin, _ in ranges],
+            [begin + length for begin, length in ranges],
+        )
@@ -11,6 +11,7 @@ from flatgeobuf.generic.featurecollection import HeaderMetaFn  # noqa: F401
 from flatgeobuf.generic.featurecollection import FromFeatureFn
 from flatgeobuf.generic.featurecollection import deserialize as deserialize_buffer
 from flatgeobuf.generic.featurecollection import deserialize_http, deserialize_stream
+from flatgeobuf.generic.featurecollection import Writer, serialize
 from flatgeobuf.packedrtree import Rect
 
 
@@ -31,5 +32,6 @@ __all__ = [
     "GeometryType",
     "ColumnType",
     "deserialize",
-    # "serialize"
+    "serialize",
+    "Writer",
 ]
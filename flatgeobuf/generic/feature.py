@@ -1,14 +1,24 @@
 from abc import ABCMeta
 import json
+import struct
 from typing import Any, Callable, Dict, List, Optional, Union
 from flatgeobuf.FlatGeobuf.GeometryType import GeometryType
 
+import flatbuffers
+import numpy as np
+
 from flatgeobuf.column_meta import ColumnMeta
 from flatgeobuf.FlatGeobuf.ColumnType import ColumnType
-from flatgeobuf.FlatGeobuf.Feature import Feature
+from flatgeobuf.FlatGeobuf.Feature import (
+    Feature,
+    FeatureAddGeometry,
+    FeatureAddProperties,
+    FeatureEnd,
+    FeatureStart,
+)
 from flatgeobuf.header_meta import HeaderMeta
 
-from flatgeobuf.generic.geometry import ParsedGeometry, SimpleGeometry
+from flatgeobuf.generic.geometry import ParsedGeometry, SimpleGeometry, build_geometry
 
 
 class BaseFeature(metaclass=ABCMeta):
@@ -28,6 +38,21 @@ CreateFeatureCallable = Callable[
 
 IProperties = Dict[str, Union[bool, int, str, Any]]
 
+# struct formats of the fixed size column types
+COLUMN_FORMATS = {
+    ColumnType.Bool: "<?",
+    ColumnType.Byte: "<b",
+    ColumnType.UByte: "<B",
+    ColumnType.Short: "<h",
+    ColumnType.UShort: "<H",
+    ColumnType.Int: "<i",
+    ColumnType.UInt: "<I",
+    ColumnType.Long: "<q",
+    ColumnType.ULong: "<Q",
+    ColumnType.Float: "<f",
+    ColumnType.Double: "<d",
+}
+
 
 def from_feature(
     feature: Feature,
@@ -52,10 +77,11 @@ def parse_properties(
     properties = {}
     if not columns or len(columns) == 0:
         return properties
-    array = feature.PropertiesAsNumpy().tobytes()
-    if array == 0:
+    # Features without properties have no vector, and flatbuffers gives 0
+    array = feature.PropertiesAsNumpy()
+    if isinstance(array, int):
         return properties
-    view = memoryview(array)
+    view = memoryview(array.tobytes())
     length = feature.PropertiesLength()
     offset = 0
     while offset < length:
@@ -65,13 +91,13 @@ def parse_properties(
         name = column.name
         column_type = column.type
         if column_type == ColumnType.Bool:
-            properties[name] = view[offset].cast("b")[0] == 1
+            properties[name] = view[offset : offset + 1].cast("b")[0] == 1
             offset += 1
         elif column_type == ColumnType.Byte:
-            properties[name] = view[offset].cast("b")[0]
+            properties[name] = view[offset : offset + 1].cast("b")[0]
             offset += 1
         elif column_type == ColumnType.UByte:
-            properties[name] = view[offset].cast("B")[0]
+            properties[name] = view[offset : offset + 1].cast("B")[0]
             offset += 1
         elif column_type == ColumnType.Short:
             properties[name] = view[offset : offset + 2].cast("h")[0]
@@ -114,3 +140,58 @@ def parse_properties(
             raise ValueError(f"Unknown type {column_type}")
 
     return properties
+
+
+def build_properties(
+    properties: Optional[IProperties], columns: Optional[List[ColumnMeta]] = None
+) -> bytes:
+    buffer = bytearray()
+    if not properties or not columns:
+        return bytes(buffer)
+
+    for i, column in enumerate(columns):
+        value = properties.get(column.name, None)
+        if value is None:
+            continue
+
+        buffer += struct.pack("<H", i)
+        column_type = column.type
+        if column_type in COLUMN_FORMATS:
+            buffer += struct.pack(COLUMN_FORMATS[column_type], value)
+        elif column_type in (ColumnType.DateTime, ColumnType.String, ColumnType.Json):
+            if column_type == ColumnType.Json:
+                value = json.dumps(value)
+            elif column_type == ColumnType.DateTime and not isinstance(value, str):
+                value = value.isoformat()
+            str_bytes = value.encode()
+            buffer += struct.pack("<I", len(str_bytes))
+            buffer += str_bytes
+        else:
+            raise ValueError(f"Unknown type {column_type}")
+
+    return bytes(buffer)
+
+
+def build_feature(
+    geometry: ParsedGeometry, properties: Optional[IProperties], header: HeaderMeta
+) -> bytes:
+    """Build a size-prefixed Feature flatbuffer, as stored in a FlatGeobuf file."""
+    builder = flatbuffers.Builder(1024)
+
+    properties_bytes = build_properties(properties, header.columns)
+    properties_offset = None
+    if properties_bytes:
+        properties_offset = builder.CreateNumpyVector(
+            np.frombuffer(properties_bytes, dtype=np.uint8)
+        )
+
+    geometry_offset = build_geometry(builder, geometry)
+
+    FeatureStart(builder)
+    FeatureAddGeometry(builder, geometry_offset)
+    if properties_offset is not None:
+        FeatureAddProperties(builder, properties_offset)
+    feature_offset = FeatureEnd(builder)
+    builder.FinishSizePrefixed(feature_offset)
+
+    return bytes(builder.Output())
@@ -1,20 +1,55 @@
 from __future__ import annotations
 
+import math
+import os
+import shutil
+import struct
+import time
 from asyncio import StreamReader
-from io import BufferedIOBase
+from dataclasses import dataclass, replace
+from io import BufferedIOBase, BytesIO
 from logging import getLogger
-from typing import Any, AsyncGenerator, Callable, Generator, Optional, Union
+from typing import (
+    Any,
+    AsyncGenerator,
+    BinaryIO,
+    Callable,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import numpy as np
 
 from flatgeobuf.async_http_reader import AsyncHTTPReader
+from flatgeobuf.constants import magicbytes
+from flatgeobuf.external_sort import MIN_READ_BUFFER_SIZE, SPILL_RECORD, SpillStore
 from flatgeobuf.file_reader import FileReader
 from flatgeobuf.FlatGeobuf.Feature import Feature
-from flatgeobuf.generic.feature import BaseFeature
-from flatgeobuf.header_meta import HeaderMeta
+from flatgeobuf.generic.feature import BaseFeature, IProperties, build_feature
+from flatgeobuf.generic.geometry import ParsedGeometry, calc_bbox
+from flatgeobuf.header_meta import HeaderMeta, build_header
 from flatgeobuf.http_reader import HTTPReader
-from flatgeobuf.packedrtree import Rect
+from flatgeobuf.packedrtree import (
+    DEFAULT_NODE_SIZE,
+    NODE_ITEM_BYTE_LEN,
+    NODE_ITEM_DTYPE,
+    Rect,
+    build_parent_nodes,
+    build_tree,
+    calc_tree_size,
+    generate_level_bounds,
+    hilbert_sort,
+)
+from flatgeobuf.range_source import RangeSource
 
 logger = getLogger(__name__)
 
+LEAF_NODE = struct.Struct("<4dQ")
+
 FromFeatureFn = Callable[[Feature, HeaderMeta], BaseFeature]
 ReadFn = Callable[[int, str], Union[bytes, bytearray]]
 HeaderMetaFn = Callable[[HeaderMeta], None]
@@ -72,12 +107,12 @@ HeaderMetaFn = Callable[[HeaderMeta], None]
 
 
 def deserialize(
-    data: BufferedIOBase,
+    data: BufferedIOBase | RangeSource,
     rect: Rect | None,
     from_feature: FromFeatureFn,
     header_meta_fn: HeaderMetaFn | None = None,
 ) -> Generator[Any, None, None]:
-    """Deserialize a FlatGeobuf byte stream to a list of BaseFeature."""
+    """Deserialize a FlatGeobuf file or RangeSource to a list of BaseFeature."""
 
     reader = FileReader.load(data)
 
@@ -86,10 +121,10 @@ def deserialize(
     if header_meta_fn:
         header_meta_fn(reader.header)
 
-    if not rect:
-        rect = [-float("inf"), -float("inf"), float("inf"), float("inf")]
+    # Without a rect, every feature is read sequentially, skipping the index
+    features = reader.select_bbox(rect) if rect else reader.select_all()
 
-    for feature in reader.select_bbox(rect):
+    for feature in features:
         yield from_feature(feature, reader.header)
 
 
@@ -133,7 +168,7 @@ async def deserialize_stream(
 
 
 async def deserialize_http_async(
-    url: str,
+    url: str | RangeSource,
     rect: Rect | None,
     from_feature: FromFeatureFn,
     header_meta_fn: HeaderMetaFn | None = None,
@@ -147,15 +182,15 @@ async def deserialize_http_async(
     if header_meta_fn:
         header_meta_fn(reader.header)
 
-    if not rect:
-        rect = [-float("inf"), -float("inf"), float("inf"), float("inf")]
+    # Without a rect, every feature is read sequentially, skipping the index
+    features = reader.select_bbox(rect) if rect else reader.select_all()
 
-    async for feature in reader.select_bbox(rect):
+    async for feature in features:
         yield from_feature(feature, reader.header)
 
 
 def deserialize_http(
-    url: str,
+    url: str | RangeSource,
     rect: Rect | None,
     from_feature: FromFeatureFn,
     header_meta_fn: HeaderMetaFn | None = None,
@@ -169,10 +204,10 @@ def deserialize_http(
     if header_meta_fn:
         header_meta_fn(reader.header)
 
-    if not rect:
-        rect = [-float("inf"), -float("inf"), float("inf"), float("inf")]
+    # Without a rect, every feature is read sequentially, skipping the index
+    features = reader.select_bbox(rect) if rect else reader.select_all()
 
-    for feature in reader.select_bbox(rect):
+    for feature in features:
         yield from_feature(feature, reader.header)
 
 
@@ -194,3 +229,291 @@ async def read_feature(
     # feature = Feature.GetRootAsFeature(bb)
 
     # return from_feature(feature, header_meta)
+
+
+def has_z(parsed_geometry: ParsedGeometry) -> bool:
+    if parsed_geometry.get("z", None):
+        return True
+    return any(has_z(part) for part in parsed_geometry.get("parts", None) or [])
+
+
+@dataclass
+class WriterStats:
+    features_count: int = 0
+    # Sorted runs spilled to disk, and the bytes written to temporary files
+    runs: int = 0
+    spilled_bytes: int = 0
+    elapsed: float = 0.0
+
+    def features_per_second(self) -> float:
+        if self.elapsed == 0:
+            return 0.0
+        return self.features_count / self.elapsed
+
+
+class Writer:
+    """Streaming FlatGeobuf writer.
+
+    Features are built as they are written and kept until `close`, when they
+    are sorted along the Hilbert curve and written out after the header and
+    the packed R-tree built over them.
+
+    With a memory budget, features beyond it are spilled to temporary files
+    and merge-sorted on close, so datasets larger than memory can be written.
+    Sorted runs can only be spilled as features are written if the Hilbert
+    curve's extent is known, i.e. the header's envelope is given up front;
+    otherwise features are staged to disk and sorted in an extra pass.
+    """
+
+    def __init__(
+        self,
+        output: BinaryIO,
+        header_meta: HeaderMeta,
+        index_node_size: int = DEFAULT_NODE_SIZE,
+        memory_budget: int | None = None,
+        temp_dir: str | None = None,
+    ):
+        self.output = output
+        # features_count, envelope and index_node_size are filled in on close
+        self.header = replace(header_meta)
+        # The Hilbert curve's extent, if known before any feature is written,
+        # so that every spilled run and the final sort agree on it
+        self.extent: Tuple[float, float, float, float] | None = None
+        if header_meta.envelope and index_node_size > 0:
+            self.extent = tuple(header_meta.envelope[:4])
+        self.index_node_size = index_node_size
+        self.memory_budget = memory_budget
+        self.temp_dir = temp_dir
+        self.features: List[bytes] = []
+        self.bboxes: List[Tuple[float, float, float, float]] = []
+        self.buffered_bytes = 0
+        self.features_count = 0
+        self.bounds = [math.inf, math.inf, -math.inf, -math.inf]
+        self.spill_store: SpillStore | None = None
+        self.stats = WriterStats()
+        self.started_at = time.perf_counter()
+        self.closed = False
+
+    def __enter__(self) -> Writer:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        elif self.spill_store is not None:
+            self.spill_store.cleanup()
+
+    def write(
+        self, geometry: ParsedGeometry, properties: IProperties | None = None
+    ) -> None:
+        if self.closed:
+            raise ValueError("Writer is closed")
+        feature = build_feature(geometry, properties, self.header)
+        bbox = calc_bbox(geometry)
+        self.features.append(feature)
+        self.bboxes.append(bbox)
+        self.features_count += 1
+        self.bounds = [
+            min(self.bounds[0], bbox[0]),
+            min(self.bounds[1], bbox[1]),
+            max(self.bounds[2], bbox[2]),
+            max(self.bounds[3], bbox[3]),
+        ]
+        if not self.header.has_z and has_z(geometry):
+            self.header.has_z = True
+
+        if self.memory_budget is not None:
+            self.buffered_bytes += len(feature) + SPILL_RECORD.size
+            if self.buffered_bytes >= self.memory_budget:
+                self._spill()
+
+    def _spill(self) -> None:
+        if self.spill_store is None:
+            self.spill_store = SpillStore(self.memory_budget, self.temp_dir)
+        if self.extent is not None:
+            self.spill_store.spill_sorted(self.features, self.bboxes, self.extent)
+        else:
+            self.spill_store.spill_unsorted(self.features, self.bboxes)
+        self.features = []
+        self.bboxes = []
+        self.buffered_bytes = 0
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+
+        # The envelope given up front only serves as the sorting extent, and
+        # the header gets the actual bounds
+        bounds = tuple(self.bounds)
+        extent = self.extent or bounds
+        self.header.features_count = self.features_count
+        self.header.index_node_size = (
+            self.index_node_size if self.features_count > 0 else 0
+        )
+        self.header.envelope = None
+        if all(math.isfinite(v) for v in bounds):
+            self.header.envelope = list(bounds)
+
+        if self.spill_store is None:
+            self._close_in_memory(extent)
+        else:
+            try:
+                self._close_external(extent)
+            finally:
+                self.spill_store.cleanup()
+
+        self.features = []
+        self.bboxes = []
+
+        self.stats.features_count = self.features_count
+        self.stats.elapsed = time.perf_counter() - self.started_at
+        logger.info(
+            f"wrote {self.stats.features_count} features in "
+            f"{self.stats.elapsed:.2f}s "
+            f"({self.stats.features_per_second():.0f} features/s)"
+        )
+
+    def _close_in_memory(self, extent: Tuple[float, float, float, float]) -> None:
+        features = self.features
+        bboxes = np.array(self.bboxes, dtype=np.float64).reshape(-1, 4)
+        index_node_size = self.header.index_node_size
+
+        if index_node_size > 0:
+            order = hilbert_sort(bboxes, extent)
+            features = [features[i] for i in order.tolist()]
+            bboxes = bboxes[order]
+
+        self.output.write(magicbytes)
+        self.output.write(build_header(self.header))
+
+        if index_node_size > 0:
+            lengths = np.fromiter(
+                (len(feature) for feature in features), np.uint64, len(features)
+            )
+            offsets = np.cumsum(lengths) - lengths
+            tree = build_tree(bboxes, offsets, index_node_size)
+            logger.debug(f"writing index of {len(tree)} nodes")
+            self.output.write(tree.tobytes())
+
+        for feature in features:
+            self.output.write(feature)
+
+    def _close_external(self, extent: Tuple[float, float, float, float]) -> None:
+        spill_store = self.spill_store
+        index_node_size = self.header.index_node_size
+
+        if index_node_size == 0:
+            # Without an index, features are written in the order they came.
+            self._spill()
+            self._update_spill_stats()
+            self.output.write(magicbytes)
+            self.output.write(build_header(self.header))
+            for feature in spill_store.staged():
+                self.output.write(feature)
+            return
+
+        if self.features:
+            self._spill()
+        spill_store.sort_staged(extent)
+        self._update_spill_stats()
+
+        self.output.write(magicbytes)
+        self.output.write(build_header(self.header))
+
+        # The tree can only be built once every feature offset is known, so
+        # features go straight to their place after it if the output can seek,
+        # and to a temporary file otherwise.
+        seekable = hasattr(self.output, "seekable") and self.output.seekable()
+        tree_size = calc_tree_size(self.features_count, index_node_size)
+        if seekable:
+            tree_position = self.output.tell()
+            self.output.seek(tree_position + tree_size)
+            features_output = self.output
+        else:
+            features_output = open(
+                os.path.join(spill_store.temp_dir, "features"), "w+b"
+            )
+
+        level_bounds = generate_level_bounds(self.features_count, index_node_size)
+        level_files = [
+            open(os.path.join(spill_store.temp_dir, f"level-{level}"), "w+b")
+            for level in range(len(level_bounds))
+        ]
+        try:
+            # Leaves, and the features they point at, in Hilbert order
+            offset = 0
+            leaves = bytearray()
+            for bbox, feature in spill_store.merge():
+                leaves += LEAF_NODE.pack(*bbox, offset)
+                offset += len(feature)
+                features_output.write(feature)
+                if len(leaves) >= MIN_READ_BUFFER_SIZE:
+                    level_files[0].write(leaves)
+                    leaves.clear()
+            level_files[0].write(leaves)
+
+            # Then every level above, a chunk of whole parents at a time
+            chunk_nodes = max(
+                index_node_size,
+                self.memory_budget
+                // NODE_ITEM_BYTE_LEN
+                // index_node_size
+                * index_node_size,
+            )
+            for level, (start, end) in enumerate(level_bounds[:-1]):
+                children_file = level_files[level]
+                children_file.seek(0)
+                for chunk_start in range(start, end, chunk_nodes):
+                    children = np.frombuffer(
+                        children_file.read(
+                            min(chunk_nodes, end - chunk_start) * NODE_ITEM_BYTE_LEN
+                        ),
+                        dtype=NODE_ITEM_DTYPE,
+                    )
+                    parents = build_parent_nodes(children, chunk_start, index_node_size)
+                    level_files[level + 1].write(parents.tobytes())
+
+            if seekable:
+                self.output.seek(tree_position)
+            # Levels are stored from the root down
+            for level_file in reversed(level_files):
+                level_file.seek(0)
+                shutil.copyfileobj(level_file, self.output)
+            if seekable:
+                self.output.seek(0, os.SEEK_END)
+            else:
+                features_output.seek(0)
+                shutil.copyfileobj(features_output, self.output)
+        finally:
+            for level_file in level_files:
+                level_file.close()
+            if not seekable:
+                features_output.close()
+
+    def _update_spill_stats(self) -> None:
+        self.stats.runs = len(self.spill_store.runs)
+        self.stats.spilled_bytes = self.spill_store.spilled_bytes
+
+
+def serialize(
+    features: Iterable[Tuple[ParsedGeometry, IProperties | None]],
+    header_meta: HeaderMeta,
+    output: BinaryIO | None = None,
+    index_node_size: int = DEFAULT_NODE_SIZE,
+    memory_budget: int | None = None,
+) -> bytes | None:
+    """Serialize (parsed geometry, properties) pairs to FlatGeobuf.
+
+    Returns the bytes when no output is given.
+    """
+
+    buffer = BytesIO() if output is None else output
+
+    with Writer(buffer, header_meta, index_node_size, memory_budget) as writer:
+        for geometry, properties in features:
+            writer.write(geometry, properties)
+
+    if output is None:
+        return buffer.getvalue()
+    return None
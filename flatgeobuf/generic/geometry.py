@@ -1,9 +1,23 @@
 from __future__ import annotations
 
+import math
 from abc import ABCMeta, abstractmethod
-from typing import Callable, List, Optional, TypedDict, Union, cast
-
-from flatgeobuf.FlatGeobuf.Geometry import Geometry
+from typing import Callable, List, Optional, Tuple, TypedDict, Union, cast
+
+import flatbuffers
+import numpy as np
+
+from flatgeobuf.FlatGeobuf.Geometry import (
+    Geometry,
+    GeometryAddEnds,
+    GeometryAddParts,
+    GeometryAddType,
+    GeometryAddXy,
+    GeometryAddZ,
+    GeometryEnd,
+    GeometryStart,
+    GeometryStartPartsVector,
+)
 from flatgeobuf.FlatGeobuf.GeometryType import GeometryType
 
 
@@ -52,26 +66,64 @@ CreateGeometryCallable = Callable[
 ]
 
 
-def build_geometry(parsed_geometry: ParsedGeometry) -> Geometry:
-    raise NotImplementedError()
-    # xy = parsed_geometry.get("xy", None)
-    # z = parsed_geometry.get("z", None)
-    # ends = parsed_geometry.get("ends", None)
-    # parts = parsed_geometry.get("parts", None)
-    # type = parsed_geometry.get("type", None)
-
-    # if parts:
-    #     part_offsets = [build_geometry(part) for part in parts]
-    #     parts_offset = Geometry.create_parts_vector(part_offsets)
-    #     geometry = Geometry(xy=[], z=[], ends=[], parts=parts_offset, type=type)
-    #     return geometry
-
-    # xy_offset = Geometry.create_xy_vector(xy)
-    # z_offset = Geometry.create_z_vector(z) if z else None
-    # ends_offset = Geometry.create_ends_vector(ends) if ends else None
-
-    # geometry = Geometry(xy=xy_offset, z=z_offset, ends=ends_offset, type=type)
-    # return geometry
+def build_geometry(
+    builder: flatbuffers.Builder, parsed_geometry: ParsedGeometry
+) -> int:
+    xy = parsed_geometry.get("xy", None)
+    z = parsed_geometry.get("z", None)
+    ends = parsed_geometry.get("ends", None)
+    parts = parsed_geometry.get("parts", None)
+    type = parsed_geometry.get("type", None)
+
+    if parts:
+        part_offsets = [build_geometry(builder, part) for part in parts]
+        GeometryStartPartsVector(builder, len(part_offsets))
+        for part_offset in reversed(part_offsets):
+            builder.PrependUOffsetTRelative(part_offset)
+        parts_offset = builder.EndVector()
+        GeometryStart(builder)
+        GeometryAddParts(builder, parts_offset)
+        if type is not None:
+            GeometryAddType(builder, type)
+        return GeometryEnd(builder)
+
+    xy_offset = builder.CreateNumpyVector(np.asarray(xy or [], dtype=np.float64))
+    z_offset = builder.CreateNumpyVector(np.asarray(z, dtype=np.float64)) if z else None
+    ends_offset = (
+        builder.CreateNumpyVector(np.asarray(ends, dtype=np.uint32)) if ends else None
+    )
+
+    GeometryStart(builder)
+    if ends_offset is not None:
+        GeometryAddEnds(builder, ends_offset)
+    GeometryAddXy(builder, xy_offset)
+    if z_offset is not None:
+        GeometryAddZ(builder, z_offset)
+    if type is not None:
+        GeometryAddType(builder, type)
+    return GeometryEnd(builder)
+
+
+def calc_bbox(parsed_geometry: ParsedGeometry) -> Tuple[float, float, float, float]:
+    """Bounding box of a parsed geometry, inverted and infinite when it is empty."""
+    parts = parsed_geometry.get("parts", None)
+    if parts:
+        bboxes = np.array([calc_bbox(part) for part in parts])
+        return (
+            float(bboxes[:, 0].min()),
+            float(bboxes[:, 1].min()),
+            float(bboxes[:, 2].max()),
+            float(bboxes[:, 3].max()),
+        )
+
+    xy = parsed_geometry.get("xy", None)
+    if not xy:
+        return (math.inf, math.inf, -math.inf, -math.inf)
+
+    coordinates = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+    min_x, min_y = coordinates.min(axis=0).tolist()
+    max_x, max_y = coordinates.max(axis=0).tolist()
+    return (min_x, min_y, max_x, max_y)
 
 
 def flat(
@@ -1,12 +1,26 @@
 from __future__ import annotations
 
 from asyncio import StreamReader
-from io import BufferedIOBase
-from typing import AsyncGenerator, Generator
+from io import BufferedIOBase, BytesIO
+from typing import (
+    Any,
+    AsyncGenerator,
+    BinaryIO,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Sequence,
+    Union,
+)
 
-from geojson import Feature
+from geojson import Feature, FeatureCollection
 
 from flatgeobuf.bbox_filter import BBoxFilter
+from flatgeobuf.column_meta import ColumnMeta
+from flatgeobuf.crs_meta import CrsMeta
+from flatgeobuf.FlatGeobuf.ColumnType import ColumnType
+from flatgeobuf.FlatGeobuf.GeometryType import GeometryType
 from flatgeobuf.generic import HeaderMetaFn
 from flatgeobuf.generic.featurecollection import deserialize as generic_deserialize
 from flatgeobuf.generic.featurecollection import (
@@ -19,16 +33,21 @@ from flatgeobuf.generic.featurecollection import (
 # from flatgeobuf.generic.featurecollection import (
 #     deserialize_stream as generic_deserialize_stream,
 # )
+from flatgeobuf.generic.featurecollection import Writer
+from flatgeobuf.generic.geometry import ParsedGeometry, to_geometry_type
 from flatgeobuf.geojson.feature import from_feature
-from flatgeobuf.packedrtree import Rect
+from flatgeobuf.geojson.geometry import parse_gc, parse_geometry
+from flatgeobuf.header_meta import HeaderMeta
+from flatgeobuf.range_source import RangeSource
+from flatgeobuf.packedrtree import DEFAULT_NODE_SIZE, Rect
 
 
 def deserialize(
-    data: BufferedIOBase,
+    data: BufferedIOBase | RangeSource,
     rect: Rect | None = None,
     header_meta_fn: HeaderMetaFn | None = None,
 ) -> Generator[Feature, None, None]:
-    """Deserialize a FlatGeobuf byte stream to a GeoJSON FeatureCollection."""
+    """Deserialize a FlatGeobuf file or RangeSource to a GeoJSON FeatureCollection."""
 
     if rect:
         bbox_filter = BBoxFilter(rect)
@@ -50,7 +69,9 @@ async def deserialize_stream(
 
 
 async def deserialize_http_async(
-    url: str, rect: Rect | None = None, header_meta_fn: HeaderMetaFn | None = None
+    url: str | RangeSource,
+    rect: Rect | None = None,
+    header_meta_fn: HeaderMetaFn | None = None,
 ) -> AsyncGenerator[Feature, None]:
     """Deserialize a FlatGeobuf HTTP resource to a GeoJSON FeatureCollection."""
 
@@ -69,7 +90,9 @@ async def deserialize_http_async(
 
 
 def deserialize_http(
-    url: str, rect: Rect | None = None, header_meta_fn: HeaderMetaFn | None = None
+    url: str | RangeSource,
+    rect: Rect | None = None,
+    header_meta_fn: HeaderMetaFn | None = None,
 ) -> Generator[Feature, None, None]:
     """Deserialize a FlatGeobuf HTTP resource to a GeoJSON FeatureCollection."""
 
@@ -85,3 +108,179 @@ def deserialize_http(
             url, rect, from_feature, header_meta_fn
         ):
             yield feature
+
+
+def value_to_type(value: Any) -> ColumnType:
+    if isinstance(value, bool):
+        return ColumnType.Bool
+    elif isinstance(value, int):
+        # NOTE: Python ints are unbounded, so don't narrow them to Int
+        return ColumnType.Long
+    elif isinstance(value, float):
+        return ColumnType.Double
+    elif isinstance(value, str) or value is None:
+        return ColumnType.String
+    elif isinstance(value, (dict, list)):
+        return ColumnType.Json
+    else:
+        raise ValueError(f"Unknown type (value '{value}')")
+
+
+def column_type_name(column_type: ColumnType) -> str:
+    return next(
+        name for name, value in vars(ColumnType).items() if value == column_type
+    )
+
+
+def merge_column_type(
+    name: str, column_type: ColumnType | None, value: Any
+) -> ColumnType | None:
+    """The type of a column holding both its values so far and `value`.
+
+    None values don't decide the type, and ints are widened to Double
+    alongside floats. Any other mix of types is an error.
+    """
+    if value is None:
+        return column_type
+    value_type = value_to_type(value)
+    if column_type is None or column_type == value_type:
+        return value_type
+    if {column_type, value_type} == {ColumnType.Long, ColumnType.Double}:
+        return ColumnType.Double
+    raise ValueError(
+        f"Property '{name}' has values of types {column_type_name(column_type)} "
+        f"and {column_type_name(value_type)}"
+    )
+
+
+def introspect_columns(features: Iterable[Feature]) -> List[ColumnMeta] | None:
+    """Columns for the union of the properties of the features, in the order
+    they first appear. Columns of None values only are String."""
+    types: Dict[str, ColumnType | None] = {}
+    for feature in features:
+        for name, value in (feature.get("properties", None) or {}).items():
+            types[name] = merge_column_type(name, types.get(name), value)
+    if not types:
+        return None
+    return [
+        ColumnMeta(
+            name=name,
+            type=ColumnType.String if column_type is None else column_type,
+            nullable=True,
+        )
+        for name, column_type in types.items()
+    ]
+
+
+def check_properties(
+    properties: IProperties | None, columns: List[ColumnMeta] | None
+) -> None:
+    # Columns can't change once features are written with them
+    by_name = {column.name: column for column in columns or []}
+    for name, value in (properties or {}).items():
+        column = by_name.get(name)
+        if column is None:
+            raise ValueError(
+                f"Property '{name}' is missing from the first feature, which "
+                "the columns were introspected from; pass the features as a "
+                "list to introspect them all"
+            )
+        if (
+            value is not None
+            and merge_column_type(name, column.type, value) != column.type
+        ):
+            raise ValueError(
+                f"Property '{name}' has a {column_type_name(value_to_type(value))} "
+                f"value, but the first feature made it a "
+                f"{column_type_name(column.type)} column; pass the features "
+                "as a list to introspect them all"
+            )
+
+
+def introspect_header_meta(
+    feature: Feature,
+    crs: CrsMeta | None = None,
+    columns: List[ColumnMeta] | None = None,
+) -> HeaderMeta:
+    if columns is None:
+        columns = introspect_columns([feature])
+
+    return HeaderMeta(
+        geometry_type=to_geometry_type(feature["geometry"]["type"]),
+        columns=columns,
+        envelope=None,
+        features_count=0,
+        index_node_size=0,
+        crs=crs,
+        title=None,
+        description=None,
+        metadata=None,
+    )
+
+
+def parse_feature_geometry(feature: Feature) -> ParsedGeometry:
+    geometry = feature.get("geometry", None)
+    if not geometry:
+        raise ValueError("Feature has no geometry")
+    if geometry["type"] == "GeometryCollection":
+        return parse_gc(geometry)
+    return parse_geometry(geometry)
+
+
+def serialize(
+    features: Union[FeatureCollection, Iterable[Feature]],
+    output: BinaryIO | None = None,
+    index_node_size: int = DEFAULT_NODE_SIZE,
+    crs: CrsMeta | None = None,
+    memory_budget: int | None = None,
+) -> bytes | None:
+    """Serialize a GeoJSON FeatureCollection, or features, to FlatGeobuf.
+
+    Columns are introspected from the properties of every feature when they
+    are given as a FeatureCollection or a list, and from the first feature
+    otherwise, in which case a later feature not fitting them raises a
+    ValueError. With a memory budget (in bytes), features beyond it are
+    sorted on disk. Returns the bytes when no output is given.
+    """
+
+    if isinstance(features, dict):
+        features = features["features"]
+
+    # Features that can be iterated twice are introspected in a first pass
+    all_columns = isinstance(features, Sequence)
+    columns = introspect_columns(features) if all_columns else None
+
+    buffer = BytesIO() if output is None else output
+    writer = None
+
+    for feature in features:
+        geometry = parse_feature_geometry(feature)
+        properties = feature.get("properties", None)
+        if writer is None:
+            header_meta = introspect_header_meta(feature, crs, columns)
+            writer = Writer(buffer, header_meta, index_node_size, memory_budget)
+        else:
+            if writer.header.geometry_type != geometry["type"]:
+                writer.header.geometry_type = GeometryType.Unknown
+            if not all_columns:
+                check_properties(properties, writer.header.columns)
+        writer.write(geometry, properties)
+
+    if writer is None:
+        header_meta = HeaderMeta(
+            geometry_type=GeometryType.Unknown,
+            columns=None,
+            envelope=None,
+            features_count=0,
+            index_node_size=0,
+            crs=crs,
+            title=None,
+            description=None,
+            metadata=None,
+        )
+        writer = Writer(buffer, header_meta, index_node_size)
+    writer.close()
+
+    if output is None:
+        return buffer.getvalue()
+    return None
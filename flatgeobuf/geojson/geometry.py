@@ -27,23 +27,28 @@ def parse_geometry(
         Point | MultiPoint | LineString | MultiLineString | Polygon | MultiPolygon
     ),
 ) -> ParsedGeometry:
-    cs = geometry.coordinates
+    # NOTE: Read as a mapping, as converting plain GeoJSON to the geojson
+    # classes would round the coordinates
+    cs = geometry["coordinates"]
     xy = []
     z = []
     ends = None
     parts = None
-    type = to_geometry_type(geometry.type)
+    type = to_geometry_type(geometry["type"])
     end = 0
-    if geometry.type == "Point":
+    if geometry["type"] == "Point":
         flat(cs, xy, z)
-    elif geometry.type in ["MultiPoint", "LineString"]:
+    elif geometry["type"] in ["MultiPoint", "LineString"]:
         flat(cs, xy, z)
-    elif geometry.type in ["MultiLineString", "Polygon"]:
+    elif geometry["type"] in ["MultiLineString", "Polygon"]:
         css = cs
         flat(css, xy, z)
         if len(css) > 1:
-            ends = [end + len(c) for c in css]
-    elif geometry.type == "MultiPolygon":
+            ends = []
+            for c in css:
+                end += len(c)
+                ends.append(end)
+    elif geometry["type"] == "MultiPolygon":
         csss = cs
         geometries = [
             cast(Polygon, {"type": "Polygon", "coordinates": coordinates})
@@ -62,10 +67,10 @@ def parse_geometry(
 
 
 def parse_gc(geometry: GeometryCollection) -> ParsedGeometry:
-    type = to_geometry_type(geometry.type)
+    type = to_geometry_type(geometry["type"])
     parts = []
-    for g in geometry.geometries:
-        if g.type == "GeometryCollection":
+    for g in geometry["geometries"]:
+        if g["type"] == "GeometryCollection":
             parts.append(parse_gc(g))
         else:
             parts.append(parse_geometry(g))
@@ -11,21 +11,26 @@ from flatgeobuf.geojson.featurecollection import (
     deserialize_http_async,
 )
 from flatgeobuf.packedrtree import Rect
+from flatgeobuf.range_source import RangeSource
 
 
-def load(file: BufferedIOBase, *, bbox: Rect | None = None) -> FeatureCollection:
+def load(
+    file: BufferedIOBase | RangeSource, *, bbox: Rect | None = None
+) -> FeatureCollection:
     reader = Reader(file, bbox=bbox)
     features = list(reader)
     return FeatureCollection(features)
 
 
-async def load_http_async(url: str, *, bbox: Rect | None = None) -> FeatureCollection:
+async def load_http_async(
+    url: str | RangeSource, *, bbox: Rect | None = None
+) -> FeatureCollection:
     reader = HTTPReader(url, bbox=bbox)
     features = [feature async for feature in reader]
     return FeatureCollection(features)
 
 
-def load_http(url: str, *, bbox: Rect | None = None) -> FeatureCollection:
+def load_http(url: str | RangeSource, *, bbox: Rect | None = None) -> FeatureCollection:
     reader = HTTPReader(url, bbox=bbox)
     features = [feature for feature in reader]
     return FeatureCollection(features)
@@ -34,7 +39,7 @@ def load_http(url: str, *, bbox: Rect | None = None) -> FeatureCollection:
 class Reader:
     def __init__(
         self,
-        file: BufferedIOBase,
+        file: BufferedIOBase | RangeSource,
         *,
         bbox: Rect | None = None,
         header_meta_fn: HeaderMetaFn | None = None,
@@ -51,7 +56,7 @@ class Reader:
 class HTTPReader:
     def __init__(
         self,
-        url: str,
+        url: str | RangeSource,
         *,
         bbox: Rect | None = None,
         header_meta_fn: HeaderMetaFn | None = None,
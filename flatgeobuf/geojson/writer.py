@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from typing import BinaryIO
+
+from geojson import FeatureCollection
+
+from flatgeobuf.geojson.featurecollection import serialize
+from flatgeobuf.packedrtree import DEFAULT_NODE_SIZE
+
+
+def dump(
+    feature_collection: FeatureCollection,
+    file: BinaryIO,
+    *,
+    index_node_size: int = DEFAULT_NODE_SIZE,
+    memory_budget: int | None = None,
+) -> None:
+    serialize(
+        feature_collection,
+        file,
+        index_node_size=index_node_size,
+        memory_budget=memory_budget,
+    )
+
+
+def dumps(
+    feature_collection: FeatureCollection,
+    *,
+    index_node_size: int = DEFAULT_NODE_SIZE,
+    memory_budget: int | None = None,
+) -> bytes:
+    return serialize(
+        feature_collection,
+        index_node_size=index_node_size,
+        memory_budget=memory_budget,
+    )
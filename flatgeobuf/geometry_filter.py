@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+from typing import Any, List, Tuple, Union
+
+import numpy as np
+
+from flatgeobuf.FlatGeobuf.Feature import Feature
+from flatgeobuf.FlatGeobuf.GeometryType import GeometryType
+from flatgeobuf.packedrtree import NODE_ITEM_DTYPE, PackedRTree, RangeCursor
+
+try:
+    import shapely.geometry
+    import shapely.geometry.base
+    import shapely.prepared
+except ImportError:
+    shapely = None
+
+PREDICATES = ("intersects", "within", "contains")
+
+# (offset, feature_idx, feature_length, needs_exact_test)
+GeometrySearchResult = Tuple[int, int, Union[int, None], bool]
+
+
+def _node_geometry(min_x: float, min_y: float, max_x: float, max_y: float) -> Any:
+    # Boxes of points and axis-aligned lines are degenerate as polygons
+    if min_x == max_x and min_y == max_y:
+        return shapely.geometry.Point(min_x, min_y)
+    if min_x == max_x or min_y == max_y:
+        return shapely.geometry.LineString([(min_x, min_y), (max_x, max_y)])
+    return shapely.geometry.box(min_x, min_y, max_x, max_y)
+
+
+class GeometryFilter:
+    """A query geometry, prepared to test index nodes and features against.
+
+    Features are matched when `feature <predicate> geometry` holds, e.g. with
+    "within", features within the query geometry.
+    """
+
+    def __init__(self, geometry: Any, predicate: str = "intersects"):
+        if shapely is None:
+            raise ImportError("shapely is required to query by geometry")
+        if predicate not in PREDICATES:
+            raise ValueError(f"Unknown predicate {predicate}")
+
+        # Shapely geometries, or anything with a GeoJSON-like geometry mapping
+        if not isinstance(geometry, shapely.geometry.base.BaseGeometry):
+            geometry = shapely.geometry.shape(geometry)
+
+        self.geometry = geometry
+        self.predicate = predicate
+        self.prepared = shapely.prepared.prep(geometry)
+        self.bounds: Tuple[float, float, float, float] = geometry.bounds
+        # Number of features decoded for an exact test
+        self.exact_tests = 0
+
+    def test_nodes(
+        self, nodes: np.ndarray, is_leaf: bool
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(matching, inside) masks of the nodes whose subtree may hold matches,
+        and of those whose whole subtree matches without an exact test."""
+        min_x, min_y, max_x, max_y = self.bounds
+        inside = np.zeros(len(nodes), dtype=bool)
+
+        if self.predicate == "contains":
+            # A feature can only contain the geometry if its bbox, and so the
+            # bbox of every node above it, contains the geometry's bbox.
+            matching = (
+                (nodes["min_x"] <= min_x)
+                & (nodes["min_y"] <= min_y)
+                & (nodes["max_x"] >= max_x)
+                & (nodes["max_y"] >= max_y)
+            )
+            return matching, inside
+
+        candidates = ~(
+            (max_x < nodes["min_x"])
+            | (max_y < nodes["min_y"])
+            | (min_x > nodes["max_x"])
+            | (min_y > nodes["max_y"])
+        )
+        if self.predicate == "within" and is_leaf:
+            # A feature within the geometry has its bbox within the geometry's
+            candidates &= (
+                (min_x <= nodes["min_x"])
+                & (min_y <= nodes["min_y"])
+                & (max_x >= nodes["max_x"])
+                & (max_y >= nodes["max_y"])
+            )
+
+        matching = np.zeros(len(nodes), dtype=bool)
+        for i in np.flatnonzero(candidates).tolist():
+            node = nodes[i]
+            box = _node_geometry(
+                node["min_x"], node["min_y"], node["max_x"], node["max_y"]
+            )
+            # Anything in a box in the interior of the geometry both intersects
+            # it and is within it.
+            if self.prepared.contains_properly(box):
+                matching[i] = inside[i] = True
+            elif self.prepared.intersects(box):
+                matching[i] = True
+        return matching, inside
+
+    def matches(self, feature: Feature, geometry_type: GeometryType) -> bool:
+        # NOTE: Imported here, as the GeoJSON package imports the readers
+        from flatgeobuf.geojson.geometry import from_geometry
+
+        geometry = feature.Geometry()
+        if geometry is None:
+            return False
+
+        self.exact_tests += 1
+        shape = shapely.geometry.shape(from_geometry(geometry, geometry_type))
+        if self.predicate == "intersects":
+            return self.prepared.intersects(shape)
+        if self.predicate == "within":
+            return self.prepared.contains(shape)
+        return self.prepared.within(shape)
+
+
+class GeometryPackedRTree(PackedRTree):
+    """Searches for the features that may match a GeometryFilter.
+
+    Subtrees outside the query geometry are skipped, and features below a node
+    entirely inside it are reported as not needing an exact test.
+    """
+
+    def __init__(
+        self,
+        num_items: int,
+        node_size: int,
+        geometry_filter: GeometryFilter,
+        extra_request_threshold: float | None = None,
+    ):
+        super().__init__(
+            num_items, node_size, geometry_filter.bounds, extra_request_threshold
+        )
+        self.geometry_filter = geometry_filter
+        self.inside_leaf_ranges: List[Tuple[int, int]] = []
+        self.sorted_inside_leaf_ranges: np.ndarray | None = None
+        self.leaf_inside = np.zeros(0, dtype=bool)
+
+    def _below_inside_node(self, cursor: RangeCursor, num_nodes: int) -> np.ndarray:
+        if not self.inside_leaf_ranges:
+            return np.zeros(num_nodes, dtype=bool)
+        if self.sorted_inside_leaf_ranges is None:
+            self.sorted_inside_leaf_ranges = np.array(
+                sorted(self.inside_leaf_ranges), dtype=np.int64
+            )
+        return self._in_leaf_ranges(cursor, num_nodes, self.sorted_inside_leaf_ranges)
+
+    def _scan_node_range(
+        self, cursor: RangeCursor, buffer: bytes
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        nodes = np.frombuffer(
+            buffer, dtype=NODE_ITEM_DTYPE, count=cursor.num_nodes_in_range
+        )
+        owned = nodes[: cursor.num_owned_nodes]
+
+        # Nodes below one found inside the geometry are inside too
+        inherited = self._below_inside_node(cursor, len(owned))
+        matching = inherited.copy()
+        inside = inherited.copy()
+        rest = np.flatnonzero(~inherited)
+        matching[rest], inside[rest] = self.geometry_filter.test_nodes(
+            owned[rest], cursor.is_leaf_node
+        )
+
+        positions = np.flatnonzero(matching)
+        if cursor.is_leaf_node:
+            self.leaf_inside = inside
+        else:
+            first, end = self._subtree_leaves(
+                cursor, np.flatnonzero(inside & ~inherited)
+            )
+            if len(first):
+                self.inside_leaf_ranges.extend(zip(first.tolist(), end.tolist()))
+                self.sorted_inside_leaf_ranges = None
+            self._push_child_ranges(cursor, nodes["offset"][positions].tolist())
+
+        return nodes, positions
+
+    def _leaf_results(
+        self, cursor: RangeCursor, nodes: np.ndarray, positions: np.ndarray
+    ) -> List[GeometrySearchResult]:
+        return [
+            (feature_offset, feature_idx, feature_length, not inside)
+            for (feature_offset, feature_idx, feature_length), inside in zip(
+                super()._leaf_results(cursor, nodes, positions),
+                self.leaf_inside[positions].tolist(),
+            )
+        ]
@@ -3,10 +3,52 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import List
 
+import flatbuffers
+import numpy as np
+
 from flatgeobuf.column_meta import ColumnMeta
 from flatgeobuf.crs_meta import CrsMeta
+from flatgeobuf.FlatGeobuf.Column import (
+    ColumnAddDescription,
+    ColumnAddName,
+    ColumnAddNullable,
+    ColumnAddPrecision,
+    ColumnAddPrimaryKey,
+    ColumnAddScale,
+    ColumnAddTitle,
+    ColumnAddType,
+    ColumnAddUnique,
+    ColumnAddWidth,
+    ColumnEnd,
+    ColumnStart,
+)
+from flatgeobuf.FlatGeobuf.Crs import (
+    CrsAddCode,
+    CrsAddCodeString,
+    CrsAddDescription,
+    CrsAddName,
+    CrsAddOrg,
+    CrsAddWkt,
+    CrsEnd,
+    CrsStart,
+)
 from flatgeobuf.FlatGeobuf.GeometryType import GeometryType
-from flatgeobuf.FlatGeobuf.Header import Header
+from flatgeobuf.FlatGeobuf.Header import (
+    Header,
+    HeaderAddColumns,
+    HeaderAddCrs,
+    HeaderAddDescription,
+    HeaderAddEnvelope,
+    HeaderAddFeaturesCount,
+    HeaderAddGeometryType,
+    HeaderAddHasZ,
+    HeaderAddIndexNodeSize,
+    HeaderAddMetadata,
+    HeaderAddTitle,
+    HeaderEnd,
+    HeaderStart,
+    HeaderStartColumnsVector,
+)
 
 
 @dataclass
@@ -20,6 +62,7 @@ class HeaderMeta:
     title: str | None
     description: str | None
     metadata: str | None
+    has_z: bool = False
 
 
 def from_byte_buffer(bb: bytes | bytearray) -> HeaderMeta:
@@ -63,16 +106,127 @@ def from_byte_buffer(bb: bytes | bytearray) -> HeaderMeta:
             code_string=crs.CodeString(),
         )
 
+    envelope = None
+    if header.EnvelopeLength() == 4:
+        envelope = header.EnvelopeAsNumpy().tolist()
+
     header_meta = HeaderMeta(
         geometry_type=header.GeometryType(),
         columns=columns,
-        envelope=None,
+        envelope=envelope,
         features_count=features_count,
         index_node_size=index_node_size,
         crs=crs_meta,
         title=header.Title(),
         description=header.Description(),
         metadata=header.Metadata(),
+        has_z=header.HasZ(),
     )
 
     return header_meta
+
+
+def build_column(builder: flatbuffers.Builder, column: ColumnMeta) -> int:
+    name_offset = builder.CreateString(column.name)
+    title_offset = builder.CreateString(column.title) if column.title else None
+    description_offset = (
+        builder.CreateString(column.description) if column.description else None
+    )
+
+    ColumnStart(builder)
+    ColumnAddName(builder, name_offset)
+    ColumnAddType(builder, column.type)
+    if title_offset is not None:
+        ColumnAddTitle(builder, title_offset)
+    if description_offset is not None:
+        ColumnAddDescription(builder, description_offset)
+    # NOTE: 0 is treated as unset, the schema default being -1
+    if column.width > 0:
+        ColumnAddWidth(builder, column.width)
+    if column.precision > 0:
+        ColumnAddPrecision(builder, column.precision)
+    if column.scale > 0:
+        ColumnAddScale(builder, column.scale)
+    ColumnAddNullable(builder, column.nullable)
+    ColumnAddUnique(builder, column.unique)
+    ColumnAddPrimaryKey(builder, column.primary_key)
+    return ColumnEnd(builder)
+
+
+def build_crs(builder: flatbuffers.Builder, crs: CrsMeta) -> int:
+    strings = {
+        field: builder.CreateString(value) if value else None
+        for field, value in [
+            ("org", crs.org),
+            ("name", crs.name),
+            ("description", crs.description),
+            ("wkt", crs.wkt),
+            ("code_string", crs.code_string),
+        ]
+    }
+
+    CrsStart(builder)
+    if strings["org"] is not None:
+        CrsAddOrg(builder, strings["org"])
+    CrsAddCode(builder, crs.code)
+    if strings["name"] is not None:
+        CrsAddName(builder, strings["name"])
+    if strings["description"] is not None:
+        CrsAddDescription(builder, strings["description"])
+    if strings["wkt"] is not None:
+        CrsAddWkt(builder, strings["wkt"])
+    if strings["code_string"] is not None:
+        CrsAddCodeString(builder, strings["code_string"])
+    return CrsEnd(builder)
+
+
+def build_header(header_meta: HeaderMeta) -> bytes:
+    """Build a size-prefixed Header flatbuffer, as stored after the magic bytes."""
+    builder = flatbuffers.Builder(1024)
+
+    columns_offset = None
+    if header_meta.columns:
+        column_offsets = [build_column(builder, c) for c in header_meta.columns]
+        HeaderStartColumnsVector(builder, len(column_offsets))
+        for column_offset in reversed(column_offsets):
+            builder.PrependUOffsetTRelative(column_offset)
+        columns_offset = builder.EndVector()
+
+    envelope_offset = None
+    if header_meta.envelope:
+        envelope_offset = builder.CreateNumpyVector(
+            np.asarray(header_meta.envelope, dtype=np.float64)
+        )
+
+    crs_offset = build_crs(builder, header_meta.crs) if header_meta.crs else None
+    title_offset, description_offset, metadata_offset = [
+        builder.CreateString(value) if value else None
+        for value in (
+            header_meta.title,
+            header_meta.description,
+            header_meta.metadata,
+        )
+    ]
+
+    HeaderStart(builder)
+    if envelope_offset is not None:
+        HeaderAddEnvelope(builder, envelope_offset)
+    HeaderAddGeometryType(builder, header_meta.geometry_type)
+    if header_meta.has_z:
+        HeaderAddHasZ(builder, True)
+    if columns_offset is not None:
+        HeaderAddColumns(builder, columns_offset)
+    HeaderAddFeaturesCount(builder, header_meta.features_count)
+    HeaderAddIndexNodeSize(builder, header_meta.index_node_size)
+    if crs_offset is not None:
+        HeaderAddCrs(builder, crs_offset)
+    if title_offset is not None:
+        HeaderAddTitle(builder, title_offset)
+    if description_offset is not None:
+        HeaderAddDescription(builder, description_offset)
+    if metadata_offset is not None:
+        HeaderAddMetadata(builder, metadata_offset)
+    header_offset = HeaderEnd(builder)
+    builder.FinishSizePrefixed(header_offset)
+
+    return bytes(builder.Output())
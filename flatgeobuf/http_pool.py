@@ -0,0 +1,357 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import ssl
+import sys
+import urllib.error
+import urllib.request
+import weakref
+from collections import deque
+from dataclasses import dataclass
+from email.message import Message
+from logging import getLogger
+from typing import Deque, Dict, Tuple
+from urllib.parse import unquote, urljoin, urlsplit
+
+from flatgeobuf import fetch_ahead
+from flatgeobuf.config import Config
+
+logger = getLogger(__name__)
+
+# (scheme, host, port)
+HostKey = Tuple[str, str, int]
+Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+# Responses that never have a body, whatever their headers say
+NO_BODY_STATUSES = (204, 304)
+
+# Sockets can't be opened under Pyodide, where pyodide_http patches urllib
+sockets_supported = sys.platform != "emscripten"
+
+_pools: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, HttpConnectionPool] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+@dataclass
+class HttpResponse:
+    url: str
+    status: int
+    reason: str
+    headers: Message
+    body: bytes
+
+
+def with_credentials(url: str, headers: Dict[str, str]) -> Tuple[str, Dict[str, str]]:
+    """The url without the user and password it may hold, and the headers
+    with basic auth for them."""
+    parts = urlsplit(url)
+    if parts.username is None:
+        return url, headers
+    credentials = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+    token = base64.b64encode(credentials.encode("utf-8")).decode("ascii")
+    url = parts._replace(netloc=parts.netloc.rpartition("@")[2]).geturl()
+    return url, {"Authorization": f"Basic {token}", **headers}
+
+
+def proxy_for(url: str) -> str | None:
+    """The proxy urllib would send a request for the url through, if any, as
+    configured by HTTP_PROXY, HTTPS_PROXY and NO_PROXY or the system."""
+    parts = urlsplit(url)
+    proxy = urllib.request.getproxies().get(parts.scheme.lower())
+    if proxy is None or urllib.request.proxy_bypass(parts.netloc.rpartition("@")[2]):
+        return None
+    return proxy
+
+
+def urlopen(
+    url: str, headers: Dict[str, str], body_limit: int | None, timeout: float
+) -> HttpResponse:
+    """GET the url with urllib, following redirects and going through proxies.
+
+    Error statuses are returned like any other response. The body of a 200
+    response is read no further than `body_limit` bytes.
+    """
+    url, headers = with_credentials(url, headers)
+    request = urllib.request.Request(url, headers=headers)
+    # Unlike urllib.request.urlopen's, a new opener reads the proxies from the
+    # environment as it is now, as proxy_for does.
+    opener = urllib.request.build_opener()
+    try:
+        with opener.open(request, timeout=timeout) as response:
+            limit = body_limit if response.status == 200 else None
+            return HttpResponse(
+                url,
+                response.status,
+                response.reason,
+                response.headers,
+                response.read(limit),
+            )
+    except urllib.error.HTTPError as e:
+        return HttpResponse(url, e.code, e.reason, e.headers, b"")
+
+
+class _HostPool:
+    def __init__(self, max_connections: int):
+        self.semaphore = asyncio.Semaphore(max_connections)
+        self.idle: Deque[Connection] = deque()
+
+
+class HttpConnectionPool:
+    """Keep-alive HTTP/1.1 connections over asyncio streams, pooled per host.
+
+    At most `max_connections_per_host` requests to a host are in flight at
+    once, and each request, connection included, fails with
+    asyncio.TimeoutError after `timeout` seconds. A pool belongs to the event
+    loop it is used on; for_running_loop() returns the one shared by every
+    reader on the running loop.
+
+    Credentials in a URL are sent with basic auth. Requests to URLs that the
+    environment sends through a proxy, and every request where sockets can't
+    be opened (Pyodide), are made with urllib instead, without keep-alive
+    connections.
+    """
+
+    def __init__(
+        self,
+        max_connections_per_host: int | None = None,
+        timeout: float | None = None,
+    ):
+        config = Config.global_instance
+        if max_connections_per_host is None:
+            max_connections_per_host = config.http_max_connections_per_host()
+        if timeout is None:
+            timeout = config.http_timeout()
+
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self.hosts: Dict[HostKey, _HostPool] = {}
+        self.ssl_context = ssl.create_default_context()
+        self.connections_ever_opened = 0
+        self.requests_ever_made = 0
+
+    @staticmethod
+    def for_running_loop() -> HttpConnectionPool:
+        loop = asyncio.get_running_loop()
+        pool = _pools.get(loop)
+        if pool is None:
+            pool = _pools[loop] = HttpConnectionPool()
+        return pool
+
+    def host_pool(self, key: HostKey) -> _HostPool:
+        host_pool = self.hosts.get(key)
+        if host_pool is None:
+            host_pool = self.hosts[key] = _HostPool(self.max_connections_per_host)
+        return host_pool
+
+    async def get(
+        self, url: str, headers: Dict[str, str], body_limit: int | None = None
+    ) -> HttpResponse:
+        """GET the url, following redirects.
+
+        The body of a 200 response is read no further than `body_limit` bytes.
+        """
+        if not sockets_supported or proxy_for(url) is not None:
+            parts = urlsplit(url)
+            scheme = parts.scheme.lower()
+            port = parts.port or (443 if scheme == "https" else 80)
+            key = (scheme, parts.hostname or "", port)
+            async with self.host_pool(key).semaphore:
+                self.requests_ever_made += 1
+                return await self._urlopen(url, headers, body_limit)
+
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await self.request(url, headers, body_limit)
+            location = response.headers.get("Location")
+            if response.status not in REDIRECT_STATUSES or location is None:
+                return response
+            url = urljoin(url, location)
+        raise urllib.error.HTTPError(
+            url, response.status, "Too many redirects", response.headers, None
+        )
+
+    async def _urlopen(
+        self, url: str, headers: Dict[str, str], body_limit: int | None
+    ) -> HttpResponse:
+        if fetch_ahead.threads_supported:
+            return await asyncio.to_thread(
+                urlopen, url, headers, body_limit, self.timeout
+            )
+        # Without threads either, the request blocks the event loop
+        return urlopen(url, headers, body_limit, self.timeout)
+
+    async def request(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        body_limit: int | None = None,
+        method: str = "GET",
+    ) -> HttpResponse:
+        url, headers = with_credentials(url, headers)
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported URL scheme: {scheme}")
+        host = parts.hostname or ""
+        port = parts.port or (443 if scheme == "https" else 80)
+        target = parts.path or "/"
+        if parts.query:
+            target += f"?{parts.query}"
+
+        default_port = port == (443 if scheme == "https" else 80)
+        request_headers = {
+            "Host": host if default_port else f"{host}:{port}",
+            "Connection": "keep-alive",
+            **headers,
+        }
+        request = f"{method} {target} HTTP/1.1\r\n" + "".join(
+            f"{name}: {value}\r\n" for name, value in request_headers.items()
+        )
+        data = (request + "\r\n").encode("latin-1")
+
+        key = (scheme, host, port)
+        host_pool = self.host_pool(key)
+        # Time spent waiting for a free slot doesn't count towards the timeout
+        async with host_pool.semaphore:
+            self.requests_ever_made += 1
+            return await asyncio.wait_for(
+                self._exchange(url, key, data, host_pool, body_limit, method),
+                self.timeout,
+            )
+
+    async def _exchange(
+        self,
+        url: str,
+        key: HostKey,
+        data: bytes,
+        host_pool: _HostPool,
+        body_limit: int | None,
+        method: str,
+    ) -> HttpResponse:
+        # A pooled connection may have been closed by the server while idle,
+        # in which case the request is retried on a new one.
+        while host_pool.idle:
+            connection = host_pool.idle.pop()
+            try:
+                return await self._send(
+                    url, connection, data, host_pool, body_limit, method
+                )
+            except (ConnectionError, asyncio.IncompleteReadError):
+                logger.debug(f"pooled connection to {key[1]}:{key[2]} was closed")
+
+        connection = await self._connect(*key)
+        return await self._send(url, connection, data, host_pool, body_limit, method)
+
+    async def _connect(self, scheme: str, host: str, port: int) -> Connection:
+        self.connections_ever_opened += 1
+        if scheme == "https":
+            return await asyncio.open_connection(
+                host, port, ssl=self.ssl_context, server_hostname=host
+            )
+        return await asyncio.open_connection(host, port)
+
+    async def _send(
+        self,
+        url: str,
+        connection: Connection,
+        data: bytes,
+        host_pool: _HostPool,
+        body_limit: int | None,
+        method: str,
+    ) -> HttpResponse:
+        reader, writer = connection
+        reusable = False
+        try:
+            writer.write(data)
+            await writer.drain()
+            response, reusable = await self._read_response(
+                url, reader, body_limit, method
+            )
+            return response
+        finally:
+            # Cancelled or failed connections are never reused, since part of
+            # a response may still be waiting to be read from them.
+            if reusable:
+                host_pool.idle.append(connection)
+            else:
+                writer.close()
+
+    async def _read_response(
+        self,
+        url: str,
+        reader: asyncio.StreamReader,
+        body_limit: int | None,
+        method: str,
+    ) -> Tuple[HttpResponse, bool]:
+        # Informational responses come ahead of the actual one
+        version, status, reason, headers = await self._read_head(reader)
+        while 100 <= status < 200:
+            version, status, reason, headers = await self._read_head(reader)
+
+        connection = headers.get("Connection", "").lower()
+        closing = version != "HTTP/1.1" or connection == "close"
+        reusable = not closing
+        content_length = headers.get("Content-Length")
+        if method == "HEAD" or status in NO_BODY_STATUSES:
+            body = b""
+        elif (
+            body_limit is not None
+            and status == 200
+            and content_length is not None
+            and int(content_length) > body_limit
+        ):
+            # The rest of the body is dropped along with the connection
+            body = await reader.readexactly(body_limit)
+            reusable = False
+        elif "chunked" in headers.get("Transfer-Encoding", "").lower():
+            body = await self._read_chunked(reader)
+        elif content_length is not None:
+            body = await reader.readexactly(int(content_length))
+        elif closing:
+            # The body ends with the connection
+            body = await reader.read()
+        else:
+            # Without a length on a kept-alive connection, e.g. a 416 from
+            # some servers, no body can be told apart, and the connection is
+            # dropped rather than waited on.
+            body = b""
+            reusable = False
+
+        return HttpResponse(url, status, reason, headers, body), reusable
+
+    async def _read_head(
+        self, reader: asyncio.StreamReader
+    ) -> Tuple[str, int, str, Message]:
+        # (version, status, reason, headers) of a response
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed before a response")
+        version, status, *reason = status_line.decode("latin-1").split(" ", 2)
+        reason_text = reason[0].strip() if reason else ""
+
+        headers = Message()
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n"):
+                break
+            if not line:
+                raise asyncio.IncompleteReadError(b"", None)
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip()] = value.strip()
+        return version, int(status), reason_text, headers
+
+    async def _read_chunked(self, reader: asyncio.StreamReader) -> bytes:
+        chunks = []
+        while True:
+            size_line = await reader.readline()
+            size = int(size_line.split(b";", 1)[0].strip(), 16)
+            if size == 0:
+                # Skip trailers, up to the blank line ending the body
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
@@ -1,21 +1,94 @@
 from __future__ import annotations
 
-import urllib.request
+import time
+import urllib.error
+from email.message import Message
 from logging import getLogger
+from typing import List, Sequence, Tuple
+
+from flatgeobuf.batching import BatchingPolicy
+from flatgeobuf.block_cache import BlockCache
+from flatgeobuf.config import Config
+from flatgeobuf.disk_cache import DiskRangeCache, Validators
+from flatgeobuf.http_pool import HttpConnectionPool, HttpResponse, urlopen
+from flatgeobuf.range_source import (
+    ByteRange,
+    RangeSource,
+    get_range_async,
+    get_ranges,
+    get_ranges_async,
+)
+from flatgeobuf.request_policy import RequestPolicy, RequestStats
 
 logger = getLogger(__name__)
 
+# (first byte, data) of a part of a response
+ResponsePart = Tuple[int, bytes]
+
+
+def parse_content_range(value: str | None) -> Tuple[int, int, int | None] | None:
+    """(first, last, size) of a `bytes <first>-<last>/<size>` Content-Range,
+    where size may be unknown."""
+    if not value or not value.startswith("bytes ") or "/" not in value:
+        return None
+    span, size = value[len("bytes ") :].split("/", 1)
+    if "-" not in span:
+        return None
+    first, last = span.split("-", 1)
+    return int(first), int(last), int(size) if size.isdigit() else None
+
+
+def response_validators(headers: Message) -> Validators:
+    content_range = parse_content_range(headers.get("Content-Range"))
+    return Validators(
+        headers.get("ETag"),
+        headers.get("Last-Modified"),
+        content_range[2] if content_range is not None else None,
+    )
+
+
+def parse_byteranges(body: bytes, boundary: str) -> List[ResponsePart]:
+    """Parts of a multipart/byteranges response body."""
+    parts: List[ResponsePart] = []
+    delimiter = b"\r\n--" + boundary.encode("latin-1")
+    # The first delimiter may not be preceded by a line break
+    for segment in (b"\r\n" + body).split(delimiter)[1:]:
+        if segment.startswith(b"--"):
+            break
+        head, _, data = segment.partition(b"\r\n\r\n")
+        headers = Message()
+        for line in head.decode("latin-1").split("\r\n"):
+            name, _, value = line.partition(":")
+            if value:
+                headers[name.strip()] = value.strip()
+        content_range = parse_content_range(headers.get("Content-Range"))
+        if content_range is not None:
+            parts.append((content_range[0], data))
+    return parts
+
 
 class BufferedHttpRangeClient:
-    def __init__(self, source: str | HttpRangeClient):
+    def __init__(
+        self,
+        source: str | RangeSource,
+        cache: BlockCache | None = None,
+        batching: BatchingPolicy | None = None,
+    ):
         self.bytes_ever_used = 0
         self.bytes_ever_fetched = 0
-        self.buffer = bytearray()
+        # Ranges served from the buffer or the block cache, and fetched
+        self.hits = 0
+        self.misses = 0
+        self.cache = cache
+        # Told how long each fetch took, to adapt the batching of the reader
+        self.batching = batching or BatchingPolicy()
+        self.buffer = memoryview(b"")
         self.head = 0
 
+        self.http_client: RangeSource
         if isinstance(source, str):
             self.http_client = HttpRangeClient(source)
-        elif isinstance(source, HttpRangeClient):
+        elif isinstance(source, RangeSource):
             self.http_client = source
         else:
             raise ValueError("Unknown source")
@@ -28,17 +101,31 @@ class BufferedHttpRangeClient:
         start_i = start - self.head
         end_i = start_i + length
         if start_i >= 0 and end_i <= len(self.buffer):
+            self.hits += 1
             return self.buffer[start_i:end_i]
 
-        length_to_fetch = max(length, min_req_length)
+        if self.cache is not None:
+            cached = self.cache.read(start, length)
+            if cached is not None:
+                self.hits += 1
+                return cached
+        self.misses += 1
 
-        self.bytes_ever_fetched += length_to_fetch
-        self.buffer = await self.http_client.get_range_async(
-            start, length_to_fetch, purpose
-        )
-        self.head = start
+        await self.fetch_async(start, max(length, min_req_length), purpose)
+        return self.buffer[start - self.head : start - self.head + length]
 
-        return self.buffer[:length]
+    async def fill_async(self, start: int, length: int, purpose: str) -> None:
+        """Buffer the range, so that reads within it need no further request."""
+        if not self.fill_from_cache(start, length):
+            await self.fetch_async(start, length, purpose)
+
+    async def fetch_async(self, start: int, length: int, purpose: str) -> None:
+        begin = self.fetch_start(start)
+        length_to_fetch = start - begin + length
+        fetch_start = time.perf_counter()
+        data = await get_range_async(self.http_client, begin, length_to_fetch, purpose)
+        self.batching.record(length_to_fetch, time.perf_counter() - fetch_start)
+        self.hold(begin, data, length_to_fetch)
 
     def get_range(
         self, start: int, length: int, min_req_length: int, purpose: str
@@ -48,59 +135,409 @@ class BufferedHttpRangeClient:
         start_i = start - self.head
         end_i = start_i + length
         if start_i >= 0 and end_i <= len(self.buffer):
+            self.hits += 1
             return self.buffer[start_i:end_i]
 
-        length_to_fetch = max(length, min_req_length)
+        if self.cache is not None:
+            cached = self.cache.read(start, length)
+            if cached is not None:
+                self.hits += 1
+                return cached
+        self.misses += 1
+
+        self.fetch(start, max(length, min_req_length), purpose)
+        return self.buffer[start - self.head : start - self.head + length]
+
+    def fill(self, start: int, length: int, purpose: str) -> None:
+        """Buffer the range, so that reads within it need no further request."""
+        if not self.fill_from_cache(start, length):
+            self.fetch(start, length, purpose)
+
+    def fetch(self, start: int, length: int, purpose: str) -> None:
+        begin = self.fetch_start(start)
+        length_to_fetch = start - begin + length
+        fetch_start = time.perf_counter()
+        data = self.http_client.get_range(begin, length_to_fetch, purpose)
+        self.batching.record(length_to_fetch, time.perf_counter() - fetch_start)
+        self.hold(begin, data, length_to_fetch)
+
+    def fill_from_cache(self, start: int, length: int) -> bool:
+        if self.cache is not None:
+            cached = self.cache.read(start, length)
+            if cached is not None:
+                self.hits += 1
+                self.buffer = memoryview(cached)
+                self.head = start
+                return True
+        self.misses += 1
+        return False
 
-        self.bytes_ever_fetched += length_to_fetch
-        self.buffer = self.http_client.get_range(start, length_to_fetch, purpose)
-        self.head = start
+    def fetch_start(self, start: int) -> int:
+        # Fetch from the start of the block, so that the fetch fills whole
+        # blocks other reads may share.
+        return start if self.cache is None else self.cache.block_start(start)
 
-        return self.buffer[:length]
+    def hold(self, begin: int, data: bytes, requested_length: int) -> None:
+        """Buffer `data`, fetched from `begin`, for the reads that follow."""
+        self.bytes_ever_fetched += requested_length
+        self.buffer = memoryview(data)
+        self.head = begin
+        if self.cache is not None:
+            self.cache.store(begin, self.buffer, requested_length)
+
+    @staticmethod
+    async def fill_many_async(
+        clients: Sequence[BufferedHttpRangeClient],
+        ranges: Sequence[ByteRange],
+        purpose: str,
+    ) -> None:
+        """Fill each client with its range, fetching those not cached together."""
+        fetches = [
+            (client, client.fetch_start(start), start, length)
+            for client, (start, length) in zip(clients, ranges)
+            if not client.fill_from_cache(start, length)
+        ]
+        if not fetches:
+            return
+        fetch_ranges = [
+            (begin, start - begin + length) for _, begin, start, length in fetches
+        ]
+        client = fetches[0][0]
+        fetch_start = time.perf_counter()
+        datas = await get_ranges_async(client.http_client, fetch_ranges, purpose)
+        client.batching.record(
+            sum(length for _, length in fetch_ranges), time.perf_counter() - fetch_start
+        )
+        for (client, begin, _, _), (_, length), data in zip(
+            fetches, fetch_ranges, datas
+        ):
+            client.hold(begin, data, length)
+
+    @staticmethod
+    def fill_many(
+        clients: Sequence[BufferedHttpRangeClient],
+        ranges: Sequence[ByteRange],
+        purpose: str,
+    ) -> None:
+        """Fill each client with its range, fetching those not cached together."""
+        fetches = [
+            (client, client.fetch_start(start), start, length)
+            for client, (start, length) in zip(clients, ranges)
+            if not client.fill_from_cache(start, length)
+        ]
+        if not fetches:
+            return
+        fetch_ranges = [
+            (begin, start - begin + length) for _, begin, start, length in fetches
+        ]
+        client = fetches[0][0]
+        fetch_start = time.perf_counter()
+        datas = get_ranges(client.http_client, fetch_ranges, purpose)
+        client.batching.record(
+            sum(length for _, length in fetch_ranges), time.perf_counter() - fetch_start
+        )
+        for (client, begin, _, _), (_, length), data in zip(
+            fetches, fetch_ranges, datas
+        ):
+            client.hold(begin, data, length)
 
     def log_usage(self, purpose: str) -> None:
         category = purpose.split(" ")[0]
         used = self.bytes_ever_used
         requested = self.bytes_ever_fetched
-        efficiency = f"{(100.0 * used / requested):.2f}"
+        efficiency = f"{(100.0 * used / requested):.2f}" if requested else "-"
 
         logger.info(
-            f"{category} bytes used/requested: {used} / {requested} = {efficiency}%"
+            f"{category} bytes used/requested: {used} / {requested} = {efficiency}%, hits/misses: {self.hits} / {self.misses}"
         )
+        stats = getattr(self.http_client, "stats", None)
+        if stats is not None:
+            logger.info(f"{category} requests {stats.summary()}")
 
 
 class HttpRangeClient:
-    def __init__(self, url: str):
+    def __init__(
+        self,
+        url: str,
+        pool: HttpConnectionPool | None = None,
+        disk_cache: DiskRangeCache | None = None,
+        policy: RequestPolicy | None = None,
+    ):
         self.url = url
+        # Async requests go through this pool, or by default the one shared
+        # on the running event loop.
+        self.pool = pool
+        # Ranges are kept across processes in this cache, or by default the
+        # configured one, if any.
+        self.disk_cache = disk_cache or DiskRangeCache.from_config()
+        # Timeout, retries and hedging of the requests
+        self.policy = policy or RequestPolicy.from_config()
+        self.stats = RequestStats()
         self.requests_ever_made = 0
         self.bytes_ever_requested = 0
+        # Total size of the resource, once a response has reported it
+        self.known_size: int | None = None
+        # Whether the server answers multi-range requests, once known
+        self.multi_range: bool | None = None
 
-    async def get_range_async(self, begin: int, length: int, purpose: str) -> bytes:
-        # TODO: Use aiohttp
-        # raise NotImplementedError()
+    def size(self) -> int | None:
+        return self.known_size
+
+    def record_size(self, response) -> None:
+        content_range = parse_content_range(response.headers.get("Content-Range"))
+        if content_range is not None and content_range[2] is not None:
+            self.known_size = content_range[2]
+
+    def max_ranges_per_request(self) -> int:
+        # Ranges are requested one by one from servers known not to answer
+        # multi-range requests, and up to the configured number at once
+        # otherwise.
+        if self.multi_range is False:
+            return 1
+        return Config.global_instance.max_ranges_per_request()
+
+    def multi_range_groups(self, ranges: Sequence[ByteRange]) -> List[List[ByteRange]]:
+        max_ranges = self.max_ranges_per_request()
+        return [
+            list(ranges[i : i + max_ranges]) for i in range(0, len(ranges), max_ranges)
+        ]
+
+    def multi_range_request(self, ranges: Sequence[ByteRange]) -> Tuple[str, int]:
         self.requests_ever_made += 1
-        self.bytes_ever_requested += length
+        self.bytes_ever_requested += sum(length for _, length in ranges)
+        range_header = "bytes=" + ",".join(
+            f"{begin}-{begin + length - 1}" for begin, length in ranges
+        )
+        # A server ignoring the ranges answers with the whole resource. It is
+        # read up to the end of the last range when that is not much more than
+        # the ranges themselves, and dropped otherwise.
+        end = max(begin + length for begin, length in ranges)
+        requested = sum(length for _, length in ranges)
+        extra_request_threshold = Config.global_instance.extra_request_threshold()
+        body_limit = end if end <= requested + extra_request_threshold else 0
+        return range_header, body_limit
 
-        range_header = f"bytes={begin}-{begin + length - 1}"
-        headers = {
-            "Range": range_header,
-        }
+    def split_parts(
+        self,
+        ranges: Sequence[ByteRange],
+        status: int,
+        headers: Message,
+        body: bytes,
+    ) -> List[bytes | None]:
+        # Each range out of the response, or None for those it lacks
+        single_range = False
+        if status == 200:
+            self.multi_range = False
+            parts = [(0, body)]
+        elif headers.get_content_type() == "multipart/byteranges":
+            self.multi_range = True
+            parts = parse_byteranges(body, headers.get_param("boundary") or "")
+        else:
+            # A single range, either all of them coalesced or only the first
+            single_range = True
+            content_range = parse_content_range(headers.get("Content-Range"))
+            parts = [] if content_range is None else [(content_range[0], body)]
+            if content_range is not None and content_range[2] is not None:
+                self.known_size = content_range[2]
 
-        req = urllib.request.Request(self.url, headers=headers)
-        response = urllib.request.urlopen(req)
+        results: List[bytes | None] = []
+        for begin, length in ranges:
+            end = begin + length
+            if self.known_size is not None:
+                end = min(end, self.known_size)
+            result = None
+            for first, data in parts:
+                if first <= begin and end <= first + len(data):
+                    result = memoryview(data)[begin - first : end - first]
+                    break
+            results.append(result)
 
-        return response.read()
+        if single_range and None in results:
+            # Only the first range was answered
+            self.multi_range = False
+
+        if self.disk_cache is not None and status == 206:
+            validators = response_validators(headers)
+            if validators.size is None:
+                # Multipart responses report it in each part
+                validators.size = self.known_size
+            for first, data in parts:
+                self.disk_cache.store(self.url, first, data, validators)
+        return results
+
+    def read_disk_cache(self, ranges: Sequence[ByteRange]) -> List[bytes | None]:
+        # The ranges found in the disk cache, None for the others
+        if self.disk_cache is None:
+            return [None] * len(ranges)
+        return [
+            self.disk_cache.read(self.url, begin, length) for begin, length in ranges
+        ]
+
+    async def get_ranges_async(
+        self, ranges: Sequence[ByteRange], purpose: str
+    ) -> List[bytes]:
+        """Fetch several ranges, several at a time with multi-range requests
+        where the server supports them."""
+        cached = self.read_disk_cache(ranges)
+        missing = [
+            byte_range for byte_range, data in zip(ranges, cached) if data is None
+        ]
+        fetched = iter(await self.fetch_ranges_async(missing, purpose))
+        return [data if data is not None else next(fetched) for data in cached]
+
+    async def fetch_ranges_async(
+        self, ranges: Sequence[ByteRange], purpose: str
+    ) -> List[bytes]:
+        results: List[bytes] = []
+        for group in self.multi_range_groups(ranges):
+            if len(group) == 1:
+                begin, length = group[0]
+                results.append(await self.get_range_async(begin, length, purpose))
+                continue
+
+            range_header, body_limit = self.multi_range_request(group)
+            response = await self.send_async(range_header, body_limit)
+            parts = []
+            if response.status != 416:
+                parts = self.split_parts(
+                    group, response.status, response.headers, response.body
+                )
+            for i, (begin, length) in enumerate(group):
+                # Ranges missing from the response are fetched on their own
+                part = parts[i] if parts else None
+                if part is None:
+                    part = await self.get_range_async(begin, length, purpose)
+                results.append(part)
+        return results
+
+    def get_ranges(self, ranges: Sequence[ByteRange], purpose: str) -> List[bytes]:
+        """Fetch several ranges, several at a time with multi-range requests
+        where the server supports them."""
+        cached = self.read_disk_cache(ranges)
+        missing = [
+            byte_range for byte_range, data in zip(ranges, cached) if data is None
+        ]
+        fetched = iter(self.fetch_ranges(missing, purpose))
+        return [data if data is not None else next(fetched) for data in cached]
+
+    def fetch_ranges(self, ranges: Sequence[ByteRange], purpose: str) -> List[bytes]:
+        results: List[bytes] = []
+        for group in self.multi_range_groups(ranges):
+            if len(group) == 1:
+                begin, length = group[0]
+                results.append(self.get_range(begin, length, purpose))
+                continue
+
+            range_header, body_limit = self.multi_range_request(group)
+            response = self.send(range_header, body_limit)
+            parts = []
+            if response.status != 416:
+                parts = self.split_parts(
+                    group, response.status, response.headers, response.body
+                )
+            for i, (begin, length) in enumerate(group):
+                # Ranges missing from the response are fetched on their own
+                part = parts[i] if parts else None
+                if part is None:
+                    part = self.get_range(begin, length, purpose)
+                results.append(part)
+        return results
+
+    async def get_range_async(self, begin: int, length: int, purpose: str) -> bytes:
+        if self.disk_cache is not None:
+            cached = self.disk_cache.read(self.url, begin, length)
+            if cached is not None:
+                return cached
 
-    def get_range(self, begin: int, length: int, purpose: str) -> bytes:
         self.requests_ever_made += 1
         self.bytes_ever_requested += length
+        range_header = f"bytes={begin}-{begin + length - 1}"
+        response = await self.send_async(range_header)
+        return self.range_data(begin, length, response)
 
+    def get_range(self, begin: int, length: int, purpose: str) -> bytes:
+        if self.disk_cache is not None:
+            cached = self.disk_cache.read(self.url, begin, length)
+            if cached is not None:
+                return cached
+
+        self.requests_ever_made += 1
+        self.bytes_ever_requested += length
         range_header = f"bytes={begin}-{begin + length - 1}"
-        headers = {
-            "Range": range_header,
-        }
+        response = self.send(range_header)
+        return self.range_data(begin, length, response)
+
+    def range_data(self, begin: int, length: int, response: HttpResponse) -> bytes:
+        # The range out of the response to a request for it
+        if response.status == 416:
+            # The range starts past the end of the resource
+            return b""
+
+        if response.status == 200:
+            # The server ignored the range and sent the whole resource
+            self.known_size = len(response.body)
+            data = response.body[begin : begin + length]
+            validators = Validators(
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                self.known_size,
+            )
+        else:
+            self.record_size(response)
+            data = response.body
+            validators = response_validators(response.headers)
 
-        req = urllib.request.Request(self.url, headers=headers)
-        response = urllib.request.urlopen(req)
+        if self.disk_cache is not None:
+            self.disk_cache.store(self.url, begin, data, validators)
+        return data
+
+    async def send_async(
+        self, range_header: str, body_limit: int | None = None
+    ) -> HttpResponse:
+        """GET the range, retried and hedged as the policy says.
+
+        The body of a 200 response is read no further than `body_limit` bytes.
+        """
+        return await self.policy.call_async(
+            lambda: self._send_async(range_header, body_limit), self.stats
+        )
 
-        return response.read()
+    async def _send_async(
+        self, range_header: str, body_limit: int | None
+    ) -> HttpResponse:
+        pool = self.pool or HttpConnectionPool.for_running_loop()
+        response = await pool.get(
+            self.url, {"Range": range_header}, body_limit=body_limit
+        )
+        if response.status >= 400 and response.status != 416:
+            raise urllib.error.HTTPError(
+                response.url,
+                response.status,
+                response.reason,
+                response.headers,
+                None,
+            )
+        return response
+
+    def send(self, range_header: str, body_limit: int | None = None) -> HttpResponse:
+        """GET the range, retried and hedged as the policy says.
+
+        The body of a 200 response is read no further than `body_limit` bytes.
+        """
+        return self.policy.call(
+            lambda: self._send(range_header, body_limit), self.stats
+        )
+
+    def _send(self, range_header: str, body_limit: int | None) -> HttpResponse:
+        response = urlopen(
+            self.url, {"Range": range_header}, body_limit, self.policy.timeout
+        )
+        if response.status >= 400 and response.status != 416:
+            raise urllib.error.HTTPError(
+                response.url,
+                response.status,
+                response.reason,
+                response.headers,
+                None,
+            )
+        return response
@@ -1,20 +1,54 @@
 from __future__ import annotations
 
+import math
 from logging import getLogger
-from typing import Any, AsyncGenerator, List, Tuple, Generator
+from typing import Any, Dict, List, Sequence, Tuple, Generator
 
+import numpy as np
+
+from flatgeobuf.batching import Batch, BatchingPolicy, group_batches
+from flatgeobuf.bbox_filter import bbox_intersects, geometry_bbox
+from flatgeobuf.block_cache import BlockCache
 from flatgeobuf.config import Config
 from flatgeobuf.constants import SIZE_PREFIX_LEN, magicbytes
+from flatgeobuf.fetch_ahead import FetchTask, fetch_ahead
 from flatgeobuf.FlatGeobuf.Feature import Feature
+from flatgeobuf.geometry_filter import GeometryFilter, GeometryPackedRTree
 from flatgeobuf.header_meta import HeaderMeta, from_byte_buffer
-from flatgeobuf.http_range_client import BufferedHttpRangeClient
+from flatgeobuf.http_range_client import BufferedHttpRangeClient, HttpRangeClient
 from flatgeobuf.packedrtree import (
     DEFAULT_NODE_SIZE,
+    IndexHits,
     NODE_ITEM_BYTE_LEN,
+    NODE_ITEM_DTYPE,
+    MultiRectPackedRTree,
     PackedRTree,
     Rect,
+    SearchResult,
+    calc_prefetch_size,
     calc_tree_size,
+    generate_level_bounds,
+)
+from flatgeobuf.query_planner import (
+    AUTO,
+    HYBRID,
+    INDEX,
+    REMOTE,
+    SCAN,
+    CostModel,
+    QueryPlan,
+    check_strategy,
+    estimation_level,
+    plan_query,
+)
+from flatgeobuf.range_source import (
+    RangeSource,
+    get_range,
+    max_ranges_per_request,
+    source_url,
 )
+from flatgeobuf.reader_state import ReaderState, ReaderStateCache
+from flatgeobuf.spatial_index import ReadNodeFn, SpatialIndex
 
 logger = getLogger(__name__)
 
@@ -34,22 +68,55 @@ class HTTPReader:
         header: HeaderMeta,
         header_length: int,
         index_length: int,
+        prefetched_index: bytes = b"",
     ):
         self.header_client = header_client
+        # How the ranges of queries are batched into requests
+        self.batching = header_client.batching
         self.header = header
         self.header_length = header_length
         self.index_length = index_length
+        self.index: SpatialIndex | None = None
+        # Start of the index, fetched on open
+        self.prefetched_index = prefetched_index
+        self.index_requests_avoided = 0
+        self.cost_model: CostModel = REMOTE
 
     # Fetch the header, preparing the reader to read Feature data.
     # and potentially some opportunistic fetching of the index.
     @staticmethod
-    def open(url: str) -> HTTPReader:
+    def open(
+        url: str | RangeSource, batching: BatchingPolicy | None = None
+    ) -> HTTPReader:
         # In reality, the header is probably less than half this size, but
         # better to overshoot and fetch an extra kb rather than have to issue
         # a second request.
         assumed_header_length = 2024
 
-        header_client = BufferedHttpRangeClient(url)
+        # The url may be given as a HttpRangeClient, e.g. to choose the
+        # connection pool its async requests go through, or as any other
+        # RangeSource.
+        header_client = BufferedHttpRangeClient(
+            url,
+            cache=BlockCache.from_config(),
+            batching=batching or BatchingPolicy.from_config(),
+        )
+        http_client = header_client.http_client
+
+        # Opening a URL again reuses what was fetched and parsed when it was
+        # last opened.
+        url = source_url(http_client)
+        state = ReaderStateCache.global_instance.get(url) if url else None
+        if state is not None:
+            if isinstance(http_client, HttpRangeClient):
+                http_client.known_size = state.size
+            return HTTPReader(
+                header_client,
+                state.header,
+                state.header_length,
+                state.index_length,
+                state.prefetched_index,
+            )
 
         # Immediately following the header is the optional spatial index, we deliberately fetch
         # a small part of that to skip subsequent requests.
@@ -62,7 +129,7 @@ class HTTPReader:
             assumed_branching_factor = DEFAULT_NODE_SIZE
 
             # NOTE: each layer is exponentially larger
-            prefetched_layers = 3
+            prefetched_layers = Config.global_instance.index_prefetch_levels()
 
             result = 0
             for i in range(prefetched_layers):
@@ -95,78 +162,395 @@ class HTTPReader:
         bb = bytearray(bytes)  # bb = flatbuffers.ByteBuffer(bytes)
         header = from_byte_buffer(bb)
 
-        index_length = calc_tree_size(header.features_count, header.index_node_size)
+        index_length = (
+            calc_tree_size(header.features_count, header.index_node_size)
+            if header.index_node_size > 0
+            else 0
+        )
+
+        # Now that the real node size is known, prefetch the configured part
+        # of the index. This is served from the header request when that
+        # already covers it, and takes a single extra request otherwise.
+        prefetch_length = calc_prefetch_size(
+            header.features_count, header.index_node_size
+        )
+        prefetched_index = b""
+        if prefetch_length > 0:
+            logger.debug(f"prefetching index: {prefetch_length} bytes")
+            prefetched_index = header_client.get_range(
+                len(magicbytes) + SIZE_PREFIX_LEN + header_length,
+                prefetch_length,
+                prefetch_length,
+                "index prefetch",
+            )
 
         logger.debug("completed: opening http reader")
 
-        return HTTPReader(header_client, header, header_length, index_length)
+        if url:
+            ReaderStateCache.global_instance.put(
+                url,
+                ReaderState(
+                    header,
+                    header_length,
+                    index_length,
+                    prefetched_index,
+                    http_client.size(),
+                ),
+            )
+        return HTTPReader(
+            header_client, header, header_length, index_length, prefetched_index
+        )
+
+    def select_bbox(
+        self, rect: Rect, strategy: str = INDEX
+    ) -> Generator[Feature, None, None]:
+        # Features are found through the index, unless another strategy is
+        # given. With AUTO, the query planner picks the cheapest one.
+        check_strategy(strategy)
+        if not self.has_index():
+            for feature in self.scan_bbox(rect):
+                yield feature
+            return
+
+        if strategy in (AUTO, SCAN):
+            plan = self.plan(rect)
+            if strategy == AUTO:
+                strategy = plan.strategy
+            if strategy == SCAN:
+                for feature in self.scan_bbox(rect, plan.first_item, plan.end_item):
+                    yield feature
+                return
 
-    def select_bbox(self, rect: Rect) -> Generator[Feature, None, None]:
         # Read R-Tree index and build filter for features within bbox
-        length_before_tree = self.length_before_tree()
+        feature_ranges = [
+            (feature_offset, feature_length)
+            for feature_offset, _, feature_length in self.search_index(rect)
+        ]
 
-        buffered_client = self.header_client
+        self.header_client.log_usage("header+index")
 
-        def read_node(offset_into_tree: int, size: int) -> bytes:
-            min_req_length = 0
-            return buffered_client.get_range(
-                length_before_tree + offset_into_tree,
-                size,
-                min_req_length,
-                "index",
+        if strategy == HYBRID:
+            # Read the whole span of matches in one request, however far apart,
+            # as long as it is within the batch size cap
+            batches = self.batching.build_batches(
+                feature_ranges, extra_request_threshold=math.inf
             )
+        else:
+            batches = self.batching.build_batches(feature_ranges)
 
-        batches: List[List[Tuple[int, int]]] = []
-        current_batch: List[Tuple[int, int]] = []
+        for feature in self.read_feature_batches(batches):
+            yield feature
+
+    def select_all(self) -> Generator[Feature, None, None]:
+        # Read the feature section front to back, without touching the index.
+        # When the number of features is unknown (zero in the header), the
+        # scan runs until the end of the file.
+        return self.scan_features(0, self.header.features_count or None)
 
-        for search_result in PackedRTree(
+    def scan_features(
+        self, feature_offset: int, count: int | None
+    ) -> Generator[Feature, None, None]:
+        # Read count features from feature_offset on, in large sequential
+        # requests, and parse them straight out of each chunk. A feature split
+        # across chunks is carried over to the next.
+        http_client = self.header_client.http_client
+        offset = self.length_before_features() + feature_offset
+        chunk_size = Config.global_instance.scan_chunk_size()
+
+        buffer = b""
+        pos = 0
+        features_read = 0
+        while count is None or features_read < count:
+            available = len(buffer) - pos
+            needed = SIZE_PREFIX_LEN
+            if available >= SIZE_PREFIX_LEN:
+                feature_length = int.from_bytes(
+                    buffer[pos : pos + SIZE_PREFIX_LEN], "little"
+                )
+                needed += feature_length
+                if available >= needed:
+                    yield Feature.GetRootAs(buffer, pos + SIZE_PREFIX_LEN)
+                    pos += needed
+                    features_read += 1
+                    continue
+
+            chunk = get_range(
+                http_client, offset, max(chunk_size, needed - available), "feature scan"
+            )
+            if not chunk:
+                if count is None and available == 0:
+                    return
+                raise ValueError("Unexpected end of feature data")
+            offset += len(chunk)
+            # Only a feature split across chunks is copied
+            if pos < len(buffer):
+                buffer = b"".join((buffer[pos:], chunk))
+            else:
+                buffer = chunk
+            pos = 0
+
+    def scan_bbox(
+        self, rect: Rect, first_item: int = 0, end_item: int | None = None
+    ) -> Generator[Feature, None, None]:
+        # Without an index, or when the planner prefers it, features are scanned
+        # and filtered on the bbox of their geometry instead. With an index,
+        # the scan can be limited to the features in [first_item, end_item).
+        if end_item is None:
+            features = self.select_all()
+        else:
+            features = self.scan_features(
+                self.item_offset(first_item), end_item - first_item
+            )
+        for feature in features:
+            geometry = feature.Geometry()
+            if geometry is not None and bbox_intersects(geometry_bbox(geometry), rect):
+                yield feature
+
+    def select_geometry(
+        self, geometry: Any, predicate: str = "intersects"
+    ) -> Generator[Feature, None, None]:
+        # Descend the R-Tree index against the prepared geometry, skipping
+        # subtrees outside it. Only features that are not below a node inside
+        # the geometry are decoded to test the predicate exactly.
+        if isinstance(geometry, GeometryFilter):
+            geometry_filter = geometry
+        else:
+            geometry_filter = GeometryFilter(geometry, predicate)
+        geometry_type = self.header.geometry_type
+
+        if not self.has_index():
+            for feature in self.scan_bbox(geometry_filter.bounds):
+                if geometry_filter.matches(feature, geometry_type):
+                    yield feature
+            return
+
+        tree = GeometryPackedRTree(
             self.header.features_count,
             self.header.index_node_size,
-            rect,
-        ).stream_search(read_node):
-            feature_offset, _, feature_length = search_result
-            if not feature_length:
-                logger.info("final feature")
-                # Normally we get the feature length by subtracting between
-                # adjacent nodes from the index, which we can't do for the
-                # _very_ last feature in a dataset.
-                #
-                # We could *guess* the size, but we'd risk overshooting the length,
-                # which will cause some webservers to return HTTP 416: Unsatisfiable range
-                #
-                # So instead we fetch only the final features byte length, stored in the
-                # first 4 bytes.
-                feature_length = 4
-
-            if not current_batch:
-                current_batch.append((feature_offset, feature_length))
-                continue
-
-            prev_feature = current_batch[-1]
-            gap = feature_offset - (prev_feature[0] + prev_feature[1])
-
-            if gap > Config.global_instance.extra_request_threshold():
-                logger.info(
-                    f"Pushing new feature batch, since gap {gap} was too large",
-                )
-                batches.append(current_batch)
-                current_batch = []
+            geometry_filter,
+            self.batching.extra_request_threshold(),
+        )
 
-            current_batch.append((feature_offset, feature_length))
+        feature_ranges: List[Tuple[int, int | None]] = []
+        needs_exact_test: List[bool] = []
+        for search_result in tree.stream_search(self.index_node_reader()):
+            feature_offset, _, feature_length, needs_exact = search_result
+            feature_ranges.append((feature_offset, feature_length))
+            needs_exact_test.append(needs_exact)
 
         self.header_client.log_usage("header+index")
 
-        if current_batch:
-            batches.append(current_batch)
+        batches = self.batching.build_batches(feature_ranges)
+
+        i = 0
+        for feature in self.read_feature_batches(batches):
+            if not needs_exact_test[i] or geometry_filter.matches(
+                feature, geometry_type
+            ):
+                yield feature
+            i += 1
+
+    def select_bboxes(
+        self, rects: Sequence[Rect]
+    ) -> Generator[Tuple[Feature, List[int]], None, None]:
+        if not self.has_index():
+            for feature in self.select_all():
+                geometry = feature.Geometry()
+                if geometry is None:
+                    continue
+                bbox = geometry_bbox(geometry)
+                rect_idxs = [
+                    i for i, rect in enumerate(rects) if bbox_intersects(bbox, rect)
+                ]
+                if rect_idxs:
+                    yield feature, rect_idxs
+            return
+
+        # Walk the R-Tree index once for all rects, so that nodes and features
+        # shared between rects are only fetched once. Each feature is yielded
+        # with the indices of the rects it intersects.
+        tree = MultiRectPackedRTree(
+            self.header.features_count,
+            self.header.index_node_size,
+            rects,
+            self.batching.extra_request_threshold(),
+        )
 
-        promises: List[Generator[Feature, Any, None]] = [
-            self.read_feature_batch(batch) for batch in batches
+        feature_ranges: List[Tuple[int, int | None]] = []
+        rect_matches: List[List[int]] = []
+        for search_result in tree.stream_search(self.index_node_reader()):
+            feature_offset, _, feature_length, rect_idxs = search_result
+            feature_ranges.append((feature_offset, feature_length))
+            rect_matches.append(rect_idxs)
+
+        self.header_client.log_usage("header+index")
+
+        batches = self.batching.build_batches(feature_ranges)
+
+        i = 0
+        for feature in self.read_feature_batches(batches):
+            yield feature, rect_matches[i]
+            i += 1
+
+    def select_nearest(
+        self, x: float, y: float, k: int, max_distance: float | None = None
+    ) -> Generator[Tuple[Feature, float], None, None]:
+        # Best-first search of the R-Tree index for the k nearest features, which
+        # are then fetched in offset order and yielded by increasing distance.
+        self.require_index()
+        tree = PackedRTree(
+            self.header.features_count,
+            self.header.index_node_size,
+            (x, y, x, y),
+            self.batching.extra_request_threshold(),
+        )
+        nearest = [
+            search_result
+            for search_result in tree.stream_nearest(
+                self.index_node_reader(), k, max_distance
+            )
         ]
 
-        # Fetch all batches concurrently, yielding features as they become
-        # available, meaning the results may be intermixed.
-        for promise in merge_promises(promises):
-            yield promise
+        self.header_client.log_usage("header+index")
+
+        by_offset = sorted(nearest)
+        batches = self.batching.build_batches(
+            (feature_offset, feature_length)
+            for feature_offset, _, feature_length, _ in by_offset
+        )
+
+        by_offset_features: Dict[int, Feature] = {}
+        i = 0
+        for feature in self.read_feature_batches(batches):
+            by_offset_features[by_offset[i][0]] = feature
+            i += 1
+
+        for feature_offset, _, _, distance in nearest:
+            yield by_offset_features[feature_offset], distance
+
+    def select_index(self, rect: Rect) -> IndexHits:
+        # Answer the query from the R-Tree index alone, without touching the
+        # feature section: indices, offsets, lengths and bboxes of the matches.
+        self.require_index()
+        hits = PackedRTree(
+            self.header.features_count,
+            self.header.index_node_size,
+            rect,
+            self.batching.extra_request_threshold(),
+        ).search_hits(self.index_node_reader())
+
+        self.header_client.log_usage("header+index")
+
+        return hits
+
+    def count(self, rect: Rect) -> int:
+        if not self.has_index():
+            count = 0
+            for _ in self.scan_bbox(rect):
+                count += 1
+            return count
+        return PackedRTree(
+            self.header.features_count,
+            self.header.index_node_size,
+            rect,
+            self.batching.extra_request_threshold(),
+        ).count(self.index_node_reader())
+
+    def plan(self, rect: Rect) -> QueryPlan:
+        # Estimate the cost of each way to answer the query from an upper level
+        # of the index, which is usually within the part prefetched on open.
+        self.require_index()
+        features_count = self.header.features_count
+        node_size = self.header.index_node_size
+        level_bounds = generate_level_bounds(features_count, node_size)
+        level = estimation_level(
+            level_bounds, len(self.prefetched_index) // NODE_ITEM_BYTE_LEN
+        )
+        level_start, level_end = level_bounds[level]
+        buffer = self.index_node_reader()(
+            level_start * NODE_ITEM_BYTE_LEN,
+            (level_end - level_start) * NODE_ITEM_BYTE_LEN,
+        )
+
+        plan = plan_query(
+            rect,
+            np.frombuffer(buffer, dtype=NODE_ITEM_DTYPE),
+            level,
+            features_count,
+            node_size,
+            self.feature_section_size(),
+            self.cost_model,
+            self.batching.extra_request_threshold(),
+        )
+        logger.debug(f"query plan: {plan}")
+        return plan
+
+    def item_offset(self, item: int) -> int:
+        # Offset into the feature section of the item-th feature, from its leaf
+        if item == 0:
+            return 0
+        first_leaf = (
+            self.index_length // NODE_ITEM_BYTE_LEN - self.header.features_count
+        )
+        buffer = self.index_node_reader()(
+            (first_leaf + item) * NODE_ITEM_BYTE_LEN, NODE_ITEM_BYTE_LEN
+        )
+        return int(np.frombuffer(buffer, dtype=NODE_ITEM_DTYPE)[0]["offset"])
+
+    def feature_section_size(self) -> int | None:
+        size = self.header_client.http_client.size()
+        if size is None:
+            return None
+        return size - self.length_before_features()
+
+    def has_index(self) -> bool:
+        # Writers that stream features may leave out the index
+        # (index_node_size == 0), or not know the number of features up front
+        # (features_count == 0), which also means there is no index.
+        return self.header.index_node_size > 0 and self.header.features_count > 0
+
+    def require_index(self) -> None:
+        if not self.has_index():
+            raise ValueError("FlatGeobuf file has no spatial index")
+
+    def read_node(self, offset_into_tree: int, size: int) -> bytes:
+        end = offset_into_tree + size
+        if end <= len(self.prefetched_index):
+            self.index_requests_avoided += 1
+            return self.prefetched_index[offset_into_tree:end]
+
+        min_req_length = 0
+        return self.header_client.get_range(
+            self.length_before_tree() + offset_into_tree,
+            size,
+            min_req_length,
+            "index",
+        )
+
+    def load_index(self, lazy: bool = False) -> SpatialIndex:
+        # Keep the R-Tree index in memory so that subsequent queries don't need
+        # to fetch index nodes again. When lazy, each level is only loaded once
+        # a query first reaches it.
+        self.require_index()
+        index = SpatialIndex(self.header.features_count, self.header.index_node_size)
+        if not lazy:
+            index.load(self.read_node)
+        self.index = index
+        return index
+
+    def index_node_reader(self) -> ReadNodeFn:
+        if self.index:
+            return self.index.wrap_read_node(self.read_node)
+        return self.read_node
+
+    def search_index(self, rect: Rect) -> Generator[SearchResult, None, None]:
+        self.require_index()
+        return PackedRTree(
+            self.header.features_count,
+            self.header.index_node_size,
+            rect,
+            self.batching.extra_request_threshold(),
+        ).stream_search(self.index_node_reader())
 
     def length_before_tree(self) -> int:
         # FGB Layout is: [magicbytes (fixed), headerLength (i32), header (variable), Tree (variable), Features (variable)]
@@ -176,10 +560,60 @@ class HTTPReader:
         return self.length_before_tree() + self.index_length
 
     def build_feature_client(self) -> BufferedHttpRangeClient:
-        return BufferedHttpRangeClient(self.header_client.http_client)
+        return BufferedHttpRangeClient(
+            self.header_client.http_client,
+            cache=self.header_client.cache,
+            batching=self.batching,
+        )
+
+    def read_feature_batches(
+        self, batches: List[Batch]
+    ) -> Generator[Feature, None, None]:
+        # Fetch upcoming batches ahead of the consumer while the features of
+        # the current one are read, still yielding features in order. Batches
+        # too far apart to share a request are grouped into multi-range
+        # requests.
+        config = Config.global_instance
+        http_client = self.header_client.http_client
+        groups = group_batches(batches, max_ranges_per_request(http_client))
+        length_before_features = self.length_before_features()
+
+        def fetch_task(
+            group: List[Batch],
+        ) -> FetchTask[List[BufferedHttpRangeClient]]:
+            ranges = [
+                (
+                    length_before_features + batch[0][0],
+                    batch[-1][0] + batch[-1][1] - batch[0][0],
+                )
+                for batch in group
+            ]
+
+            def fetch() -> List[BufferedHttpRangeClient]:
+                feature_clients = [self.build_feature_client() for _ in group]
+                BufferedHttpRangeClient.fill_many(
+                    feature_clients, ranges, "feature batch"
+                )
+                return feature_clients
+
+            return fetch, sum(length for _, length in ranges)
+
+        fetched = fetch_ahead(
+            (fetch_task(group) for group in groups),
+            config.fetch_concurrency() if len(groups) > 1 else 1,
+            config.max_bytes_in_flight(),
+        )
+        i = 0
+        for feature_clients in fetched:
+            for batch, feature_client in zip(groups[i], feature_clients):
+                for feature in self.read_feature_batch(batch, feature_client):
+                    yield feature
+            i += 1
 
     def read_feature_batch(
-        self, batch: List[Tuple[int, int]]
+        self,
+        batch: List[Tuple[int, int]],
+        feature_client: BufferedHttpRangeClient | None = None,
     ) -> Generator[Feature, None, None]:
         first_feature_offset = batch[0][0]
         last_feature_offset, last_feature_length = batch[-1]
@@ -189,7 +623,8 @@ class HTTPReader:
         batch_size = batch_end - batch_start
 
         # A new feature client is needed for each batch to own the underlying buffer as features are yielded.
-        feature_client = self.build_feature_client()
+        if feature_client is None:
+            feature_client = self.build_feature_client()
 
         min_feature_req_length = batch_size
         for feature_offset, _ in batch:
@@ -229,9 +664,5 @@ class HTTPReader:
             min_feature_req_length,
             "feature data",
         )
-        bytes = bytearray(byte_buffer)
-        bytes_aligned = bytearray(feature_length + SIZE_PREFIX_LEN)
-        bytes_aligned[SIZE_PREFIX_LEN:] = bytes
-        bb = bytearray(bytes_aligned)
-        bb = bb[SIZE_PREFIX_LEN:]
-        return Feature.GetRootAsFeature(bb)
+        # Parsed in place, the feature shares the buffer of its batch
+        return Feature.GetRootAs(byte_buffer, 0)
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+import heapq
 import math
+from dataclasses import dataclass
+from functools import partial
 from logging import getLogger
 from typing import (
     Annotated,
@@ -9,11 +12,16 @@ from typing import (
     Callable,
     Generator,
     List,
+    Sequence,
     Tuple,
+    TypeVar,
     Union,
 )
 
+import numpy as np
+
 from .config import Config
+from .fetch_ahead import fetch_ahead, fetch_ahead_async
 
 logger = getLogger(__name__)
 
@@ -21,11 +29,77 @@ NODE_ITEM_BYTE_LEN: int = 8 * 4 + 8
 
 DEFAULT_NODE_SIZE = 16
 
+HILBERT_MAX = (1 << 16) - 1
+
+# Layout of a single packed R-tree node item, as stored in the index.
+NODE_ITEM_DTYPE = np.dtype(
+    [
+        ("min_x", "<f8"),
+        ("min_y", "<f8"),
+        ("max_x", "<f8"),
+        ("max_y", "<f8"),
+        ("offset", "<u8"),
+    ]
+)
+
 Rect = Union[Tuple[float, float, float, float], Annotated[list[float], 4]]
 SearchResult = Tuple[int, int, Union[int, None]]
+MultiSearchResult = Tuple[int, int, Union[int, None], List[int]]
+NearestResult = Tuple[int, int, Union[int, None], float]
+# (distance, node_idx, level, offset, feature_length)
+NearestHeapItem = Tuple[float, int, int, int, Union[int, None]]
+
+T = TypeVar("T")
+
+
+@dataclass
+class IndexHits:
+    """Features matched by an index-only query, as parallel arrays."""
+
+    feature_idxs: np.ndarray
+    offsets: np.ndarray
+    # -1 where the length can't be inferred from the index (the final feature)
+    lengths: np.ndarray
+    # (min_x, min_y, max_x, max_y) rows, taken from the leaf nodes
+    bboxes: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.feature_idxs)
+
+    def search_results(self) -> List[SearchResult]:
+        return [
+            (
+                feature_offset,
+                feature_idx,
+                feature_length if feature_length >= 0 else None,
+            )
+            for feature_offset, feature_idx, feature_length in zip(
+                self.offsets.tolist(),
+                self.feature_idxs.tolist(),
+                self.lengths.tolist(),
+            )
+        ]
+
+    @staticmethod
+    def concatenate(hits: List[IndexHits]) -> IndexHits:
+        if not hits:
+            return IndexHits(
+                np.empty(0, dtype=np.int64),
+                np.empty(0, dtype=np.int64),
+                np.empty(0, dtype=np.int64),
+                np.empty((0, 4), dtype=np.float64),
+            )
+        return IndexHits(
+            np.concatenate([h.feature_idxs for h in hits]),
+            np.concatenate([h.offsets for h in hits]),
+            np.concatenate([h.lengths for h in hits]),
+            np.concatenate([h.bboxes for h in hits]),
+        )
 
 
 def calc_tree_size(num_items: int, node_size: int) -> int:
+    if num_items == 0:
+        return 0
     node_size = min(max(int(node_size), 2), 65535)
     n = num_items
     num_nodes = n
@@ -35,6 +109,25 @@ def calc_tree_size(num_items: int, node_size: int) -> int:
     return num_nodes * NODE_ITEM_BYTE_LEN
 
 
+def calc_prefetch_size(num_items: int, node_size: int) -> int:
+    # Bytes at the start of the index to prefetch when opening a file: all of
+    # it if it fits under the configured cap, or else the exact span of its top
+    # levels, which are stored first from the root down.
+    if num_items == 0 or node_size == 0:
+        return 0
+
+    tree_size = calc_tree_size(num_items, node_size)
+    if tree_size <= Config.global_instance.index_prefetch_max_bytes():
+        return tree_size
+
+    levels = Config.global_instance.index_prefetch_levels()
+    if levels == 0:
+        return 0
+    level_bounds = generate_level_bounds(num_items, node_size)
+    levels = min(levels, len(level_bounds))
+    return level_bounds[-levels][1] * NODE_ITEM_BYTE_LEN
+
+
 def generate_level_bounds(num_items: int, node_size: int) -> List[Tuple[int, int]]:
     if node_size < 2:
         raise ValueError("Node size must be at least 2")
@@ -61,6 +154,136 @@ def generate_level_bounds(num_items: int, node_size: int) -> List[Tuple[int, int
     return level_bounds
 
 
+def calc_extent(bboxes: np.ndarray) -> Tuple[float, float, float, float]:
+    """Extent of (n, 4) bbox rows as (min_x, min_y, max_x, max_y)."""
+    return (
+        float(bboxes[:, 0].min()),
+        float(bboxes[:, 1].min()),
+        float(bboxes[:, 2].max()),
+        float(bboxes[:, 3].max()),
+    )
+
+
+def hilbert(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    # Based on public domain code at https://github.com/rawrunprotected/hilbert_curves
+    # as used by the reference FlatGeobuf writers, vectorized over arrays.
+    x = x.astype(np.uint32)
+    y = y.astype(np.uint32)
+
+    a = x ^ y
+    b = 0xFFFF ^ a
+    c = 0xFFFF ^ (x | y)
+    d = x & (y ^ 0xFFFF)
+
+    A = a | (b >> 1)
+    B = (a >> 1) ^ a
+    C = ((c >> 1) ^ (b & (d >> 1))) ^ c
+    D = ((a & (c >> 1)) ^ (d >> 1)) ^ d
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 2)) ^ (b & (b >> 2))
+    B = (a & (b >> 2)) ^ (b & ((a ^ b) >> 2))
+    C = C ^ (a & (c >> 2)) ^ (b & (d >> 2))
+    D = D ^ (b & (c >> 2)) ^ ((a ^ b) & (d >> 2))
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 4)) ^ (b & (b >> 4))
+    B = (a & (b >> 4)) ^ (b & ((a ^ b) >> 4))
+    C = C ^ (a & (c >> 4)) ^ (b & (d >> 4))
+    D = D ^ (b & (c >> 4)) ^ ((a ^ b) & (d >> 4))
+
+    a, b, c, d = A, B, C, D
+    C = C ^ (a & (c >> 8)) ^ (b & (d >> 8))
+    D = D ^ (b & (c >> 8)) ^ ((a ^ b) & (d >> 8))
+
+    a = C ^ (C >> 1)
+    b = D ^ (D >> 1)
+
+    i0 = x ^ y
+    i1 = b | (0xFFFF ^ (i0 | a))
+
+    i0 = (i0 | (i0 << 8)) & 0x00FF00FF
+    i0 = (i0 | (i0 << 4)) & 0x0F0F0F0F
+    i0 = (i0 | (i0 << 2)) & 0x33333333
+    i0 = (i0 | (i0 << 1)) & 0x55555555
+
+    i1 = (i1 | (i1 << 8)) & 0x00FF00FF
+    i1 = (i1 | (i1 << 4)) & 0x0F0F0F0F
+    i1 = (i1 | (i1 << 2)) & 0x33333333
+    i1 = (i1 | (i1 << 1)) & 0x55555555
+
+    return (i1 << 1) | i0
+
+
+def hilbert_values(
+    bboxes: np.ndarray, extent: Tuple[float, float, float, float]
+) -> np.ndarray:
+    """Hilbert values of the centres of (n, 4) bbox rows within extent."""
+    min_x, min_y, max_x, max_y = extent
+    width = max_x - min_x
+    height = max_y - min_y
+
+    def grid(centre: np.ndarray, start: float, size: float) -> np.ndarray:
+        if size == 0:
+            return np.zeros(len(centre), dtype=np.uint32)
+        # Empty geometries have no centre; they go to the grid origin.
+        scaled = np.nan_to_num(np.floor(HILBERT_MAX * (centre - start) / size))
+        return np.clip(scaled, 0, HILBERT_MAX).astype(np.uint32)
+
+    with np.errstate(invalid="ignore"):
+        x = grid((bboxes[:, 0] + bboxes[:, 2]) / 2, min_x, width)
+        y = grid((bboxes[:, 1] + bboxes[:, 3]) / 2, min_y, height)
+    return hilbert(x, y)
+
+
+def hilbert_sort(
+    bboxes: np.ndarray, extent: Tuple[float, float, float, float]
+) -> np.ndarray:
+    """Order of bbox rows along the Hilbert curve, as written by the reference writers."""
+    values = hilbert_values(bboxes, extent).astype(np.int64)
+    return np.argsort(-values, kind="stable")
+
+
+def build_parent_nodes(
+    children: np.ndarray, children_start: int, node_size: int
+) -> np.ndarray:
+    """Parents of consecutive child nodes, given the node index of the first child.
+
+    The children must start at a node_size boundary of their level.
+    """
+    first_children = np.arange(0, len(children), node_size)
+    parents = np.empty(len(first_children), dtype=NODE_ITEM_DTYPE)
+    parents["min_x"] = np.minimum.reduceat(children["min_x"], first_children)
+    parents["min_y"] = np.minimum.reduceat(children["min_y"], first_children)
+    parents["max_x"] = np.maximum.reduceat(children["max_x"], first_children)
+    parents["max_y"] = np.maximum.reduceat(children["max_y"], first_children)
+    parents["offset"] = children_start + first_children
+    return parents
+
+
+def build_tree(bboxes: np.ndarray, offsets: np.ndarray, node_size: int) -> np.ndarray:
+    """Build a packed R-tree over sorted items, as nodes in the order they are stored.
+
+    Leaf nodes point at feature offsets, and every other node at its first child.
+    """
+    num_items = len(bboxes)
+    level_bounds = generate_level_bounds(num_items, node_size)
+    nodes = np.empty(level_bounds[0][1], dtype=NODE_ITEM_DTYPE)
+
+    start, end = level_bounds[0]
+    leaves = nodes[start:end]
+    leaves["min_x"], leaves["min_y"] = bboxes[:, 0], bboxes[:, 1]
+    leaves["max_x"], leaves["max_y"] = bboxes[:, 2], bboxes[:, 3]
+    leaves["offset"] = offsets
+
+    for (start, end), (parent_start, parent_end) in zip(level_bounds, level_bounds[1:]):
+        nodes[parent_start:parent_end] = build_parent_nodes(
+            nodes[start:end], start, node_size
+        )
+
+    return nodes
+
+
 class NodeRange:
     def __init__(self, nodes: Tuple[int, int], level: int):
         self._level = level
@@ -85,11 +308,36 @@ class NodeRange:
         )
 
 
+@dataclass
+class RangeCursor:
+    """A node range popped off the queue, as read from the index."""
+
+    node_range: NodeRange
+    start_node_idx: int
+    # One past the last node read, which for leaves may be the next range's
+    end_node_idx: int
+    is_leaf_node: bool
+    num_nodes_in_range: int
+    # Nodes that belong to the range, rather than being read past its end
+    num_owned_nodes: int
+
+
 class PackedRTree:
-    def __init__(self, num_items: int, node_size: int, rect: Rect):
+    def __init__(
+        self,
+        num_items: int,
+        node_size: int,
+        rect: Rect,
+        extra_request_threshold: float | None = None,
+    ):
         self.num_items = num_items
         self.node_size = node_size
         self.rect = rect
+        # Node ranges closer than this many bytes are merged into one read, by
+        # default the configured threshold
+        if extra_request_threshold is None:
+            extra_request_threshold = Config.global_instance.extra_request_threshold()
+        self.extra_request_threshold = extra_request_threshold
 
         self.min_x, self.min_y, self.max_x, self.max_y = rect
         self.level_bounds = generate_level_bounds(num_items, node_size)
@@ -97,143 +345,482 @@ class PackedRTree:
         self.root_node_range = NodeRange((0, 1), len(self.level_bounds) - 1)
 
         self.queue = [self.root_node_range]
+        self.counted_leaf_ranges: List[Tuple[int, int]] = []
+        self.sorted_counted_leaf_ranges: np.ndarray | None = None
 
-    def _prefetch(self):
-        self.node_range = self.queue.pop(0)
+    def _prefetch(self) -> RangeCursor:
+        node_range = self.queue.pop(0)
 
-        logger.debug(f"popped node: {self.node_range}, queue_length: {len(self.queue)}")
+        logger.debug(f"popped node: {node_range}, queue_length: {len(self.queue)}")
 
-        self.node_range_start_idx = self.node_range.start_node_idx()
-        self.is_leaf_node = self.node_range_start_idx >= self.first_leaf_node_idx
+        node_range_start_idx = node_range.start_node_idx()
+        is_leaf_node = node_range_start_idx >= self.first_leaf_node_idx
 
         # find the end index of the node
-        _node_range_end_idx = self.node_range.end_node_idx()
-        level_bound = self.level_bounds[self.node_range.level()][1]
+        _node_range_end_idx = node_range.end_node_idx()
+        level_bound = self.level_bounds[node_range.level()][1]
         node_idx = min(_node_range_end_idx + self.node_size, level_bound)
-        if self.is_leaf_node and node_idx < level_bound:
+        if is_leaf_node and node_idx < level_bound:
             # We can infer the length of *this* feature by getting the start of the *next*
             # feature, so we get an extra node.
             # This approach doesn't work for the final node in the index,
             # but in that case we know that the feature runs to the end of the FGB file and
             # could make an open ended range request to get "the rest of the data".
-            self.node_range_end_idx = node_idx + 1
+            node_range_end_idx = node_idx + 1
         else:
-            self.node_range_end_idx = node_idx
+            node_range_end_idx = node_idx
+
+        # The range is fetched past the children of its last parent (see above),
+        # so only the nodes before this point actually belong to the range. The
+        # end of a range that was never extended is one past its start.
+        last_first_child_idx = _node_range_end_idx
+        if last_first_child_idx == node_range_start_idx + 1:
+            last_first_child_idx = node_range_start_idx
+        num_owned_nodes = (
+            min(last_first_child_idx + self.node_size, level_bound)
+            - node_range_start_idx
+        )
 
-        self.num_nodes_in_range = self.node_range_end_idx - self.node_range_start_idx
+        return RangeCursor(
+            node_range,
+            node_range_start_idx,
+            node_range_end_idx,
+            is_leaf_node,
+            node_range_end_idx - node_range_start_idx,
+            num_owned_nodes,
+        )
 
-    def iterate(self, node_idx: int) -> SearchResult | None:
-        node_idx_in_data_view = node_idx - self.node_range_start_idx
-        data_view_byte_start = node_idx_in_data_view * NODE_ITEM_BYTE_LEN
+    def _level_read_tasks(
+        self,
+        read_node: Callable[[int, int], T],
+        owned_only: bool,
+        cursors: List[RangeCursor],
+    ) -> Generator[Tuple[Callable[[], T], int], None, None]:
+        # All the ranges of a level are queued while the level above is read,
+        # and their children only go to the back of the queue, so the ranges
+        # at the front can be read independently of each other.
+        level = self.queue[0].level()
+        num_ranges = 0
+        while num_ranges < len(self.queue) and self.queue[num_ranges].level() == level:
+            num_ranges += 1
+
+        for _ in range(num_ranges):
+            cursor = self._prefetch()
+            cursors.append(cursor)
+            num_nodes = (
+                cursor.num_owned_nodes if owned_only else cursor.num_nodes_in_range
+            )
+            offset = cursor.start_node_idx * NODE_ITEM_BYTE_LEN
+            length = num_nodes * NODE_ITEM_BYTE_LEN
+            yield partial(read_node, offset, length), length
+
+    async def _node_buffers_async(
+        self,
+        read_node: Callable[[int, int], Awaitable[bytes]],
+        owned_only: bool = False,
+    ) -> AsyncGenerator[Tuple[RangeCursor, bytes], None]:
+        # Yield each queued node range in order, along with its buffer. The
+        # ranges of a level are read concurrently.
+        config = Config.global_instance
+        while self.queue:
+            cursors: List[RangeCursor] = []
+            buffers = fetch_ahead_async(
+                self._level_read_tasks(read_node, owned_only, cursors),
+                config.fetch_concurrency(),
+                config.max_bytes_in_flight(),
+            )
+            i = 0
+            async for buffer in buffers:
+                yield cursors[i], buffer
+                i += 1
+
+    def _node_buffers(
+        self,
+        read_node: Callable[[int, int], bytes],
+        owned_only: bool = False,
+    ) -> Generator[Tuple[RangeCursor, bytes], None, None]:
+        # Yield each queued node range in order, along with its buffer.
+        while self.queue:
+            cursors: List[RangeCursor] = []
+            buffers = fetch_ahead(
+                self._level_read_tasks(read_node, owned_only, cursors), 1, 0
+            )
+            i = 0
+            for buffer in buffers:
+                yield cursors[i], buffer
+                i += 1
+
+    def _intersecting(self, nodes: np.ndarray) -> np.ndarray:
+        # NOTE: Written as the negation of the rejection tests so that NaN
+        # bounds behave exactly as in the scalar comparisons.
+        return ~(
+            (self.max_x < nodes["min_x"])
+            | (self.max_y < nodes["min_y"])
+            | (self.min_x > nodes["max_x"])
+            | (self.min_y > nodes["max_y"])
+        )
 
-        # TODO: Enforce little endian
-        if (
-            self.max_x
-            < self.data_view[data_view_byte_start : data_view_byte_start + 8].cast("d")[
-                0
-            ]
-        ):
-            return
-        if (
-            self.max_y
-            < self.data_view[data_view_byte_start + 8 : data_view_byte_start + 16].cast(
-                "d"
-            )[0]
-        ):
-            return
-        if (
-            self.min_x
-            > self.data_view[
-                data_view_byte_start + 16 : data_view_byte_start + 24
-            ].cast("d")[0]
-        ):
-            return
-        if (
-            self.min_y
-            > self.data_view[
-                data_view_byte_start + 24 : data_view_byte_start + 32
-            ].cast("d")[0]
-        ):
-            return
+    def _contained(self, nodes: np.ndarray) -> np.ndarray:
+        return (
+            (self.min_x <= nodes["min_x"])
+            & (self.min_y <= nodes["min_y"])
+            & (self.max_x >= nodes["max_x"])
+            & (self.max_y >= nodes["max_y"])
+        )
 
-        offset = self.data_view[
-            data_view_byte_start + 32 : data_view_byte_start + 40
-        ].cast("q")[0]
+    def _scan_node_range(
+        self, cursor: RangeCursor, buffer: bytes
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # View the whole node range as a structured array and test every node
+        # against the query rect at once, rather than one node per call.
+        nodes = np.frombuffer(
+            buffer, dtype=NODE_ITEM_DTYPE, count=cursor.num_nodes_in_range
+        )
+        positions = np.flatnonzero(self._intersecting(nodes[: cursor.num_owned_nodes]))
+
+        if not cursor.is_leaf_node:
+            self._push_child_ranges(cursor, nodes["offset"][positions].tolist())
+
+        return nodes, positions
+
+    def _search_node_range(
+        self, cursor: RangeCursor, buffer: bytes
+    ) -> List[SearchResult]:
+        nodes, positions = self._scan_node_range(cursor, buffer)
+        if not cursor.is_leaf_node:
+            return []
+        return self._leaf_results(cursor, nodes, positions)
+
+    def _leaf_hits(
+        self, cursor: RangeCursor, nodes: np.ndarray, positions: np.ndarray
+    ) -> IndexHits:
+        offsets = nodes["offset"].astype(np.int64)
+        feature_idxs = positions + (cursor.start_node_idx - self.first_leaf_node_idx)
+        feature_offsets = offsets[positions]
+
+        # The length of a feature is the distance to the offset of the next one,
+        # which is only known when the next node was fetched as part of this range.
+        has_next = (feature_idxs < self.num_items - 1) & (positions + 1 < len(offsets))
+        next_offsets = offsets[np.minimum(positions + 1, len(offsets) - 1)]
+        feature_lengths = np.where(has_next, next_offsets - feature_offsets, -1)
+
+        matched = nodes[positions]
+        bboxes = np.stack(
+            [matched["min_x"], matched["min_y"], matched["max_x"], matched["max_y"]],
+            axis=-1,
+        )
+        return IndexHits(feature_idxs, feature_offsets, feature_lengths, bboxes)
+
+    def _leaf_results(
+        self, cursor: RangeCursor, nodes: np.ndarray, positions: np.ndarray
+    ) -> List[SearchResult]:
+        return self._leaf_hits(cursor, nodes, positions).search_results()
+
+    def _subtree_leaves(
+        self, cursor: RangeCursor, positions: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Leaves are packed in order, so the subtree below the n-th node of a
+        # level covers a contiguous run of node_size ** level leaves.
+        level = cursor.node_range.level()
+        span = self.node_size**level
+        level_positions = positions + (
+            cursor.start_node_idx - self.level_bounds[level][0]
+        )
+        first = level_positions * span
+        return first, np.minimum(first + span, self.num_items)
+
+    def _already_counted(self, cursor: RangeCursor, num_nodes: int) -> np.ndarray:
+        # Merged node ranges may span the subtree of a node that was already
+        # counted as a whole, whose nodes must not be counted again.
+        if not self.counted_leaf_ranges:
+            return np.zeros(num_nodes, dtype=bool)
+        if self.sorted_counted_leaf_ranges is None:
+            self.sorted_counted_leaf_ranges = np.array(
+                sorted(self.counted_leaf_ranges), dtype=np.int64
+            )
+        return self._in_leaf_ranges(cursor, num_nodes, self.sorted_counted_leaf_ranges)
+
+    def _in_leaf_ranges(
+        self, cursor: RangeCursor, num_nodes: int, leaf_ranges: np.ndarray
+    ) -> np.ndarray:
+        # Whether the subtree of each node in the range starts within one of the
+        # given sorted, disjoint (first, end) ranges of leaves.
+        first, _ = self._subtree_leaves(cursor, np.arange(num_nodes))
+        i = np.searchsorted(leaf_ranges[:, 0], first, side="right") - 1
+        return (i >= 0) & (first < leaf_ranges[np.maximum(i, 0), 1])
+
+    def _count_node_range(self, cursor: RangeCursor, buffer: bytes) -> int:
+        nodes = np.frombuffer(
+            buffer, dtype=NODE_ITEM_DTYPE, count=cursor.num_owned_nodes
+        )
+        intersecting = self._intersecting(nodes) & ~self._already_counted(
+            cursor, len(nodes)
+        )
+        if cursor.is_leaf_node:
+            return int(np.count_nonzero(intersecting))
 
-        if self.is_leaf_node:
-            feature_byte_offset = offset
-            feature_length = None
-            if node_idx < self.num_items - 1:
-                next_pos = (node_idx_in_data_view + 1) * NODE_ITEM_BYTE_LEN
-                next_offset = self.data_view[next_pos + 32 : next_pos + 40].cast("q")[0]
-                feature_length = next_offset - feature_byte_offset
-            feature_idx = node_idx - self.first_leaf_node_idx
-            return (feature_byte_offset, feature_idx, feature_length)
+        # Subtrees entirely within the rect are counted without descending.
+        contained = intersecting & self._contained(nodes)
+        self._push_child_ranges(
+            cursor, nodes["offset"][intersecting & ~contained].tolist()
+        )
 
-        first_child_node_idx = offset
+        first, end = self._subtree_leaves(cursor, np.flatnonzero(contained))
+        if len(first):
+            self.counted_leaf_ranges.extend(zip(first.tolist(), end.tolist()))
+            self.sorted_counted_leaf_ranges = None
+        return int((end - first).sum())
 
+    def _push_child_ranges(
+        self, cursor: RangeCursor, first_child_node_idxs: List[int]
+    ) -> None:
         extra_request_threshold_nodes = (
-            Config.global_instance.extra_request_threshold() // NODE_ITEM_BYTE_LEN
+            self.extra_request_threshold // NODE_ITEM_BYTE_LEN
         )
+        level = cursor.node_range.level()
+
+        for first_child_node_idx in first_child_node_idxs:
+            nearest_node_range = self.queue[-1] if self.queue else None
+            if (
+                nearest_node_range
+                and nearest_node_range.level() == level - 1
+                and first_child_node_idx
+                < nearest_node_range.end_node_idx() + extra_request_threshold_nodes
+            ):
+                nearest_node_range.extend_end_node_idx(first_child_node_idx)
+                continue
+
+            new_node_range = NodeRange(
+                (first_child_node_idx, first_child_node_idx + 1),
+                level - 1,
+            )
 
-        nearest_node_range = self.queue[-1] if self.queue else None
-        if (
-            nearest_node_range
-            and nearest_node_range.level() == self.node_range.level() - 1
-            and first_child_node_idx
-            < nearest_node_range.end_node_idx() + extra_request_threshold_nodes
-        ):
-            nearest_node_range.extend_end_node_idx(first_child_node_idx)
-            return
+            if (
+                nearest_node_range
+                and nearest_node_range.level() == new_node_range.level()
+            ):
+                logger.info(
+                    f"Same level, but too far away. Pushing new request for node_idx: {first_child_node_idx} rather than merging with distant {nearest_node_range}"
+                )
+            else:
+                logger.info(
+                    f"Pushing new level for {new_node_range} onto queue with nearest_node_range: {nearest_node_range} since there's not already a range for this level."
+                )
+
+            self.queue.append(new_node_range)
+
+    async def search_hits_async(
+        self, read_node: Callable[[int, int], Awaitable[bytes]]
+    ) -> IndexHits:
+        hits: List[IndexHits] = []
+        async for cursor, buffer in self._node_buffers_async(read_node):
+            nodes, positions = self._scan_node_range(cursor, buffer)
+            if cursor.is_leaf_node:
+                hits.append(self._leaf_hits(cursor, nodes, positions))
 
-        new_node_range = NodeRange(
-            (first_child_node_idx, first_child_node_idx + 1),
-            self.node_range.level() - 1,
-        )
+        return IndexHits.concatenate(hits)
 
-        if nearest_node_range and nearest_node_range.level() == new_node_range.level():
-            logger.info(
-                f"Same level, but too far away. Pushing new request for node_idx: {first_child_node_idx} rather than merging with distant {nearest_node_range}"
-            )
-        else:
-            logger.info(
-                f"Pushing new level for {new_node_range} onto queue with nearest_node_range: {nearest_node_range} since there's not already a range for this level."
-            )
+    def search_hits(self, read_node: Callable[[int, int], bytes]) -> IndexHits:
+        hits: List[IndexHits] = []
+        for cursor, buffer in self._node_buffers(read_node):
+            nodes, positions = self._scan_node_range(cursor, buffer)
+            if cursor.is_leaf_node:
+                hits.append(self._leaf_hits(cursor, nodes, positions))
 
-        self.queue.append(new_node_range)
+        return IndexHits.concatenate(hits)
 
-    async def stream_search_async(
+    async def count_async(
         self, read_node: Callable[[int, int], Awaitable[bytes]]
-    ) -> AsyncGenerator[SearchResult, None]:
-        while self.queue:
-            self._prefetch()
+    ) -> int:
+        count = 0
+        async for cursor, buffer in self._node_buffers_async(
+            read_node, owned_only=True
+        ):
+            count += self._count_node_range(cursor, buffer)
 
-            buffer = await read_node(
-                self.node_range_start_idx * NODE_ITEM_BYTE_LEN,
-                self.num_nodes_in_range * NODE_ITEM_BYTE_LEN,
-            )
+        return count
 
-            self.data_view = memoryview(buffer)
+    def count(self, read_node: Callable[[int, int], bytes]) -> int:
+        count = 0
+        for cursor, buffer in self._node_buffers(read_node, owned_only=True):
+            count += self._count_node_range(cursor, buffer)
 
-            for node_idx in range(self.node_range_start_idx, self.node_range_end_idx):
-                iteration = self.iterate(node_idx)
-                if iteration:
-                    yield iteration
+        return count
+
+    async def stream_search_async(
+        self, read_node: Callable[[int, int], Awaitable[bytes]]
+    ) -> AsyncGenerator[SearchResult, None]:
+        async for cursor, buffer in self._node_buffers_async(read_node):
+            for search_result in self._search_node_range(cursor, buffer):
+                yield search_result
 
     def stream_search(
         self, read_node: Callable[[int, int], bytes]
     ) -> Generator[SearchResult, None, None]:
-        while self.queue:
-            self._prefetch()
+        for cursor, buffer in self._node_buffers(read_node):
+            for search_result in self._search_node_range(cursor, buffer):
+                yield search_result
+
+    def _distances(self, nodes: np.ndarray) -> np.ndarray:
+        dx = np.maximum(nodes["min_x"] - self.max_x, self.min_x - nodes["max_x"])
+        dy = np.maximum(nodes["min_y"] - self.max_y, self.min_y - nodes["max_y"])
+        return np.hypot(np.maximum(dx, 0.0), np.maximum(dy, 0.0))
+
+    def _children_range(self, first_child_node_idx: int, level: int) -> NodeRange:
+        # The children of a node are stored contiguously, so a single read
+        # covers all of them.
+        level_bound = self.level_bounds[level][1]
+        end_node_idx = min(first_child_node_idx + self.node_size, level_bound)
+        return NodeRange((first_child_node_idx, end_node_idx), level)
+
+    def _read_length(self, node_range: NodeRange) -> int:
+        # As in `_prefetch`, leaf reads include the next node, if there is one,
+        # so that the length of the last feature can be inferred.
+        end_node_idx = node_range.end_node_idx()
+        if node_range.level() == 0 and end_node_idx < self.level_bounds[0][1]:
+            end_node_idx += 1
+        return (end_node_idx - node_range.start_node_idx()) * NODE_ITEM_BYTE_LEN
+
+    def _push_nearest(
+        self,
+        heap: List[NearestHeapItem],
+        buffer: bytes,
+        node_range: NodeRange,
+        max_distance: float | None,
+    ) -> None:
+        start_node_idx = node_range.start_node_idx()
+        num_nodes = node_range.end_node_idx() - start_node_idx
+
+        nodes = np.frombuffer(buffer, dtype=NODE_ITEM_DTYPE)
+        distances = self._distances(nodes[:num_nodes])
+        offsets = nodes["offset"]
+
+        if node_range.level() == 0:
+            lengths: List[int | None] = (offsets[1:] - offsets[:-1]).tolist()
+            lengths.append(None)
+        else:
+            lengths = [None] * len(nodes)
 
-            buffer = read_node(
-                self.node_range_start_idx * NODE_ITEM_BYTE_LEN,
-                self.num_nodes_in_range * NODE_ITEM_BYTE_LEN,
+        for i, (distance, offset) in enumerate(
+            zip(distances.tolist(), offsets.tolist())
+        ):
+            if i == num_nodes:
+                break
+            if max_distance is not None and distance > max_distance:
+                continue
+            heapq.heappush(
+                heap,
+                (distance, start_node_idx + i, node_range.level(), offset, lengths[i]),
             )
 
-            self.data_view = memoryview(buffer)
+    async def stream_nearest_async(
+        self,
+        read_node: Callable[[int, int], Awaitable[bytes]],
+        k: int,
+        max_distance: float | None = None,
+    ) -> AsyncGenerator[NearestResult, None]:
+        """Best-first search for the k features nearest to the query rect.
+
+        Features are yielded in increasing order of the distance between the
+        query rect and their bounding box.
+        """
+        heap: List[NearestHeapItem] = []
+        root_node_range = NodeRange((0, 1), len(self.level_bounds) - 1)
+        buffer = await read_node(0, self._read_length(root_node_range))
+        self._push_nearest(heap, buffer, root_node_range, max_distance)
+
+        found = 0
+        while heap and found < k:
+            distance, node_idx, level, offset, length = heapq.heappop(heap)
+
+            if level == 0:
+                found += 1
+                feature_idx = node_idx - self.first_leaf_node_idx
+                yield (offset, feature_idx, length, distance)
+                continue
+
+            node_range = self._children_range(offset, level - 1)
+            buffer = await read_node(
+                node_range.start_node_idx() * NODE_ITEM_BYTE_LEN,
+                self._read_length(node_range),
+            )
+            self._push_nearest(heap, buffer, node_range, max_distance)
+
+    def stream_nearest(
+        self,
+        read_node: Callable[[int, int], bytes],
+        k: int,
+        max_distance: float | None = None,
+    ) -> Generator[NearestResult, None, None]:
+        heap: List[NearestHeapItem] = []
+        root_node_range = NodeRange((0, 1), len(self.level_bounds) - 1)
+        buffer = read_node(0, self._read_length(root_node_range))
+        self._push_nearest(heap, buffer, root_node_range, max_distance)
+
+        found = 0
+        while heap and found < k:
+            distance, node_idx, level, offset, length = heapq.heappop(heap)
+
+            if level == 0:
+                found += 1
+                feature_idx = node_idx - self.first_leaf_node_idx
+                yield (offset, feature_idx, length, distance)
+                continue
+
+            node_range = self._children_range(offset, level - 1)
+            buffer = read_node(
+                node_range.start_node_idx() * NODE_ITEM_BYTE_LEN,
+                self._read_length(node_range),
+            )
+            self._push_nearest(heap, buffer, node_range, max_distance)
+
+
+class MultiRectPackedRTree(PackedRTree):
+    """Searches for several rects in a single traversal of the tree.
+
+    Each node is tested against all rects at once, and every matching feature
+    is reported once along with the indices of the rects it intersects.
+    """
+
+    def __init__(
+        self,
+        num_items: int,
+        node_size: int,
+        rects: Sequence[Rect],
+        extra_request_threshold: float | None = None,
+    ):
+        bounds = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+        if len(bounds) == 0:
+            raise ValueError("At least one rect is required")
+
+        envelope = (
+            bounds[:, 0].min(),
+            bounds[:, 1].min(),
+            bounds[:, 2].max(),
+            bounds[:, 3].max(),
+        )
+        super().__init__(num_items, node_size, envelope, extra_request_threshold)
+        self.rects = bounds
+
+    def _rect_matches(self, nodes: np.ndarray) -> np.ndarray:
+        min_x, min_y, max_x, max_y = self.rects.T
+        return ~(
+            (max_x < nodes["min_x"][:, None])
+            | (max_y < nodes["min_y"][:, None])
+            | (min_x > nodes["max_x"][:, None])
+            | (min_y > nodes["max_y"][:, None])
+        )
 
-            for node_idx in range(self.node_range_start_idx, self.node_range_end_idx):
-                iteration = self.iterate(node_idx)
-                if iteration:
-                    yield iteration
+    def _intersecting(self, nodes: np.ndarray) -> np.ndarray:
+        return self._rect_matches(nodes).any(axis=1)
+
+    def _leaf_results(
+        self, cursor: RangeCursor, nodes: np.ndarray, positions: np.ndarray
+    ) -> List[MultiSearchResult]:
+        rect_matches = self._rect_matches(nodes[positions])
+        return [
+            (feature_offset, feature_idx, feature_length, np.flatnonzero(row).tolist())
+            for (feature_offset, feature_idx, feature_length), row in zip(
+                super()._leaf_results(cursor, nodes, positions), rect_matches
+            )
+        ]
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from flatgeobuf.config import Config
+from flatgeobuf.packedrtree import Rect
+
+# Walk the index and read matching features in gap-split batches
+INDEX = "index"
+# Walk the index, but read the span of matching features in one request
+HYBRID = "hybrid"
+# Read the span of candidate features sequentially, filtering on the bbox of
+# their geometry rather than on their bbox in the index
+SCAN = "scan"
+# Plan the query, which reads one level of the index unless it was prefetched,
+# and take the cheapest of the above
+AUTO = "auto"
+STRATEGIES = (INDEX, HYBRID, SCAN, AUTO)
+
+# Most index nodes read just to plan a query, unless more were prefetched
+PLANNER_MAX_NODES = 256
+
+
+@dataclass
+class CostModel:
+    """Rough costs, in seconds, of the operations a query is made of.
+
+    The defaults and the presets below are ballpark figures rather than
+    measurements. Set a reader's cost_model to tune them for a given setup:
+    only their ratios matter.
+    """
+
+    # Fixed cost of each range request, including the time to first byte
+    request_latency: float
+    # Sustained transfer rate once a request is under way
+    bytes_per_second: float
+    # Parsing a feature found through the index
+    feature_seconds: float = 5e-6
+    # Parsing a scanned feature and computing its geometry's bbox
+    scan_feature_seconds: float = 2e-5
+    # Assumed feature size when the size of the feature section is unknown
+    default_feature_bytes: int = 1024
+
+
+# A local SSD, where requests are nearly free, and a remote object store, where
+# each request costs about 50 ms and transfers run at about 20 MB/s
+LOCAL_DISK = CostModel(request_latency=1e-4, bytes_per_second=1e9)
+REMOTE = CostModel(request_latency=0.05, bytes_per_second=2e7)
+
+
+@dataclass
+class QueryPlan:
+    strategy: str
+    rect: Rect
+    # Level of the index the estimate is based on, 0 being the leaves
+    estimation_level: int
+    # Estimated number of matching features, and its fraction of all features
+    estimated_features: float
+    selectivity: float
+    # Candidate features are in [first_item, end_item), in file order
+    first_item: int
+    end_item: int
+    # Estimated cost in seconds of each strategy
+    costs: Dict[str, float] = field(default_factory=dict)
+
+    def candidates(self) -> int:
+        return self.end_item - self.first_item
+
+
+def estimation_level(level_bounds: List[Tuple[int, int]], available_nodes: int) -> int:
+    """Deepest level with all nodes up to it within `available_nodes`."""
+    max_nodes = max(available_nodes, PLANNER_MAX_NODES)
+    for level, (_, level_end) in enumerate(level_bounds):
+        if level_end <= max_nodes:
+            return level
+    return len(level_bounds) - 1
+
+
+def _overlap(
+    node_min: np.ndarray, node_max: np.ndarray, rect_min: float, rect_max: float
+) -> np.ndarray:
+    # Fraction of each node's extent along one axis covered by the rect, with
+    # degenerate extents counting as fully covered.
+    width = node_max - node_min
+    covered = np.minimum(node_max, rect_max) - np.maximum(node_min, rect_min)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.where(width > 0, covered / width, 1.0)
+    return np.clip(fraction, 0.0, 1.0)
+
+
+def plan_query(
+    rect: Rect,
+    nodes: np.ndarray,
+    level: int,
+    num_items: int,
+    node_size: int,
+    feature_bytes: int | None,
+    cost_model: CostModel,
+    extra_request_threshold: float | None = None,
+) -> QueryPlan:
+    """Estimate the cost of each strategy from the nodes of one index level.
+
+    Nodes of a packed R-tree cover consecutive features, so the nodes that
+    intersect the rect bound both the number of matches (scaled by how much
+    of each node the rect covers) and the span of the file they are in.
+    """
+    min_x, min_y, max_x, max_y = rect
+    intersecting = ~(
+        (nodes["max_x"] < min_x)
+        | (nodes["max_y"] < min_y)
+        | (nodes["min_x"] > max_x)
+        | (nodes["min_y"] > max_y)
+    )
+    positions = np.flatnonzero(intersecting)
+    if len(positions) == 0:
+        return QueryPlan(INDEX, rect, level, 0.0, 0.0, 0, 0)
+
+    items_per_node = node_size**level
+    starts = positions * items_per_node
+    ends = np.minimum(starts + items_per_node, num_items)
+    matching = nodes[positions]
+    fractions = _overlap(matching["min_x"], matching["max_x"], min_x, max_x) * _overlap(
+        matching["min_y"], matching["max_y"], min_y, max_y
+    )
+
+    estimated = float(((ends - starts) * fractions).sum())
+    first_item = int(starts[0])
+    end_item = int(ends[-1])
+    span_items = end_item - first_item
+
+    if feature_bytes is None:
+        average_bytes = float(cost_model.default_feature_bytes)
+    else:
+        average_bytes = feature_bytes / num_items
+    span_bytes = span_items * average_bytes
+    matched_bytes = estimated * average_bytes
+
+    latency = cost_model.request_latency
+    transfer = 1.0 / cost_model.bytes_per_second
+
+    # Matches further apart than the extra request threshold get a request
+    # each. Closer ones share a request per run of intersecting nodes, split
+    # where the nodes in between span more than the threshold, by default the
+    # configured one.
+    if extra_request_threshold is None:
+        extra_request_threshold = Config.global_instance.extra_request_threshold()
+    average_gap = average_bytes * (span_items - estimated) / max(estimated, 1.0)
+    if average_gap > extra_request_threshold:
+        index_requests = max(estimated, 1.0)
+        index_bytes = matched_bytes
+    else:
+        gaps = (starts[1:] - ends[:-1]) * average_bytes
+        index_requests = 1.0 + int(np.count_nonzero(gaps > extra_request_threshold))
+        index_bytes = span_bytes
+
+    # The levels below the estimation level take a request each to traverse.
+    # A scan not starting at the first feature reads its offset from its leaf.
+    traversal = level * latency
+    parsing = estimated * cost_model.feature_seconds
+    scan_requests = (1 if first_item > 0 else 0) + math.ceil(
+        span_bytes / Config.global_instance.scan_chunk_size()
+    )
+    costs = {
+        INDEX: traversal + index_requests * latency + index_bytes * transfer + parsing,
+        HYBRID: traversal + latency + span_bytes * transfer + parsing,
+        SCAN: scan_requests * latency
+        + span_bytes * transfer
+        + span_items * cost_model.scan_feature_seconds,
+    }
+    strategy = min(costs, key=costs.__getitem__)
+
+    return QueryPlan(
+        strategy,
+        rect,
+        level,
+        estimated,
+        estimated / num_items,
+        first_item,
+        end_item,
+        costs,
+    )
+
+
+def check_strategy(strategy: str) -> None:
+    if strategy not in STRATEGIES:
+        raise ValueError(
+            f"Unknown query strategy '{strategy}', expected one of {STRATEGIES}"
+        )
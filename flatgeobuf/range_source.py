@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import asyncio
+from typing import List, Protocol, Sequence, Tuple, runtime_checkable
+
+
+from flatgeobuf.config import Config
+
+# (begin, length)
+ByteRange = Tuple[int, int]
+
+
+@runtime_checkable
+class RangeSource(Protocol):
+    """Where readers fetch the byte ranges of a FlatGeobuf file from.
+
+    `get_range` returns the `length` bytes from `begin`, fewer past the end
+    of the file, and `size` the size of the file, or None while it is not
+    known. `purpose` only describes the read, e.g. "header", for logging.
+
+    A source may also implement, and readers use them when it does:
+
+    - `async get_range_async(begin, length, purpose)`, for the async
+      readers, which otherwise call `get_range` on a thread;
+    - `get_ranges(ranges, purpose)` and `async get_ranges_async(ranges,
+      purpose)`, to fetch several `(begin, length)` ranges at once, e.g.
+      in a single request;
+    - `max_ranges_per_request()`, how many ranges are worth passing to
+      `get_ranges` at once;
+    - a `url` attribute, identifying the file to the caches shared across
+      readers.
+    """
+
+    def get_range(self, begin: int, length: int, purpose: str) -> bytes: ...
+
+    def size(self) -> int | None: ...
+
+
+def get_range(source: RangeSource, begin: int, length: int, purpose: str) -> bytes:
+    return source.get_range(begin, length, purpose)
+
+
+async def get_range_async(
+    source: RangeSource, begin: int, length: int, purpose: str
+) -> bytes:
+    if hasattr(source, "get_range_async"):
+        return await source.get_range_async(begin, length, purpose)
+    return await asyncio.to_thread(source.get_range, begin, length, purpose)
+
+
+def get_ranges(
+    source: RangeSource, ranges: Sequence[ByteRange], purpose: str
+) -> List[bytes]:
+    if hasattr(source, "get_ranges"):
+        return source.get_ranges(ranges, purpose)
+    return [source.get_range(begin, length, purpose) for begin, length in ranges]
+
+
+async def get_ranges_async(
+    source: RangeSource, ranges: Sequence[ByteRange], purpose: str
+) -> List[bytes]:
+    if hasattr(source, "get_ranges_async"):
+        return await source.get_ranges_async(ranges, purpose)
+    return list(
+        await asyncio.gather(
+            *[
+                get_range_async(source, begin, length, purpose)
+                for begin, length in ranges
+            ]
+        )
+    )
+
+
+def max_ranges_per_request(source: RangeSource) -> int:
+    if hasattr(source, "max_ranges_per_request"):
+        return source.max_ranges_per_request()
+    if hasattr(source, "get_ranges"):
+        return Config.global_instance.max_ranges_per_request()
+    return 1
+
+
+def source_url(source: RangeSource) -> str | None:
+    return getattr(source, "url", None)
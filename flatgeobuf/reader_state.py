@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from logging import getLogger
+from typing import Tuple
+
+from flatgeobuf.config import Config
+from flatgeobuf.header_meta import HeaderMeta
+
+logger = getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ReaderState:
+    """What opening a remote file establishes, before any query."""
+
+    header: HeaderMeta
+    header_length: int
+    index_length: int
+    # Start of the index, fetched on open
+    prefetched_index: bytes = b""
+    # Size of the file, if the responses reported it
+    size: int | None = None
+
+
+class ReaderStateCache:
+    """Process-wide LRU cache of the state of opened remote files, by URL.
+
+    Opening a URL again within `reader_state_ttl` seconds reuses its parsed
+    header and prefetched index instead of fetching them again. Changes to a
+    remote file in the meantime go unnoticed, and a replaced file would be
+    read at the offsets of the old one, so the cache is disabled unless
+    `reader_state_cache_max_entries` is set, for files known not to change
+    within the TTL. The limits are read from the config on each access.
+
+    Each reader gets its own copy of the header.
+    """
+
+    global_instance: ReaderStateCache
+
+    def __init__(self):
+        # url -> (time stored, state)
+        self.entries: OrderedDict[str, Tuple[float, ReaderState]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, url: str) -> ReaderState | None:
+        ttl = Config.global_instance.reader_state_ttl()
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is not None and time.monotonic() - entry[0] > ttl:
+                del self.entries[url]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(url)
+            self.hits += 1
+        logger.debug(f"reusing the opened state of {url}")
+        return replace(entry[1], header=copy.deepcopy(entry[1].header))
+
+    def put(self, url: str, state: ReaderState) -> None:
+        max_entries = Config.global_instance.reader_state_cache_max_entries()
+        with self.lock:
+            if max_entries == 0:
+                return
+            state = replace(state, header=copy.deepcopy(state.header))
+            self.entries[url] = (time.monotonic(), state)
+            self.entries.move_to_end(url)
+            while len(self.entries) > max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+ReaderStateCache.global_instance = ReaderStateCache()
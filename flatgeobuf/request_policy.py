@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import math
+import random
+import socket
+import threading
+import time
+import urllib.error
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from typing import Awaitable, Callable, Deque, TypeVar
+
+from flatgeobuf import fetch_ahead
+from flatgeobuf.config import Config
+
+logger = getLogger(__name__)
+
+T = TypeVar("T")
+
+# Statuses worth retrying, as the server may answer the same request later
+TRANSIENT_STATUSES = (408, 429, 500, 502, 503, 504)
+# Timeouts, reset connections and servers closing them early. Refused
+# connections, unknown hosts and TLS failures are not worth retrying.
+TRANSIENT_ERRORS = (
+    TimeoutError,
+    socket.timeout,
+    asyncio.TimeoutError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    asyncio.IncompleteReadError,
+)
+# Latencies kept to estimate percentiles from
+LATENCY_WINDOW = 1024
+# Latencies needed before hedging, so that the threshold means something
+HEDGE_MIN_SAMPLES = 20
+
+
+# Hedged requests run on a pool of their own, as the fetch pool may be the
+# one waiting for them
+_hedge_executor: ThreadPoolExecutor | None = None
+_hedge_executor_workers = 0
+_hedge_executor_lock = threading.Lock()
+
+
+def is_transient(error: BaseException) -> bool:
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code in TRANSIENT_STATUSES
+    # urlopen wraps the errors of the connection
+    if isinstance(error, urllib.error.URLError):
+        return isinstance(error.reason, TRANSIENT_ERRORS)
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+def hedge_executor(workers: int) -> ThreadPoolExecutor | None:
+    """The thread pool hedged requests run on, with at least `workers`
+    threads, or None where threads can't be started."""
+    global _hedge_executor, _hedge_executor_workers
+    with _hedge_executor_lock:
+        if not fetch_ahead.threads_supported:
+            return None
+        if _hedge_executor is None or _hedge_executor_workers < workers:
+            # Requests already running on the smaller pool still complete
+            if _hedge_executor is not None:
+                _hedge_executor.shutdown(wait=False)
+            _hedge_executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="flatgeobuf-hedge"
+            )
+            _hedge_executor_workers = workers
+        return _hedge_executor
+
+
+class RequestStats:
+    """Latency of the most recent requests of a client, and how many were
+    retried or hedged."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.retries = 0
+        self.hedges = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self.lock:
+            self.latencies.append(seconds)
+
+    def record_retry(self) -> None:
+        with self.lock:
+            self.retries += 1
+
+    def record_hedge(self) -> None:
+        with self.lock:
+            self.hedges += 1
+
+    def percentile(self, percent: float) -> float | None:
+        """The nearest-rank percentile of the recorded latencies, in seconds."""
+        with self.lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        rank = math.ceil(percent / 100 * len(latencies))
+        return latencies[min(max(rank, 1), len(latencies)) - 1]
+
+    def p50(self) -> float | None:
+        return self.percentile(50)
+
+    def p99(self) -> float | None:
+        return self.percentile(99)
+
+    def summary(self) -> str:
+        p50 = self.p50()
+        p99 = self.p99()
+        if p50 is None or p99 is None:
+            return "no requests"
+        return (
+            f"p50/p99 latency: {p50 * 1000:.1f} / {p99 * 1000:.1f} ms over "
+            f"{len(self.latencies)} requests, retries: {self.retries}, "
+            f"hedges: {self.hedges}"
+        )
+
+
+class RequestPolicy:
+    """Timeout, retries and hedging of the requests of a client.
+
+    A request failing with a transient error is retried up to `retries`
+    times, after exponentially growing, jittered delays starting at
+    `backoff` seconds. With `hedge_percentile` set, a request still running
+    after that percentile of the recent latencies is duplicated, and
+    whichever answer arrives first is used.
+    """
+
+    def __init__(
+        self,
+        timeout: float,
+        retries: int,
+        backoff: float,
+        hedge_percentile: float | None,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge_percentile = hedge_percentile
+
+    @staticmethod
+    def from_config() -> RequestPolicy:
+        config = Config.global_instance
+        return RequestPolicy(
+            config.http_timeout(),
+            config.http_retries(),
+            config.http_retry_backoff(),
+            config.http_hedge_percentile(),
+        )
+
+    def retry_delay(self, attempt: int) -> float:
+        return self.backoff * 2**attempt * random.uniform(0.5, 1.0)
+
+    def hedge_delay(self, stats: RequestStats) -> float | None:
+        if self.hedge_percentile is None or len(stats.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return stats.percentile(self.hedge_percentile)
+
+    def call(self, send: Callable[[], T], stats: RequestStats) -> T:
+        attempt = 0
+        while True:
+            try:
+                return self._hedged(send, stats)
+            except Exception as e:
+                if attempt >= self.retries or not is_transient(e):
+                    raise
+                delay = self.retry_delay(attempt)
+                logger.debug(f"retrying in {delay:.3f}s after {e!r}")
+                stats.record_retry()
+                attempt += 1
+                time.sleep(delay)
+
+    async def call_async(
+        self, send: Callable[[], Awaitable[T]], stats: RequestStats
+    ) -> T:
+        attempt = 0
+        while True:
+            try:
+                return await self._hedged_async(send, stats)
+            except Exception as e:
+                if attempt >= self.retries or not is_transient(e):
+                    raise
+                delay = self.retry_delay(attempt)
+                logger.debug(f"retrying in {delay:.3f}s after {e!r}")
+                stats.record_retry()
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def _timed(self, send: Callable[[], T], stats: RequestStats) -> T:
+        start = time.perf_counter()
+        result = send()
+        stats.record(time.perf_counter() - start)
+        return result
+
+    async def _timed_async(
+        self, send: Callable[[], Awaitable[T]], stats: RequestStats
+    ) -> T:
+        start = time.perf_counter()
+        result = await send()
+        stats.record(time.perf_counter() - start)
+        return result
+
+    def _hedged(self, send: Callable[[], T], stats: RequestStats) -> T:
+        delay = self.hedge_delay(stats)
+        if delay is None:
+            return self._timed(send, stats)
+
+        # Each fetch running at once may have a request and its hedge
+        executor = hedge_executor(2 * Config.global_instance.fetch_concurrency())
+        if executor is None:
+            return self._timed(send, stats)
+
+        # The request that loses is left to finish on its own, as blocking
+        # requests can't be cancelled.
+        futures = {executor.submit(self._timed, send, stats)}
+        done, _ = concurrent.futures.wait(futures, timeout=delay)
+        if not done:
+            logger.debug(f"hedging a request running for over {delay:.3f}s")
+            stats.record_hedge()
+            futures.add(executor.submit(self._timed, send, stats))
+        return self._first_answer(futures)
+
+    def _first_answer(self, futures: set) -> T:
+        error: BaseException | None = None
+        while futures:
+            done, futures = concurrent.futures.wait(
+                futures, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        assert error is not None
+        raise error
+
+    async def _hedged_async(
+        self, send: Callable[[], Awaitable[T]], stats: RequestStats
+    ) -> T:
+        delay = self.hedge_delay(stats)
+        if delay is None:
+            return await self._timed_async(send, stats)
+
+        tasks = {asyncio.ensure_future(self._timed_async(send, stats))}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                logger.debug(f"hedging a request running for over {delay:.3f}s")
+                stats.record_hedge()
+                tasks.add(asyncio.ensure_future(self._timed_async(send, stats)))
+
+            error: BaseException | None = None
+            pending = tasks
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            assert error is not None
+            raise error
+        finally:
+            # The request that lost is no longer needed
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from logging import getLogger
+from typing import AsyncGenerator, Awaitable, Callable, Generator, List, Tuple
+
+import numpy as np
+
+from flatgeobuf.packedrtree import (
+    NODE_ITEM_BYTE_LEN,
+    NODE_ITEM_DTYPE,
+    PackedRTree,
+    Rect,
+    SearchResult,
+    generate_level_bounds,
+)
+
+logger = getLogger(__name__)
+
+ReadNodeFn = Callable[[int, int], bytes]
+AsyncReadNodeFn = Callable[[int, int], Awaitable[bytes]]
+
+
+class SpatialIndex:
+    """In-memory packed R-tree that can answer any number of queries.
+
+    The tree is kept as one structured array per level (see
+    `generate_level_bounds` for the layout), either loaded all at once or
+    level by level as queries first reach them.
+    """
+
+    def __init__(self, num_items: int, node_size: int):
+        self.num_items = num_items
+        self.node_size = node_size
+        self.level_bounds = generate_level_bounds(num_items, node_size)
+        self.levels: List[np.ndarray | None] = [None] * len(self.level_bounds)
+
+    def is_loaded(self) -> bool:
+        return all(nodes is not None for nodes in self.levels)
+
+    def memory_usage(self) -> int:
+        """Bytes held by the loaded levels."""
+        return sum(nodes.nbytes for nodes in self.levels if nodes is not None)
+
+    def level_of(self, node_idx: int) -> int:
+        for level, (start, end) in enumerate(self.level_bounds):
+            if start <= node_idx < end:
+                return level
+        raise ValueError(f"Node index {node_idx} is out of bounds")
+
+    def _set_level(self, level: int, buffer: bytes) -> None:
+        start, end = self.level_bounds[level]
+        self.levels[level] = np.frombuffer(
+            buffer, dtype=NODE_ITEM_DTYPE, count=end - start
+        )
+        logger.debug(f"loaded level {level} ({end - start} nodes)")
+
+    def _set_tree(self, buffer: bytes) -> None:
+        nodes = np.frombuffer(buffer, dtype=NODE_ITEM_DTYPE)
+        for level, (start, end) in enumerate(self.level_bounds):
+            self.levels[level] = nodes[start:end]
+
+    def _tree_length(self) -> int:
+        return self.level_bounds[0][1] * NODE_ITEM_BYTE_LEN
+
+    def _level_range(self, level: int) -> Tuple[int, int]:
+        start, end = self.level_bounds[level]
+        return start * NODE_ITEM_BYTE_LEN, (end - start) * NODE_ITEM_BYTE_LEN
+
+    async def load_async(self, read_node: AsyncReadNodeFn) -> SpatialIndex:
+        self._set_tree(await read_node(0, self._tree_length()))
+        return self
+
+    def load(self, read_node: ReadNodeFn) -> SpatialIndex:
+        self._set_tree(read_node(0, self._tree_length()))
+        return self
+
+    async def load_level_async(self, level: int, read_node: AsyncReadNodeFn) -> None:
+        self._set_level(level, await read_node(*self._level_range(level)))
+
+    def load_level(self, level: int, read_node: ReadNodeFn) -> None:
+        self._set_level(level, read_node(*self._level_range(level)))
+
+    def read_node(self, offset_into_tree: int, size: int) -> memoryview:
+        """Serve a node range from the loaded levels, like a reader's `read_node`."""
+        start_node_idx = offset_into_tree // NODE_ITEM_BYTE_LEN
+        num_nodes = size // NODE_ITEM_BYTE_LEN
+
+        level = self.level_of(start_node_idx)
+        nodes = self.levels[level]
+        if nodes is None:
+            raise ValueError(f"Level {level} of the index is not loaded")
+
+        level_start, level_end = self.level_bounds[level]
+        if start_node_idx + num_nodes > level_end:
+            raise ValueError("Node range spans multiple levels")
+
+        start = start_node_idx - level_start
+        return nodes[start : start + num_nodes].data
+
+    def wrap_read_node_async(
+        self, read_node: AsyncReadNodeFn | None = None
+    ) -> AsyncReadNodeFn:
+        """Build a node reader that serves from memory, loading missing levels on demand."""
+
+        async def read_cached_node(offset_into_tree: int, size: int) -> memoryview:
+            level = self.level_of(offset_into_tree // NODE_ITEM_BYTE_LEN)
+            if self.levels[level] is None and read_node is not None:
+                await self.load_level_async(level, read_node)
+            return self.read_node(offset_into_tree, size)
+
+        return read_cached_node
+
+    def wrap_read_node(self, read_node: ReadNodeFn | None = None) -> ReadNodeFn:
+        """Build a node reader that serves from memory, loading missing levels on demand."""
+
+        def read_cached_node(offset_into_tree: int, size: int) -> memoryview:
+            level = self.level_of(offset_into_tree // NODE_ITEM_BYTE_LEN)
+            if self.levels[level] is None and read_node is not None:
+                self.load_level(level, read_node)
+            return self.read_node(offset_into_tree, size)
+
+        return read_cached_node
+
+    async def stream_search_async(
+        self, rect: Rect, read_node: AsyncReadNodeFn | None = None
+    ) -> AsyncGenerator[SearchResult, None]:
+        tree = PackedRTree(self.num_items, self.node_size, rect)
+        async for search_result in tree.stream_search_async(
+            self.wrap_read_node_async(read_node)
+        ):
+            yield search_result
+
+    def stream_search(
+        self, rect: Rect, read_node: ReadNodeFn | None = None
+    ) -> Generator[SearchResult, None, None]:
+        tree = PackedRTree(self.num_items, self.node_size, rect)
+        yield from tree.stream_search(self.wrap_read_node(read_node))
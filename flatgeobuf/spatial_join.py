@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+from logging import getLogger
+from typing import Dict, Generator, List, Tuple, Union
+
+import numpy as np
+
+from flatgeobuf.file_reader import FileReader
+from flatgeobuf.FlatGeobuf.Feature import Feature
+from flatgeobuf.http_reader import HTTPReader
+from flatgeobuf.packedrtree import (
+    NODE_ITEM_BYTE_LEN,
+    NODE_ITEM_DTYPE,
+    generate_level_bounds,
+)
+
+logger = getLogger(__name__)
+
+JoinReader = Union[FileReader, HTTPReader]
+
+# Number of node pairs expanded at once. Bounds the memory used while
+# descending, since every pair expands into up to node_size ** 2 pairs.
+JOIN_CHUNK_SIZE = 4096
+
+
+class _Frontier:
+    """Nodes of one side of the join, one entry per pair."""
+
+    def __init__(self, node_idxs: np.ndarray, nodes: np.ndarray, lengths: np.ndarray):
+        self.node_idxs = node_idxs
+        self.nodes = nodes
+        # Feature lengths, only known once the side reached its leaves
+        self.lengths = lengths
+
+    def __len__(self) -> int:
+        return len(self.node_idxs)
+
+    def take(self, selection: Union[slice, np.ndarray]) -> _Frontier:
+        return _Frontier(
+            self.node_idxs[selection], self.nodes[selection], self.lengths[selection]
+        )
+
+
+class _JoinSide:
+    def __init__(self, reader: JoinReader):
+        self.reader = reader
+        self.num_items = reader.header.features_count
+        self.node_size = reader.header.index_node_size
+        self.level_bounds = generate_level_bounds(self.num_items, self.node_size)
+        self.read_node = reader.index_node_reader()
+
+    def root_level(self) -> int:
+        return len(self.level_bounds) - 1
+
+    def first_leaf(self) -> int:
+        return self.level_bounds[0][0]
+
+    def root(self) -> _Frontier:
+        node_idxs, nodes = self.fetch([(0, 1)])
+        return _Frontier(node_idxs, nodes, np.full(1, -1, dtype=np.int64))
+
+    def fetch(self, ranges: List[Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray]:
+        # Read the given node ranges, merging those closer than the extra request
+        # threshold so that neighbouring subtrees share a request.
+        extra_request_threshold_nodes = (
+            self.reader.batching.extra_request_threshold() // NODE_ITEM_BYTE_LEN
+        )
+
+        merged: List[List[int]] = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + extra_request_threshold_nodes:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+
+        node_idxs = []
+        nodes = []
+        for start, end in merged:
+            logger.debug(f"fetching join nodes {start}..{end}")
+            buffer = self.read_node(
+                start * NODE_ITEM_BYTE_LEN, (end - start) * NODE_ITEM_BYTE_LEN
+            )
+            node_idxs.append(np.arange(start, end))
+            nodes.append(np.frombuffer(buffer, dtype=NODE_ITEM_DTYPE))
+        return np.concatenate(node_idxs), np.concatenate(nodes)
+
+    def candidates(
+        self, frontier: _Frontier, level: int, descend: bool
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Candidate nodes for each pair: (start, count, node_idxs, nodes, lengths).
+
+        The last three are the nodes to look candidates up in, sorted by index.
+        """
+        if not descend:
+            node_idxs, first = np.unique(frontier.node_idxs, return_index=True)
+            return (
+                frontier.node_idxs,
+                np.ones(len(frontier), dtype=np.int64),
+                node_idxs,
+                frontier.nodes[first],
+                frontier.lengths[first],
+            )
+
+        child_level = level - 1
+        level_end = self.level_bounds[child_level][1]
+        first_child = frontier.nodes["offset"].astype(np.int64)
+        end_child = np.minimum(first_child + self.node_size, level_end)
+
+        # As in PackedRTree, leaf reads include the next node, if there is one,
+        # so that feature lengths can be inferred.
+        extra = 1 if child_level == 0 else 0
+        fetch_end = np.minimum(end_child + extra, level_end)
+        unique_first, first = np.unique(first_child, return_index=True)
+        node_idxs, nodes = self.fetch(
+            list(zip(unique_first.tolist(), fetch_end[first].tolist()))
+        )
+
+        lengths = np.full(len(node_idxs), -1, dtype=np.int64)
+        if child_level == 0:
+            offsets = nodes["offset"].astype(np.int64)
+            consecutive = node_idxs[1:] == node_idxs[:-1] + 1
+            lengths[:-1] = np.where(consecutive, offsets[1:] - offsets[:-1], -1)
+
+        return first_child, end_child - first_child, node_idxs, nodes, lengths
+
+
+def _intersecting(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    return ~(
+        (left["max_x"] < right["min_x"])
+        | (left["max_y"] < right["min_y"])
+        | (left["min_x"] > right["max_x"])
+        | (left["min_y"] > right["max_y"])
+    )
+
+
+def _expand(
+    left_side: _JoinSide,
+    left: _Frontier,
+    left_level: int,
+    descend_left: bool,
+    right_side: _JoinSide,
+    right: _Frontier,
+    right_level: int,
+    descend_right: bool,
+) -> Tuple[_Frontier, _Frontier]:
+    l_start, l_count, l_idxs, l_nodes, l_lengths = left_side.candidates(
+        left, left_level, descend_left
+    )
+    r_start, r_count, r_idxs, r_nodes, r_lengths = right_side.candidates(
+        right, right_level, descend_right
+    )
+
+    # Every pair expands into the cross product of its candidates.
+    num_pairs = l_count * r_count
+    pair = np.repeat(np.arange(len(num_pairs)), num_pairs)
+    within = np.arange(num_pairs.sum()) - np.repeat(
+        np.cumsum(num_pairs) - num_pairs, num_pairs
+    )
+    left_pos = np.searchsorted(l_idxs, l_start[pair] + within // r_count[pair])
+    right_pos = np.searchsorted(r_idxs, r_start[pair] + within % r_count[pair])
+
+    mask = _intersecting(l_nodes[left_pos], r_nodes[right_pos])
+    left_pos = left_pos[mask]
+    right_pos = right_pos[mask]
+
+    return (
+        _Frontier(l_idxs[left_pos], l_nodes[left_pos], l_lengths[left_pos]),
+        _Frontier(r_idxs[right_pos], r_nodes[right_pos], r_lengths[right_pos]),
+    )
+
+
+def _join(
+    left_side: _JoinSide,
+    left: _Frontier,
+    left_level: int,
+    right_side: _JoinSide,
+    right: _Frontier,
+    right_level: int,
+) -> Generator[Tuple[_Frontier, _Frontier], None, None]:
+    if left_level == 0 and right_level == 0:
+        yield left, right
+        return
+
+    # Descend whichever side is higher up in its tree, or both when even.
+    descend_left = left_level > 0 and left_level >= right_level
+    descend_right = right_level > 0 and right_level >= left_level
+    next_left_level = left_level - 1 if descend_left else left_level
+    next_right_level = right_level - 1 if descend_right else right_level
+
+    for start in range(0, len(left), JOIN_CHUNK_SIZE):
+        chunk = slice(start, start + JOIN_CHUNK_SIZE)
+        next_left, next_right = _expand(
+            left_side,
+            left.take(chunk),
+            left_level,
+            descend_left,
+            right_side,
+            right.take(chunk),
+            right_level,
+            descend_right,
+        )
+        if len(next_left):
+            yield from _join(
+                left_side,
+                next_left,
+                next_left_level,
+                right_side,
+                next_right,
+                next_right_level,
+            )
+
+
+def _join_leaves(
+    left_side: _JoinSide, right_side: _JoinSide
+) -> Generator[Tuple[_Frontier, _Frontier], None, None]:
+    left = left_side.root()
+    right = right_side.root()
+    if not _intersecting(left.nodes, right.nodes)[0]:
+        return
+
+    yield from _join(
+        left_side,
+        left,
+        left_side.root_level(),
+        right_side,
+        right,
+        right_side.root_level(),
+    )
+
+
+def spatial_join(
+    left_reader: JoinReader, right_reader: JoinReader
+) -> Generator[Tuple[int, int], None, None]:
+    """Pairs of (left, right) feature indices whose bounding boxes intersect.
+
+    Both packed R-trees are descended together, pairing off overlapping nodes
+    level by level, so each index node is read once per chunk of pairs rather
+    than once per query.
+    """
+    left_side = _JoinSide(left_reader)
+    right_side = _JoinSide(right_reader)
+    for left, right in _join_leaves(left_side, right_side):
+        yield from zip(
+            (left.node_idxs - left_side.first_leaf()).tolist(),
+            (right.node_idxs - right_side.first_leaf()).tolist(),
+        )
+
+
+def spatial_join_features(
+    left_reader: JoinReader, right_reader: JoinReader
+) -> Generator[Tuple[Feature, Feature], None, None]:
+    """Pairs of (left, right) features whose bounding boxes intersect.
+
+    Features on both sides are fetched in batches, once per chunk of pairs.
+    """
+    left_side = _JoinSide(left_reader)
+    right_side = _JoinSide(right_reader)
+    for left, right in _join_leaves(left_side, right_side):
+        left_features = _read_features(left_reader, left)
+        right_features = _read_features(right_reader, right)
+        for left_offset, right_offset in zip(
+            left.nodes["offset"].tolist(), right.nodes["offset"].tolist()
+        ):
+            yield left_features[left_offset], right_features[right_offset]
+
+
+def _read_features(reader: JoinReader, leaves: _Frontier) -> Dict[int, Feature]:
+    offsets, first = np.unique(leaves.nodes["offset"], return_index=True)
+    lengths = leaves.lengths[first]
+
+    batches = reader.batching.build_batches(
+        (feature_offset, feature_length if feature_length >= 0 else None)
+        for feature_offset, feature_length in zip(offsets.tolist(), lengths.tolist())
+    )
+    features = (
+        feature for batch in batches for feature in reader.read_feature_batch(batch)
+    )
+    return dict(zip(offsets.tolist(), features))
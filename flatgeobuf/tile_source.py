@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import math
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Deque, List, Tuple, Union
+
+from flatgeobuf.async_http_reader import AsyncHTTPReader
+from flatgeobuf.batching import Batch
+from flatgeobuf.file_reader import FileReader
+from flatgeobuf.FlatGeobuf.Feature import Feature
+from flatgeobuf.http_reader import HTTPReader
+from flatgeobuf.packedrtree import NODE_ITEM_BYTE_LEN, IndexHits, PackedRTree, Rect
+from flatgeobuf.spatial_index import SpatialIndex
+
+logger = getLogger(__name__)
+
+TileReader = Union[FileReader, HTTPReader]
+TileKey = Tuple[int, int, int]
+
+# Half the circumference of the earth in web mercator (EPSG:3857) metres
+ORIGIN_SHIFT = 20037508.342789244
+
+# Upper levels of the index are held in memory up to this many bytes
+INDEX_CACHE_BYTES = 16 * 1024 * 1024
+
+# Number of recent requests kept for latency stats
+STATS_HISTORY = 1024
+
+
+def tile_bounds(z: int, x: int, y: int, buffer: float = 0.0) -> Rect:
+    """Web mercator bounds of an XYZ tile, grown by `buffer` tile widths."""
+    num_tiles = 1 << z
+    if not (0 <= x < num_tiles and 0 <= y < num_tiles):
+        raise ValueError(f"Tile {z}/{x}/{y} is out of range")
+
+    size = 2 * ORIGIN_SHIFT / num_tiles
+    min_x = -ORIGIN_SHIFT + x * size
+    max_y = ORIGIN_SHIFT - y * size
+    margin = buffer * size
+    return (
+        min_x - margin,
+        max_y - size - margin,
+        min_x + size + margin,
+        max_y + margin,
+    )
+
+
+def mercator_to_lonlat(x: float, y: float) -> Tuple[float, float]:
+    lon = x / ORIGIN_SHIFT * 180.0
+    lat = math.degrees(
+        2 * math.atan(math.exp(y / ORIGIN_SHIFT * math.pi)) - math.pi / 2
+    )
+    return lon, lat
+
+
+def tile_bbox(z: int, x: int, y: int, buffer: float = 0.0) -> Rect:
+    """Longitude/latitude bounds of an XYZ tile, grown by `buffer` tile widths."""
+    min_x, min_y, max_x, max_y = tile_bounds(z, x, y, buffer)
+    min_lon, min_lat = mercator_to_lonlat(min_x, min_y)
+    max_lon, max_lat = mercator_to_lonlat(max_x, max_y)
+    return (min_lon, min_lat, max_lon, max_lat)
+
+
+@dataclass
+class TileStats:
+    hits: int = 0
+    misses: int = 0
+    # Seconds spent answering requests from the cache, and from the file
+    hit_seconds: float = 0.0
+    miss_seconds: float = 0.0
+    # (tile, seconds, hit) of the most recent requests
+    recent: Deque[Tuple[TileKey, float, bool]] = field(
+        default_factory=lambda: deque(maxlen=STATS_HISTORY)
+    )
+
+    def requests(self) -> int:
+        return self.hits + self.misses
+
+    def hit_rate(self) -> float:
+        requests = self.requests()
+        return self.hits / requests if requests else 0.0
+
+    def mean_hit_latency(self) -> float:
+        return self.hit_seconds / self.hits if self.hits else 0.0
+
+    def mean_miss_latency(self) -> float:
+        return self.miss_seconds / self.misses if self.misses else 0.0
+
+    def record(self, tile: TileKey, seconds: float, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+            self.hit_seconds += seconds
+        else:
+            self.misses += 1
+            self.miss_seconds += seconds
+        self.recent.append((tile, seconds, hit))
+
+
+class TileSource:
+    """Serves XYZ tiles from an opened reader.
+
+    The header and the upper levels of the index are read once and kept, and
+    the feature bytes of recently requested tiles are kept in an LRU cache.
+    Tiles are in web mercator; the file is assumed to be in EPSG:3857 when its
+    CRS says so, and in longitude/latitude otherwise.
+
+    With an AsyncHTTPReader, tiles are read with `get_tile_async`, and the
+    upper levels of the index are loaded by the first one rather than here.
+    """
+
+    def __init__(
+        self,
+        reader: TileReader | AsyncHTTPReader,
+        buffer: float = 0.0,
+        cache_size: int = 256,
+        index_cache_bytes: int = INDEX_CACHE_BYTES,
+    ):
+        reader.require_index()
+        self.reader = reader
+        self.buffer = buffer
+        self.cache_size = cache_size
+        self.cache: OrderedDict[TileKey, List[bytes]] = OrderedDict()
+        self.stats = TileStats()
+
+        crs = reader.header.crs
+        self.mercator = crs is not None and crs.code == 3857
+
+        # Keep the levels above the leaves, from the root down, while they
+        # fit. Leaves are read from the file as tiles need them.
+        header = reader.header
+        self.index = SpatialIndex(header.features_count, header.index_node_size)
+        self.cached_levels: List[int] = []
+        loaded_bytes = 0
+        for level in reversed(range(1, len(self.index.level_bounds))):
+            start, end = self.index.level_bounds[level]
+            loaded_bytes += (end - start) * NODE_ITEM_BYTE_LEN
+            if loaded_bytes > index_cache_bytes:
+                break
+            self.cached_levels.append(level)
+        if not isinstance(reader, AsyncHTTPReader):
+            for level in self.cached_levels:
+                self.index.load_level(level, reader.index_node_reader())
+
+    def bbox(self, z: int, x: int, y: int) -> Rect:
+        """Bounds of a tile in the CRS of the file, including the buffer."""
+        if self.mercator:
+            return tile_bounds(z, x, y, self.buffer)
+        return tile_bbox(z, x, y, self.buffer)
+
+    def get_tile(self, z: int, x: int, y: int) -> List[Feature]:
+        start = time.perf_counter()
+        key = (z, x, y)
+
+        features = self._cached(key)
+        hit = features is not None
+        if not hit:
+            features = self._read_tile(self.bbox(z, x, y))
+            self._store(key, features)
+
+        self.stats.record(key, time.perf_counter() - start, hit)
+        return [Feature.GetRootAs(feature, 0) for feature in features]
+
+    async def get_tile_async(self, z: int, x: int, y: int) -> List[Feature]:
+        start = time.perf_counter()
+        key = (z, x, y)
+
+        features = self._cached(key)
+        hit = features is not None
+        if not hit:
+            features = await self._read_tile_async(self.bbox(z, x, y))
+            self._store(key, features)
+
+        self.stats.record(key, time.perf_counter() - start, hit)
+        return [Feature.GetRootAs(feature, 0) for feature in features]
+
+    def _cached(self, key: TileKey) -> List[bytes] | None:
+        features = self.cache.get(key)
+        if features is not None:
+            self.cache.move_to_end(key)
+        return features
+
+    def _store(self, key: TileKey, features: List[bytes]) -> None:
+        self.cache[key] = features
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def _read_node(self, offset_into_tree: int, size: int) -> bytes:
+        level = self.index.level_of(offset_into_tree // NODE_ITEM_BYTE_LEN)
+        if self.index.levels[level] is not None:
+            return self.index.read_node(offset_into_tree, size)
+        return self.reader.read_node(offset_into_tree, size)
+
+    async def _read_node_async(self, offset_into_tree: int, size: int) -> bytes:
+        level = self.index.level_of(offset_into_tree // NODE_ITEM_BYTE_LEN)
+        if self.index.levels[level] is None and level in self.cached_levels:
+            await self.index.load_level_async(level, self.reader.index_node_reader())
+        if self.index.levels[level] is not None:
+            return self.index.read_node(offset_into_tree, size)
+        return await self.reader.read_node(offset_into_tree, size)
+
+    def _tree(self, rect: Rect) -> PackedRTree:
+        header = self.reader.header
+        return PackedRTree(
+            header.features_count,
+            header.index_node_size,
+            rect,
+            extra_request_threshold=self.reader.batching.extra_request_threshold(),
+        )
+
+    def _batches(self, hits: IndexHits) -> List[Batch]:
+        return self.reader.batching.build_batches(
+            [
+                (feature_offset, feature_length)
+                for feature_offset, _, feature_length in hits.search_results()
+            ]
+        )
+
+    def _read_tile(self, rect: Rect) -> List[bytes]:
+        # Features are read like those of any other query, batched and fetched
+        # ahead. Each is parsed in place, from a view of just its own bytes
+        # within its batch, which is copied so that cached tiles only hold
+        # their own features.
+        hits = self._tree(rect).search_hits(self._read_node)
+        features = [
+            bytes(feature._tab.Bytes)
+            for feature in self.reader.read_feature_batches(self._batches(hits))
+        ]
+        logger.debug(f"read {len(features)} features for tile bbox {rect}")
+        return features
+
+    async def _read_tile_async(self, rect: Rect) -> List[bytes]:
+        hits = await self._tree(rect).search_hits_async(self._read_node_async)
+        features = [
+            bytes(feature._tab.Bytes)
+            async for feature in self.reader.read_feature_batches(self._batches(hits))
+        ]
+        logger.debug(f"read {len(features)} features for tile bbox {rect}")
+        return features
@@ -0,0 +1,167 @@
+import re
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    # Keep-alive, so that clients can reuse connections
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            if self.path.startswith("http://"):
+                # Sent to the server as a proxy
+                server.proxied_requests += 1
+                self.path = urlsplit(self.path).path
+            server.authorization = self.headers.get("Authorization")
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            delay = server.delays.pop(0) if server.delays else server.delay
+            error = server.errors.pop(0) if server.errors else None
+        try:
+            time.sleep(delay)
+            if error is not None:
+                self.send_body(error, b"")
+                return
+            self.send_range()
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def send_range(self):
+        with open(self.translate_path(self.path), "rb") as f:
+            data = f.read()
+
+        header = self.headers.get("Range", "")
+        ranges = [
+            (int(first), int(last) if last else len(data) - 1)
+            for first, last in re.findall(r"(\d+)-(\d*)", header)
+        ]
+        if not header.startswith("bytes=") or not ranges:
+            self.send_body(200, data)
+            return
+
+        if len(ranges) > 1:
+            self.server.multi_range_requests += 1
+            if self.server.multi_range == "ignore":
+                self.send_body(200, data)
+                return
+            if self.server.multi_range == "first":
+                ranges = ranges[:1]
+
+        ranges = [
+            (first, min(last, len(data) - 1))
+            for first, last in ranges
+            if first < len(data)
+        ]
+        if not ranges:
+            self.send_body(416, b"", {"Content-Range": f"bytes */{len(data)}"})
+            return
+
+        if len(ranges) == 1:
+            first, last = ranges[0]
+            self.send_body(
+                206,
+                data[first : last + 1],
+                {"Content-Range": f"bytes {first}-{last}/{len(data)}"},
+            )
+            return
+
+        boundary = "range-boundary"
+        body = (
+            b"".join(
+                (
+                    f"--{boundary}\r\n"
+                    "Content-Type: application/octet-stream\r\n"
+                    f"Content-Range: bytes {first}-{last}/{len(data)}\r\n\r\n"
+                ).encode()
+                + data[first : last + 1]
+                + b"\r\n"
+                for first, last in ranges
+            )
+            + f"--{boundary}--\r\n".encode()
+        )
+        self.send_body(
+            206,
+            body,
+            {"Content-Type": f"multipart/byteranges; boundary={boundary}"},
+        )
+
+    def send_body(self, status, body, headers={}):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class RangeServer(ThreadingHTTPServer):
+    """Serves files of a directory over HTTP/1.1 with range requests, counting
+    connections, requests and the most requests handled at once.
+
+    Multi-range requests are answered with multipart/byteranges, or, with
+    `multi_range` set to "ignore" or "first", with the whole file or only
+    the first range.
+
+    Requests are answered after `delay` seconds, or after the delays queued
+    in `delays`, one per request, and with the error statuses queued in
+    `errors`.
+
+    Requests for absolute URLs are served as a proxy would, from the same
+    directory whatever the host, and counted in `proxied_requests`.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        directory: str = "tests/data",
+        delay: float = 0.0,
+        multi_range: str = "multipart",
+    ):
+        super().__init__(
+            ("127.0.0.1", 0), partial(RangeRequestHandler, directory=directory)
+        )
+        self.delay = delay
+        self.multi_range = multi_range
+        self.multi_range_requests = 0
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.proxied_requests = 0
+        # Of the last request
+        self.authorization: Optional[str] = None
+        self.active = 0
+        self.max_active = 0
+        self.delays: List[float] = []
+        self.errors: List[int] = []
+
+    def handle_error(self, request, client_address):
+        # Clients that time out close their connection mid-response
+        pass
+
+    def url(self, name: str) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/{name}"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
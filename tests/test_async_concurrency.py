@@ -0,0 +1,76 @@
+import asyncio
+import time
+from unittest import TestCase
+
+from range_server import RangeServer
+
+from flatgeobuf.async_http_reader import AsyncHTTPReader
+from flatgeobuf.config import Config
+from flatgeobuf.file_reader import FileReader
+from flatgeobuf.generic.feature import parse_properties
+from flatgeobuf.http_pool import HttpConnectionPool
+from flatgeobuf.http_range_client import HttpRangeClient
+
+EUROPE_BBOX = (-10.0, 35.0, 30.0, 60.0)
+DELAY = 0.02
+
+
+class TestAsyncConcurrency(TestCase):
+    def setUp(self):
+        config = Config.global_instance
+        self.threshold = config.extra_request_threshold()
+        self.concurrency = config.fetch_concurrency()
+        self.prefetch_levels = config.index_prefetch_levels()
+        self.max_bytes = config.block_cache_max_bytes()
+        # A request for every feature, and for every node range
+        config.set_extra_request_threshold(0)
+        config.set_index_prefetch_levels(0)
+        config.set_block_cache_max_bytes(0)
+
+        with open("tests/data/countries.fgb", "rb") as f:
+            reader = FileReader.load(f)
+            self.expected = [
+                parse_properties(feature, reader.header.columns)["id"]
+                for feature, _ in reader.select_bboxes([EUROPE_BBOX])
+            ]
+            self.expected_count = reader.count(EUROPE_BBOX)
+
+    def tearDown(self):
+        config = Config.global_instance
+        config.set_extra_request_threshold(self.threshold)
+        config.set_fetch_concurrency(self.concurrency)
+        config.set_index_prefetch_levels(self.prefetch_levels)
+        config.set_block_cache_max_bytes(self.max_bytes)
+
+    def query(self, server: RangeServer, concurrency: int):
+        Config.global_instance.set_fetch_concurrency(concurrency)
+
+        async def run():
+            pool = HttpConnectionPool(max_connections_per_host=concurrency)
+            reader = await AsyncHTTPReader.open(
+                HttpRangeClient(server.url("countries.fgb"), pool=pool)
+            )
+            start = time.perf_counter()
+            ids = [
+                parse_properties(feature, reader.header.columns)["id"]
+                async for feature, _ in reader.select_bboxes([EUROPE_BBOX])
+            ]
+            elapsed = time.perf_counter() - start
+            count = await reader.count(EUROPE_BBOX)
+            return ids, count, elapsed, pool.requests_ever_made
+
+        return asyncio.run(run())
+
+    def test_select_bboxes(self):
+        with RangeServer(delay=DELAY) as server:
+            ids, count, sequential, requests = self.query(server, 1)
+            self.assertListEqual(ids, self.expected)
+            self.assertEqual(count, self.expected_count)
+            self.assertGreater(requests, 15)
+            self.assertEqual(server.max_active, 1)
+
+            ids, count, concurrent, _ = self.query(server, 8)
+            self.assertListEqual(ids, self.expected)
+            self.assertEqual(count, self.expected_count)
+            self.assertGreater(server.max_active, 1)
+            self.assertLess(concurrent, sequential / 2)
@@ -0,0 +1,98 @@
+import math
+from unittest import TestCase
+
+from range_server import RangeServer
+
+from flatgeobuf.batching import (
+    ADAPTIVE_MIN_SAMPLES,
+    AdaptiveBatchingPolicy,
+    BatchingPolicy,
+    build_batches,
+)
+from flatgeobuf.config import Config
+from flatgeobuf.file_reader import FileReader
+from flatgeobuf.generic.feature import parse_properties
+from flatgeobuf.http_reader import HTTPReader
+from flatgeobuf.reader_state import ReaderStateCache
+
+EUROPE_BBOX = (-10.0, 35.0, 30.0, 60.0)
+
+
+class TestBatching(TestCase):
+    def setUp(self):
+        config = Config.global_instance
+        self.max_bytes = config.block_cache_max_bytes()
+        config.set_block_cache_max_bytes(0)
+        ReaderStateCache.global_instance.clear()
+
+    def tearDown(self):
+        Config.global_instance.set_block_cache_max_bytes(self.max_bytes)
+
+    def select_ids(self, reader):
+        return [
+            parse_properties(feature, reader.header.columns)["id"]
+            for feature, _ in reader.select_bboxes([EUROPE_BBOX])
+        ]
+
+    def test_max_batch_bytes(self):
+        feature_ranges = [(0, 10), (10, 10), (25, 10), (35, 100), (135, 10)]
+        self.assertListEqual(
+            build_batches(feature_ranges, math.inf, 30),
+            [[(0, 10), (10, 10)], [(25, 10)], [(35, 100)], [(135, 10)]],
+        )
+        self.assertListEqual(
+            build_batches(feature_ranges, 0, math.inf),
+            [[(0, 10), (10, 10)], [(25, 10), (35, 100), (135, 10)]],
+        )
+
+    def test_adaptive_threshold(self):
+        policy = AdaptiveBatchingPolicy(max_batch_bytes=10_000_000)
+        configured = Config.global_instance.extra_request_threshold()
+        self.assertEqual(policy.extra_request_threshold(), configured)
+
+        # Fetches of the same length don't tell latency and throughput apart
+        for _ in range(ADAPTIVE_MIN_SAMPLES):
+            policy.record(1000, 0.01)
+        self.assertEqual(policy.extra_request_threshold(), configured)
+
+        # 50ms round trips at 10 MB/s are worth 500 KB of gap
+        policy = AdaptiveBatchingPolicy(max_batch_bytes=10_000_000)
+        for length in range(0, 2_000_000, 100_000):
+            policy.record(length, 0.05 + length / 10_000_000)
+        self.assertAlmostEqual(policy.extra_request_threshold(), 500_000, delta=1000)
+
+        # Latency only, merged up to the cap
+        policy = AdaptiveBatchingPolicy(max_batch_bytes=1_000_000)
+        for length in range(0, 2_000_000, 100_000):
+            policy.record(length, 0.05)
+        self.assertEqual(policy.extra_request_threshold(), 1_000_000)
+
+        # Throughput only, nothing is worth merging
+        policy = AdaptiveBatchingPolicy()
+        for length in range(0, 2_000_000, 100_000):
+            policy.record(length, length / 10_000_000)
+        self.assertAlmostEqual(policy.extra_request_threshold(), 0, delta=1)
+
+    def test_reader_policy(self):
+        with open("tests/data/countries.fgb", "rb") as f:
+            reader = FileReader.load(f)
+            expected = self.select_ids(reader)
+            merged = reader.header_client.file_client.requests_ever_made
+
+        with open("tests/data/countries.fgb", "rb") as f:
+            reader = FileReader.load(f, batching=BatchingPolicy(0))
+            self.assertListEqual(self.select_ids(reader), expected)
+            self.assertGreater(
+                reader.header_client.file_client.requests_ever_made, merged
+            )
+
+    def test_adaptive_reader(self):
+        with open("tests/data/countries.fgb", "rb") as f:
+            expected = self.select_ids(FileReader.load(f))
+
+        with RangeServer(delay=0.01) as server:
+            policy = AdaptiveBatchingPolicy()
+            reader = HTTPReader.open(server.url("countries.fgb"), batching=policy)
+            self.assertIs(reader.batching, policy)
+            self.assertListEqual(self.select_ids(reader), expected)
+            self.assertGreater(len(policy.samples), 0)
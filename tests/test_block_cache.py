@@ -0,0 +1,94 @@
+from io import BytesIO
+from unittest import TestCase
+
+from flatgeobuf.block_cache import BlockCache
+from flatgeobuf.config import Config
+from flatgeobuf.file_range_client import BufferedFileRangeClient, FileRangeClient
+from flatgeobuf.file_reader import FileReader
+
+DATA = bytes(range(256)) * 4
+
+
+class TestBlockCache(TestCase):
+    def setUp(self):
+        self.cache = BlockCache(16, 64)
+
+    def test_read(self):
+        self.assertIsNone(self.cache.read(0, 8))
+        self.cache.store(0, DATA[:40], 40)
+
+        self.assertEqual(bytes(self.cache.read(4, 8)), DATA[4:12])
+        # Across blocks, and within the short last block
+        self.assertEqual(bytes(self.cache.read(10, 30)), DATA[10:40])
+        # Past the short last block
+        self.assertIsNone(self.cache.read(30, 16))
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+
+    def test_end_of_file(self):
+        self.cache.store(16, DATA[16:24], 32)
+        self.assertEqual(self.cache.size, 24)
+        self.assertEqual(bytes(self.cache.read(20, 100)), DATA[20:24])
+        self.assertEqual(self.cache.read(30, 10), b"")
+
+    def test_eviction(self):
+        self.cache.store(0, DATA[:64], 64)
+        self.assertIsNotNone(self.cache.read(0, 16))
+        self.cache.store(64, DATA[64:80], 16)
+
+        # The least recently used block is evicted
+        self.assertEqual(self.cache.bytes_held, 64)
+        self.assertIsNone(self.cache.read(16, 16))
+        self.assertIsNotNone(self.cache.read(0, 16))
+        self.assertIsNotNone(self.cache.read(64, 16))
+
+        # Larger than the whole budget
+        self.cache.store(128, DATA[128:256], 128)
+        self.assertIsNone(self.cache.read(128, 16))
+
+    def test_shared(self):
+        file_client = FileRangeClient(BytesIO(DATA))
+        first = BufferedFileRangeClient(file_client, cache=self.cache)
+        second = BufferedFileRangeClient(file_client, cache=self.cache)
+
+        self.assertEqual(bytes(first.get_range(20, 4, 16, "test")), DATA[20:24])
+        self.assertEqual(bytes(first.get_range(40, 4, 0, "test")), DATA[40:44])
+        # Aligned to the block, the first fetch covers this range too
+        self.assertEqual(bytes(second.get_range(16, 8, 0, "test")), DATA[16:24])
+
+        self.assertEqual(file_client.requests_ever_made, 2)
+        self.assertEqual((first.hits, first.misses), (0, 2))
+        self.assertEqual((second.hits, second.misses), (1, 0))
+
+
+class TestReaderBlockCache(TestCase):
+    def test_local_file(self):
+        # Left to the OS page cache
+        with open("tests/data/countries.fgb", "rb") as f:
+            reader = FileReader.load(f)
+            self.assertIsNone(reader.header_client.cache)
+            self.assertEqual(len(list(reader.select_all())), 179)
+
+    def test_repeated_query(self):
+        with open("tests/data/countries.fgb", "rb") as f:
+            reader = FileReader.load(FileRangeClient(f))
+            file_client = reader.header_client.file_client
+
+            expected = len(list(reader.select_bbox((-10.0, 35.0, 30.0, 60.0))))
+            requests = file_client.requests_ever_made
+            self.assertEqual(
+                len(list(reader.select_bbox((-10.0, 35.0, 30.0, 60.0)))), expected
+            )
+            self.assertEqual(file_client.requests_ever_made, requests)
+            self.assertGreater(reader.header_client.cache.hits, 0)
+
+    def test_disabled(self):
+        config = Config.global_instance
+        max_bytes = config.block_cache_max_bytes()
+        config.set_block_cache_max_bytes(0)
+        try:
+            with open("tests/data/countries.fgb", "rb") as f:
+                reader = FileReader.load(FileRangeClient(f))
+                self.assertIsNone(reader.header_client.cache)
+                self.assertEqual(len(list(reader.select_all())), 179)
+        finally:
+            config.set_block_cache_max_bytes(max_bytes)
@@ -0,0 +1,195 @@
+import asyncio
+import base64
+import os
+import time
+from unittest import TestCase, mock
+
+from range_server import RangeServer
+
+from flatgeobuf import http_pool
+from flatgeobuf.async_http_reader import AsyncHTTPReader
+from flatgeobuf.file_reader import FileReader
+from flatgeobuf.generic.feature import parse_properties
+from flatgeobuf.http_pool import HttpConnectionPool
+from flatgeobuf.http_range_client import HttpRangeClient
+
+EUROPE_BBOX = (-10.0, 35.0, 30.0, 60.0)
+
+
+async def select_ids(reader: AsyncHTTPReader, rect) -> list:
+    return [
+        parse_properties(feature, reader.header.columns)["id"]
+        async for feature in reader.select_bbox(rect)
+    ]
+
+
+class TestConnectionPool(TestCase):
+    def setUp(self):
+        with open("tests/data/countries.fgb", "rb") as f:
+            reader = FileReader.load(f)
+            self.expected = [
+                parse_properties(feature, reader.header.columns)["id"]
+                for feature in reader.select_bbox(EUROPE_BBOX)
+            ]
+
+    def test_select_bbox(self):
+        with RangeServer() as server:
+
+            async def run():
+                pool = HttpConnectionPool()
+                reader = await AsyncHTTPReader.open(
+                    HttpRangeClient(server.url("countries.fgb"), pool=pool)
+                )
+                self.assertListEqual(
+                    await select_ids(reader, EUROPE_BBOX), self.expected
+                )
+                self.assertGreater(pool.requests_ever_made, 1)
+                # One keep-alive connection serves every request
+                self.assertEqual(pool.connections_ever_opened, 1)
+
+            asyncio.run(run())
+        self.assertEqual(server.connections, 1)
+
+    def test_concurrent_queries(self):
+        with RangeServer(delay=0.05) as server:
+
+            async def run():
+                pool = HttpConnectionPool(max_connections_per_host=4)
+                ticks = 0
+
+                async def ticker():
+                    nonlocal ticks
+                    while True:
+                        await asyncio.sleep(0.005)
+                        ticks += 1
+
+                async def query():
+                    reader = await AsyncHTTPReader.open(
+                        HttpRangeClient(server.url("countries.fgb"), pool=pool)
+                    )
+                    return await select_ids(reader, EUROPE_BBOX)
+
+                ticking = asyncio.ensure_future(ticker())
+                start = time.perf_counter()
+                results = await asyncio.gather(*(query() for _ in range(8)))
+                elapsed = time.perf_counter() - start
+                ticking.cancel()
+
+                for ids in results:
+                    self.assertListEqual(ids, self.expected)
+                requests_per_query = pool.requests_ever_made // 8
+                # Queries overlap, rather than running one after another
+                self.assertLess(elapsed, 8 * requests_per_query * 0.05)
+                # The loop kept running while requests were waiting
+                self.assertGreater(ticks, 10)
+                self.assertLessEqual(pool.connections_ever_opened, 4)
+
+            asyncio.run(run())
+        self.assertLessEqual(server.max_active, 4)
+
+    def test_timeout(self):
+        with RangeServer(delay=0.5) as server:
+
+            async def run():
+                pool = HttpConnectionPool(timeout=0.1)
+                client = HttpRangeClient(server.url("countries.fgb"), pool=pool)
+                with self.assertRaises(asyncio.TimeoutError):
+                    await client.get_range_async(0, 8, "header")
+
+            asyncio.run(run())
+
+    def test_out_of_range(self):
+        with RangeServer() as server:
+
+            async def run():
+                client = HttpRangeClient(server.url("countries.fgb"))
+                self.assertEqual(await client.get_range_async(0, 3, "magic"), b"fgb")
+                self.assertEqual(
+                    await client.get_range_async(client.size(), 8, "past end"), b""
+                )
+
+            asyncio.run(run())
+
+    def test_credentials(self):
+        with RangeServer() as server:
+            url = server.url("countries.fgb").replace("//", "//user:p%40ss@", 1)
+            expected = "Basic " + base64.b64encode(b"user:p@ss").decode()
+
+            async def run():
+                client = HttpRangeClient(url, pool=HttpConnectionPool())
+                self.assertEqual(await client.get_range_async(0, 3, "magic"), b"fgb")
+
+            asyncio.run(run())
+            self.assertEqual(server.authorization, expected)
+
+            client = HttpRangeClient(url)
+            self.assertEqual(client.get_range(0, 3, "magic"), b"fgb")
+            self.assertEqual(server.authorization, expected)
+
+    def test_proxy(self):
+        with RangeServer() as server:
+            proxy = server.url("")
+            url = "http://example.invalid/countries.fgb"
+
+            async def run(url):
+                pool = HttpConnectionPool()
+                client = HttpRangeClient(url, pool=pool)
+                self.assertEqual(await client.get_range_async(0, 3, "magic"), b"fgb")
+                return pool
+
+            with mock.patch.dict(os.environ, {"http_proxy": proxy}):
+                pool = asyncio.run(run(url))
+                self.assertEqual(server.proxied_requests, 1)
+                self.assertEqual(pool.connections_ever_opened, 0)
+
+            # Hosts in NO_PROXY are connected to directly
+            with mock.patch.dict(
+                os.environ,
+                {"http_proxy": "http://127.0.0.1:9", "no_proxy": "127.0.0.1"},
+            ):
+                pool = asyncio.run(run(server.url("countries.fgb")))
+                self.assertEqual(server.proxied_requests, 1)
+                self.assertEqual(pool.connections_ever_opened, 1)
+
+    def test_no_body(self):
+        # Kept-alive responses without a length, which have no body
+        responses = [
+            b"HTTP/1.1 100 Continue\r\n\r\nHTTP/1.1 204 No Content\r\n\r\n",
+            b"HTTP/1.1 304 Not Modified\r\nContent-Length: 10\r\n\r\n",
+            b"HTTP/1.1 416 Range Not Satisfiable\r\n\r\n",
+        ]
+
+        async def handle(reader, writer):
+            while await reader.readuntil(b"\r\n\r\n"):
+                writer.write(responses.pop(0))
+                await writer.drain()
+
+        async def run():
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            pool = HttpConnectionPool(timeout=1)
+            url = f"http://127.0.0.1:{port}/countries.fgb"
+            try:
+                for status in [204, 304, 416]:
+                    response = await pool.get(url, {})
+                    self.assertEqual(response.status, status)
+                    self.assertEqual(response.body, b"")
+                # Only a response without a length drops the connection
+                self.assertEqual(pool.connections_ever_opened, 1)
+            finally:
+                server.close()
+
+        asyncio.run(run())
+
+    def test_without_sockets(self):
+        with RangeServer() as server:
+
+            async def run():
+                pool = HttpConnectionPool()
+                client = HttpRangeClient(server.url("countries.fgb"), pool=pool)
+                self.assertEqual(await client.get_range_async(0, 3, "magic"), b"fgb")
+                self.assertEqual(pool.connections_ever_opened, 0)
+
+            with mock.patch.object(http_pool, "sockets_supported", False):
+                asyncio.run(run())
+            self.assertEqual(server.requests, 1)
@@ -0,0 +1,130 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from range_server import RangeServer
+
+from flatgeobuf.config import Config
+from flatgeobuf.disk_cache import DiskRangeCache, Validators
+from flatgeobuf.file_reader import FileReader
+from flatgeobuf.generic.feature import parse_properties
+from flatgeobuf.http_range_client import HttpRangeClient
+from flatgeobuf.http_reader import HTTPReader
+from flatgeobuf.reader_state import ReaderStateCache
+
+EUROPE_BBOX = (-10.0, 35.0, 30.0, 60.0)
+
+
+class TestDiskCache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.directory, "cache")
+        self.data_dir = os.path.join(self.directory, "data")
+        os.makedirs(self.data_dir)
+        shutil.copy("tests/data/countries.fgb", self.data_dir)
+
+        config = Config.global_instance
+        self.max_bytes = config.block_cache_max_bytes()
+        # Every read goes down to the disk cache
+        config.set_block_cache_max_bytes(0)
+
+        with open("tests/data/countries.fgb", "rb") as f:
+            self.data = f.read()
+            reader = FileReader.load(f)
+            self.expected = self.select_ids(reader)
+
+    def tearDown(self):
+        config = Config.global_instance
+        config.set_block_cache_max_bytes(self.max_bytes)
+        config.set_disk_cache_dir(None)
+        shutil.rmtree(self.directory)
+
+    def select_ids(self, reader):
+        return [
+            parse_properties(feature, reader.header.columns)["id"]
+            for feature, _ in reader.select_bboxes([EUROPE_BBOX])
+        ]
+
+    def test_repeat_query(self):
+        Config.global_instance.set_disk_cache_dir(self.cache_dir)
+        with RangeServer(directory=self.data_dir) as server:
+            reader = HTTPReader.open(server.url("countries.fgb"))
+            self.assertListEqual(self.select_ids(reader), self.expected)
+            requests = server.requests
+            self.assertGreater(requests, 0)
+
+            # As another process would, with nothing but the directory shared
+            ReaderStateCache.global_instance.clear()
+            reader = HTTPReader.open(server.url("countries.fgb"))
+            self.assertListEqual(self.select_ids(reader), self.expected)
+            self.assertEqual(server.requests, requests)
+
+    def test_merge(self):
+        cache = DiskRangeCache(self.cache_dir, 1024 * 1024, 3600, block_size=256)
+        url = "http://example.com/countries.fgb"
+        validators = Validators(size=len(self.data))
+        for begin, end in [(100, 200), (300, 400), (150, 350)]:
+            cache.store(url, begin, self.data[begin:end], validators)
+
+        # Merged within, but not across, blocks
+        self.assertListEqual(
+            [segment[:2] for segment in cache.segments(url)], [(100, 256), (256, 400)]
+        )
+        self.assertEqual(cache.total_bytes, 300)
+        self.assertEqual(cache.read(url, 120, 250), self.data[120:370])
+        self.assertIsNone(cache.read(url, 50, 100))
+        # Clipped to the size of the file
+        end = len(self.data)
+        cache.store(url, end - 10, self.data[end - 10 :], validators)
+        self.assertEqual(cache.read(url, end - 10, 100), self.data[end - 10 :])
+
+    def test_evict(self):
+        cache = DiskRangeCache(self.cache_dir, 350, 3600)
+        url = "http://example.com/countries.fgb"
+        for begin in [0, 1000, 2000]:
+            cache.store(url, begin, self.data[begin : begin + 100], Validators())
+            # Distinct modification times
+            time.sleep(0.01)
+        cache.read(url, 0, 100)
+        cache.store(url, 3000, self.data[3000:3100], Validators())
+
+        self.assertListEqual(
+            [segment[:2] for segment in cache.segments(url)],
+            [(0, 100), (2000, 2100), (3000, 3100)],
+        )
+        self.assertEqual(cache.total_bytes, 300)
+
+    def test_changed_file(self):
+        Config.global_instance.set_disk_cache_dir(self.cache_dir)
+        with RangeServer(directory=self.data_dir) as server:
+            url = server.url("countries.fgb")
+            HttpRangeClient(url).get_range(0, 100, "test")
+
+            with open(os.path.join(self.data_dir, "countries.fgb"), "ab") as f:
+                f.write(b"\0" * 10)
+            # Expired, so revalidated with a request reporting another size
+            Config.global_instance.set_disk_cache_max_age(0)
+            try:
+                client = HttpRangeClient(url)
+                self.assertEqual(client.get_range(0, 100, "test"), self.data[:100])
+                self.assertEqual(server.requests, 2)
+                self.assertEqual(
+                    client.disk_cache.read_meta(url)["validators"]["size"],
+                    len(self.data) + 10,
+                )
+            finally:
+                Config.global_instance.set_disk_cache_max_age(3600)
+
+    def test_validators(self):
+        cache = DiskRangeCache(self.cache_dir, 1024 * 1024, 3600)
+        url = "http://example.com/countries.fgb"
+        cache.store(url, 0, self.data[:100], Validators(etag='"a"', size=1000))
+        # Agreeing with what was reported
+        cache.store(url, 100, self.data[100:200], Validators(size=1000))
+        self.assertEqual(cache.read(url, 0, 200), self.data[:200])
+
+        cache.store(url, 500, self.data[500:600], Validators(etag='"b"'))
+        self.assertIsNone(cache.read(url, 0, 100))
+        self.assertEqual(cache.read(url, 500, 100), self.data[500:600])
@@ -0,0 +1,115 @@
+import random
+import threading
+import time
+from io import BytesIO
+from unittest import TestCase, mock
+
+from flatgeobuf import fetch_ahead as fetch_ahead_module
+from flatgeobuf.config import Config
+from flatgeobuf.fetch_ahead import fetch_ahead
+from flatgeobuf.file_range_client import FileRangeClient
+from flatgeobuf.file_reader import FileReader
+from flatgeobuf.generic.feature import parse_properties
+
+
+class TestFetchAhead(TestCase):
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.held = 0
+        self.max_held = 0
+        self.started = []
+
+    def task(self, i: int, length: int):
+        def fetch() -> int:
+            with self.lock:
+                self.started.append(i)
+                self.held += length
+                self.max_held = max(self.max_held, self.held)
+            time.sleep(random.uniform(0, 0.005))
+            return i
+
+        return fetch, length
+
+    def consume(self, results):
+        for i, length in results:
+            with self.lock:
+                self.held -= length
+            yield i
+
+    def test_order(self):
+        lengths = [random.randint(1, 10) for _ in range(50)]
+        results = fetch_ahead(
+            (self.task(i, length) for i, length in enumerate(lengths)), 4, 20
+        )
+        self.assertListEqual(
+            list(self.consume(zip(results, lengths))), list(range(len(lengths)))
+        )
+        self.assertLessEqual(self.max_held, 20)
+
+    def test_oversized(self):
+        # A fetch larger than the limit still runs, on its own
+        lengths = [5, 30, 5]
+        results = fetch_ahead(
+            (self.task(i, length) for i, length in enumerate(lengths)), 4, 20
+        )
+        self.assertListEqual(list(self.consume(zip(results, lengths))), [0, 1, 2])
+        self.assertEqual(self.max_held, 30)
+
+    def test_stop_early(self):
+        results = fetch_ahead((self.task(i, 1) for i in range(100)), 2, 100)
+        self.assertEqual(next(results), 0)
+        results.close()
+        self.assertLessEqual(len(self.started), 3)
+
+    def test_shared_executor(self):
+        executor = fetch_ahead_module.shared_executor(2)
+        self.assertIs(fetch_ahead_module.shared_executor(2), executor)
+        self.assertIsNotNone(executor)
+
+    def test_without_threads(self):
+        with mock.patch.object(fetch_ahead_module, "threads_supported", False):
+            results = fetch_ahead((self.task(i, 1) for i in range(10)), 4, 100)
+            self.assertEqual(next(results), 0)
+            # Nothing is fetched ahead of the consumer
+            self.assertListEqual(self.started, [0])
+            self.assertListEqual(list(results), list(range(1, 10)))
+
+
+class TestReaderFetchAhead(TestCase):
+    def test_select_bbox(self):
+        config = Config.global_instance
+        threshold = config.extra_request_threshold()
+        concurrency = config.fetch_concurrency()
+        # Many small batches
+        config.set_extra_request_threshold(0)
+        try:
+            with open("tests/data/countries.fgb", "rb") as f:
+                selected = {}
+                for requests in [1, 4]:
+                    config.set_fetch_concurrency(requests)
+                    reader = FileReader.load(f)
+                    # Unlike select_bbox, never planned into a single batch
+                    selected[requests] = [
+                        parse_properties(feature, reader.header.columns)["id"]
+                        for feature, _ in reader.select_bboxes(
+                            [(-10.0, 35.0, 30.0, 60.0)]
+                        )
+                    ]
+        finally:
+            config.set_extra_request_threshold(threshold)
+            config.set_fetch_concurrency(concurrency)
+
+        self.assertGreater(len(selected[1]), 1)
+        self.assertListEqual(selected[4], selected[1])
+
+    def test_file_size(self):
+        # Asked for while worker threads read, so it must not move the file
+        with open("tests/data/countries.fgb", "rb") as f:
+            data = f.read()
+            for file in [f, BytesIO(data)]:
+                file.seek(100)
+                client = FileRangeClient(file)
+                self.assertEqual(client.size(), len(data))
+                self.assertEqual(client.get_range(0, 8, "test"), data[:8])
+                if client.fileno is not None:
+                    self.assertEqual(file.tell(), 100)
@@ -0,0 +1,222 @@
+import json
+from dataclasses import replace
+from io import BytesIO
+from unittest import TestCase
+
+import flatgeobuf as fgb
+from flatgeobuf.config import Config
+from flatgeobuf.constants import magicbytes
+from flatgeobuf.file_reader import FileReader
+from flatgeobuf.generic.feature import parse_properties
+from flatgeobuf.header_meta import build_header, from_byte_buffer
+from flatgeobuf.packedrtree import NODE_ITEM_BYTE_LEN, generate_level_bounds
+
+ISL_BBOX = (-26.5699, 63.1191, -12.1087, 67.0137)
+EUROPE_BBOX = (-10.0, 35.0, 30.0, 60.0)
+
+
+class TestFileReader(TestCase):
+    def setUp(self):
+        self.file = open("tests/data/countries.fgb", "rb")
+        self.reader = FileReader.load(self.file)
+
+    def tearDown(self):
+        self.file.close()
+
+    def feature_id(self, feature) -> str:
+        return parse_properties(feature, self.reader.header.columns)["id"]
+
+    def test_select_bbox(self):
+        ids = [self.feature_id(f) for f in self.reader.select_bbox(ISL_BBOX)]
+        self.assertListEqual(ids, ["RUS", "ISL", "GRL"])
+
+    def test_select_all(self):
+        expected = [
+            self.feature_id(f) for f in self.reader.select_bbox((-180, -90, 180, 90))
+        ]
+        self.assertEqual(len(expected), 179)
+
+        ids = [self.feature_id(f) for f in self.reader.select_all()]
+        self.assertListEqual(ids, expected)
+
+        # Features split across chunks are carried over
+        chunk_size = Config.global_instance.scan_chunk_size()
+        Config.global_instance.set_scan_chunk_size(100)
+        try:
+            ids = [self.feature_id(f) for f in self.reader.select_all()]
+        finally:
+            Config.global_instance.set_scan_chunk_size(chunk_size)
+        self.assertListEqual(ids, expected)
+
+    def test_select_bboxes(self):
+        rects = [ISL_BBOX, EUROPE_BBOX]
+        expected = {}
+        for i, rect in enumerate(rects):
+            for feature in self.reader.select_bbox(rect):
+                expected.setdefault(self.feature_id(feature), []).append(i)
+
+        results = {
+            self.feature_id(feature): rect_idxs
+            for feature, rect_idxs in self.reader.select_bboxes(rects)
+        }
+
+        self.assertDictEqual(results, expected)
+        self.assertListEqual(results["RUS"], [0, 1])
+
+    def test_select_nearest(self):
+        # Madrid
+        x, y = -3.7038, 40.4168
+        results = list(self.reader.select_nearest(x, y, 4))
+
+        ids = [self.feature_id(feature) for feature, _ in results]
+        self.assertListEqual(ids, ["ESP", "RUS", "FRA", "PRT"])
+        distances = [distance for _, distance in results]
+        self.assertEqual(distances[0], 0.0)
+        self.assertListEqual(distances, sorted(distances))
+
+        ids = [self.feature_id(f) for f, _ in self.reader.select_nearest(x, y, 4, 1.0)]
+        self.assertListEqual(ids, ["ESP", "RUS", "FRA"])
+
+    def test_select_index(self):
+        requested = []
+        file_client = self.reader.header_client.file_client
+        get_range = file_client.get_range
+
+        def spy(begin: int, length: int, purpose: str) -> bytes:
+            requested.append(begin + length)
+            return get_range(begin, length, purpose)
+
+        file_client.get_range = spy
+
+        hits = self.reader.select_index(ISL_BBOX)
+        self.assertEqual(self.reader.count(ISL_BBOX), 3)
+        self.assertEqual(self.reader.count((-180, -90, 180, 90)), 179)
+
+        self.assertEqual(len(hits), 3)
+        self.assertTrue(
+            all(end <= self.reader.length_before_features() for end in requested)
+        )
+        self.assertListEqual(hits.feature_idxs.tolist(), [162, 163, 164])
+
+    def test_prefetch(self):
+        config = Config.global_instance
+        levels = config.index_prefetch_levels()
+        max_bytes = config.index_prefetch_max_bytes()
+        try:
+            # Exact span of the top two levels
+            config.set_index_prefetch_levels(2)
+            reader = FileReader.load(self.file)
+            header = reader.header
+            level_bounds = generate_level_bounds(
+                header.features_count, header.index_node_size
+            )
+            self.assertEqual(
+                len(reader.prefetched_index), level_bounds[-2][1] * NODE_ITEM_BYTE_LEN
+            )
+
+            # Whole index under the cap, so queries only read features
+            config.set_index_prefetch_max_bytes(reader.index_length)
+            reader = FileReader.load(self.file)
+            self.assertEqual(len(reader.prefetched_index), reader.index_length)
+
+            requested = []
+            file_client = reader.header_client.file_client
+            get_range = file_client.get_range
+
+            def spy(begin: int, length: int, purpose: str) -> bytes:
+                requested.append(begin)
+                return get_range(begin, length, purpose)
+
+            file_client.get_range = spy
+
+            self.assertEqual(reader.count(ISL_BBOX), 3)
+            self.assertListEqual(requested, [])
+            self.assertGreater(reader.index_requests_avoided, 0)
+        finally:
+            config.set_index_prefetch_levels(levels)
+            config.set_index_prefetch_max_bytes(max_bytes)
+
+    def test_memory_map(self):
+        reader = FileReader.load(self.file, memory_map=True)
+        for rect in [ISL_BBOX, EUROPE_BBOX]:
+            self.assertListEqual(
+                [
+                    parse_properties(f, reader.header.columns)
+                    for f in reader.select_bbox(rect)
+                ],
+                [
+                    parse_properties(f, reader.header.columns)
+                    for f in self.reader.select_bbox(rect)
+                ],
+            )
+        self.assertEqual(len(list(reader.select_all())), 179)
+
+        # Features are parsed straight out of the mapped file
+        feature = next(iter(reader.select_bbox(ISL_BBOX)))
+        self.assertIsInstance(feature._tab.Bytes, memoryview)
+        self.assertIs(feature._tab.Bytes.obj, reader.header_client.file_client.mmap)
+
+    def test_memory_map_close(self):
+        with FileReader.load(self.file, memory_map=True) as reader:
+            self.assertEqual(reader.count(ISL_BBOX), 3)
+            ids = [
+                parse_properties(f, reader.header.columns)["id"]
+                for f in reader.select_bbox(ISL_BBOX)
+            ]
+        self.assertListEqual(ids, ["RUS", "ISL", "GRL"])
+        self.assertTrue(reader.header_client.file_client.mmap.closed)
+        # The file was given by the caller, and stays open
+        self.assertFalse(self.file.closed)
+
+
+class TestUnindexedFileReader(TestCase):
+    def setUp(self):
+        with open("tests/data/countries.geojson") as f:
+            feature_collection = json.load(f)
+        self.data = fgb.dumps(feature_collection, index_node_size=0)
+        self.indexed = FileReader.load(BytesIO(fgb.dumps(feature_collection)))
+
+    def ids(self, reader, features) -> list:
+        return [parse_properties(f, reader.header.columns)["id"] for f in features]
+
+    def unknown_count(self) -> bytes:
+        # Same features, but with the count left out of the header
+        header_length = int.from_bytes(self.data[8:12], "little")
+        header = from_byte_buffer(self.data[12 : 12 + header_length])
+        return (
+            magicbytes
+            + build_header(replace(header, features_count=0))
+            + self.data[12 + header_length :]
+        )
+
+    def test_select(self):
+        for data in [self.data, self.unknown_count()]:
+            reader = FileReader.load(BytesIO(data))
+            self.assertFalse(reader.has_index())
+            self.assertEqual(reader.index_length, 0)
+
+            ids = self.ids(reader, reader.select_all())
+            self.assertEqual(len(ids), 179)
+
+            expected = sorted(
+                self.ids(self.indexed, self.indexed.select_bbox(EUROPE_BBOX))
+            )
+            ids = self.ids(reader, reader.select_bbox(EUROPE_BBOX))
+            self.assertListEqual(sorted(ids), expected)
+            self.assertEqual(reader.count(EUROPE_BBOX), len(expected))
+
+            results = {
+                self.ids(reader, [feature])[0]: rect_idxs
+                for feature, rect_idxs in reader.select_bboxes([ISL_BBOX, EUROPE_BBOX])
+            }
+            self.assertListEqual(results["RUS"], [0, 1])
+            self.assertListEqual(results["ISL"], [0])
+
+            with self.assertRaises(ValueError):
+                reader.select_index(EUROPE_BBOX)
+
+    def test_truncated(self):
+        # With a known count, running out of data is an error
+        reader = FileReader.load(BytesIO(self.data[:-10]))
+        with self.assertRaises(ValueError):
+            list(reader.select_all())
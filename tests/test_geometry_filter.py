@@ -0,0 +1,79 @@
+import json
+from io import BytesIO
+from unittest import TestCase
+
+import shapely.geometry
+
+import flatgeobuf as fgb
+from flatgeobuf.file_reader import FileReader
+from flatgeobuf.generic.feature import parse_properties
+from flatgeobuf.geometry_filter import GeometryFilter
+
+# A triangle over Europe and North Africa
+TRIANGLE = {
+    "type": "Polygon",
+    "coordinates": [[[-10.0, 30.0], [40.0, 30.0], [15.0, 70.0], [-10.0, 30.0]]],
+}
+
+
+class TestGeometryFilter(TestCase):
+    def setUp(self):
+        with open("tests/data/countries.geojson") as f:
+            self.feature_collection = json.load(f)
+        self.file = open("tests/data/countries.fgb", "rb")
+        self.reader = FileReader.load(self.file)
+
+    def tearDown(self):
+        self.file.close()
+
+    def ids(self, reader, features) -> list:
+        return sorted(
+            parse_properties(f, reader.header.columns)["id"] for f in features
+        )
+
+    def expected(self, geometry, predicate: str) -> list:
+        query = shapely.geometry.shape(geometry)
+        return sorted(
+            feature["properties"]["id"]
+            for feature in self.feature_collection["features"]
+            if getattr(shapely.geometry.shape(feature["geometry"]), predicate)(query)
+        )
+
+    def test_predicates(self):
+        france = next(
+            feature["geometry"]
+            for feature in self.feature_collection["features"]
+            if feature["properties"]["id"] == "FRA"
+        )
+        queries = [
+            (TRIANGLE, "intersects"),
+            (TRIANGLE, "within"),
+            ({"type": "Point", "coordinates": [2.35, 48.85]}, "contains"),
+            (shapely.geometry.shape(france).buffer(-1.0), "intersects"),
+        ]
+        for geometry, predicate in queries:
+            expected = self.expected(geometry, predicate)
+            self.assertGreater(len(expected), 0)
+            ids = self.ids(
+                self.reader, self.reader.select_geometry(geometry, predicate)
+            )
+            self.assertListEqual(ids, expected, predicate)
+
+        with self.assertRaises(ValueError):
+            list(self.reader.select_geometry(TRIANGLE, "touches"))
+
+    def test_pruning(self):
+        # A large polygon has subtrees entirely inside it, whose features are
+        # matched without an exact test.
+        world = shapely.geometry.box(-170, -80, 170, 80)
+        geometry_filter = GeometryFilter(world)
+        ids = self.ids(self.reader, self.reader.select_geometry(geometry_filter))
+
+        self.assertListEqual(ids, self.expected(world, "intersects"))
+        self.assertLess(geometry_filter.exact_tests, len(ids))
+
+    def test_unindexed(self):
+        data = fgb.dumps(self.feature_collection, index_node_size=0)
+        reader = FileReader.load(BytesIO(data))
+        ids = self.ids(reader, reader.select_geometry(TRIANGLE, "within"))
+        self.assertListEqual(ids, self.expected(TRIANGLE, "within"))
@@ -0,0 +1,106 @@
+import asyncio
+from unittest import TestCase
+
+from range_server import RangeServer
+
+from flatgeobuf.async_http_reader import AsyncHTTPReader
+from flatgeobuf.config import Config
+from flatgeobuf.file_reader import FileReader
+from flatgeobuf.generic.feature import parse_properties
+from flatgeobuf.http_range_client import HttpRangeClient, parse_byteranges
+from flatgeobuf.http_reader import HTTPReader
+from flatgeobuf.reader_state import ReaderStateCache
+
+EUROPE_BBOX = (-10.0, 35.0, 30.0, 60.0)
+
+
+class TestMultiRange(TestCase):
+    def setUp(self):
+        config = Config.global_instance
+        self.threshold = config.extra_request_threshold()
+        self.concurrency = config.fetch_concurrency()
+        self.max_bytes = config.block_cache_max_bytes()
+        self.max_ranges = config.max_ranges_per_request()
+        # A batch for every feature, all fetched from the calling thread
+        config.set_extra_request_threshold(0)
+        config.set_fetch_concurrency(1)
+        config.set_block_cache_max_bytes(0)
+
+        with open("tests/data/countries.fgb", "rb") as f:
+            reader = FileReader.load(f)
+            self.expected = self.select_ids(reader)
+
+    def tearDown(self):
+        config = Config.global_instance
+        config.set_extra_request_threshold(self.threshold)
+        config.set_fetch_concurrency(self.concurrency)
+        config.set_block_cache_max_bytes(self.max_bytes)
+        config.set_max_ranges_per_request(self.max_ranges)
+
+    def select_ids(self, reader):
+        return [
+            parse_properties(feature, reader.header.columns)["id"]
+            for feature, _ in reader.select_bboxes([EUROPE_BBOX])
+        ]
+
+    def test_parse_byteranges(self):
+        body = (
+            b"--b\r\nContent-Type: text/plain\r\nContent-Range: bytes 0-2/10\r\n\r\n"
+            b"abc\r\n--b\r\nContent-Range: bytes 6-9/10\r\n\r\n\r\nij\r\n--b--\r\n"
+        )
+        self.assertListEqual(parse_byteranges(body, "b"), [(0, b"abc"), (6, b"\r\nij")])
+
+    def test_get_ranges(self):
+        with open("tests/data/countries.fgb", "rb") as f:
+            data = f.read()
+        ranges = [(0, 8), (100, 10), (1000, 50), (len(data) - 4, 8)]
+        expected = [data[begin : begin + length] for begin, length in ranges]
+
+        for mode in ["multipart", "ignore", "first"]:
+            with RangeServer(multi_range=mode) as server:
+                client = HttpRangeClient(server.url("countries.fgb"))
+                parts = client.get_ranges(ranges, "test")
+                self.assertListEqual([bytes(part) for part in parts], expected)
+                self.assertEqual(client.multi_range, mode == "multipart")
+                self.assertEqual(server.multi_range_requests, 1)
+
+                # Known not to work, ranges are requested one by one
+                client.get_ranges(ranges, "test")
+                self.assertEqual(
+                    server.multi_range_requests, 2 if mode == "multipart" else 1
+                )
+
+    def test_select_bboxes(self):
+        with RangeServer() as server:
+            reader = HTTPReader.open(server.url("countries.fgb"))
+            self.assertListEqual(self.select_ids(reader), self.expected)
+            self.assertGreater(server.multi_range_requests, 0)
+            requests = server.requests
+
+            # Without multi-range requests, a request for each batch
+            Config.global_instance.set_max_ranges_per_request(1)
+            ReaderStateCache.global_instance.clear()
+            reader = HTTPReader.open(server.url("countries.fgb"))
+            self.assertListEqual(self.select_ids(reader), self.expected)
+            self.assertGreater(server.requests - requests, 2 * requests)
+
+    def test_select_bboxes_fallback(self):
+        for mode in ["ignore", "first"]:
+            with RangeServer(multi_range=mode) as server:
+                reader = HTTPReader.open(server.url("countries.fgb"))
+                self.assertListEqual(self.select_ids(reader), self.expected)
+                self.assertFalse(reader.header_client.http_client.multi_range)
+
+    def test_select_bboxes_async(self):
+        async def select_ids(url):
+            reader = await AsyncHTTPReader.open(url)
+            return [
+                parse_properties(feature, reader.header.columns)["id"]
+                async for feature, _ in reader.select_bboxes([EUROPE_BBOX])
+            ]
+
+        for mode in ["multipart", "ignore"]:
+            with RangeServer(multi_range=mode) as server:
+                ids = asyncio.run(select_ids(server.url("countries.fgb")))
+                self.assertListEqual(ids, self.expected)
+                self.assertGreater(server.multi_range_requests, 0)
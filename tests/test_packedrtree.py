@@ -0,0 +1,166 @@
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import numpy as np
+
+from flatgeobuf.file_reader import FileReader
+from flatgeobuf.packedrtree import NODE_ITEM_DTYPE, MultiRectPackedRTree, PackedRTree
+
+RECTS = [
+    (-26.5699, 63.1191, -12.1087, 67.0137),
+    (0.0, 0.0, 10.0, 10.0),
+    (-180.0, -90.0, 180.0, 90.0),
+    (100.0, -50.0, 101.0, -49.0),
+]
+
+
+class TestPackedRTree(TestCase):
+    def setUp(self):
+        self.file = open("tests/data/countries.fgb", "rb")
+        self.reader = FileReader.load(self.file)
+
+    def tearDown(self):
+        self.file.close()
+
+    def read_node(self, offset_into_tree: int, size: int) -> bytes:
+        self.file.seek(self.reader.length_before_tree() + offset_into_tree)
+        return self.file.read(size)
+
+    def leaf_nodes(self) -> np.ndarray:
+        features_count = self.reader.header.features_count
+        tree = self.read_node(0, self.reader.index_length)
+        return np.frombuffer(tree, dtype=NODE_ITEM_DTYPE)[-features_count:]
+
+    def test_stream_search(self):
+        leaves = self.leaf_nodes()
+
+        for rect in RECTS:
+            min_x, min_y, max_x, max_y = rect
+            expected = np.flatnonzero(
+                (leaves["min_x"] <= max_x)
+                & (leaves["min_y"] <= max_y)
+                & (leaves["max_x"] >= min_x)
+                & (leaves["max_y"] >= min_y)
+            ).tolist()
+
+            results = list(
+                PackedRTree(
+                    self.reader.header.features_count,
+                    self.reader.header.index_node_size,
+                    rect,
+                ).stream_search(self.read_node)
+            )
+
+            self.assertListEqual([idx for _, idx, _ in results], expected)
+            self.assertListEqual(
+                [offset for offset, _, _ in results],
+                leaves["offset"][expected].tolist(),
+            )
+            for offset, idx, length in results:
+                if idx < len(leaves) - 1:
+                    self.assertEqual(length, int(leaves["offset"][idx + 1]) - offset)
+                else:
+                    self.assertIsNone(length)
+
+    def test_search_hits(self):
+        leaves = self.leaf_nodes()
+        args = (self.reader.header.features_count, self.reader.header.index_node_size)
+
+        for rect in RECTS:
+            expected = list(PackedRTree(*args, rect).stream_search(self.read_node))
+            hits = PackedRTree(*args, rect).search_hits(self.read_node)
+            count = PackedRTree(*args, rect).count(self.read_node)
+
+            self.assertEqual(len(hits), len(expected))
+            self.assertEqual(count, len(expected))
+            self.assertListEqual(hits.search_results(), expected)
+            self.assertListEqual(
+                hits.bboxes.tolist(),
+                [list(node[:4]) for node in leaves[hits.feature_idxs].tolist()],
+            )
+
+
+class TestPackedRTreeAsync(IsolatedAsyncioTestCase):
+    async def test_stream_search_async(self):
+        with open("tests/data/countries.fgb", "rb") as f:
+            reader = FileReader.load(f)
+
+            def read_node(offset_into_tree: int, size: int) -> bytes:
+                f.seek(reader.length_before_tree() + offset_into_tree)
+                return f.read(size)
+
+            async def read_node_async(offset_into_tree: int, size: int) -> bytes:
+                return read_node(offset_into_tree, size)
+
+            for rect in RECTS:
+                args = (
+                    reader.header.features_count,
+                    reader.header.index_node_size,
+                    rect,
+                )
+                expected = list(PackedRTree(*args).stream_search(read_node))
+                results = [
+                    result
+                    async for result in PackedRTree(*args).stream_search_async(
+                        read_node_async
+                    )
+                ]
+                self.assertListEqual(results, expected)
+
+
+class TestMultiRectPackedRTree(TestCase):
+    def test_stream_search(self):
+        with open("tests/data/countries.fgb", "rb") as f:
+            reader = FileReader.load(f)
+            args = (reader.header.features_count, reader.header.index_node_size)
+
+            expected = {}
+            for i, rect in enumerate(RECTS):
+                for result in PackedRTree(*args, rect).stream_search(reader.read_node):
+                    expected.setdefault(result[:2], []).append(i)
+
+            results = list(
+                MultiRectPackedRTree(*args, RECTS).stream_search(reader.read_node)
+            )
+
+        self.assertListEqual(
+            [(offset, idx) for offset, idx, _, _ in results], sorted(expected)
+        )
+        for offset, idx, _, rect_idxs in results:
+            self.assertListEqual(rect_idxs, expected[(offset, idx)])
+
+    def test_empty(self):
+        with self.assertRaises(ValueError):
+            MultiRectPackedRTree(10, 16, [])
+
+
+class TestNearest(TestCase):
+    def test_stream_nearest(self):
+        with open("tests/data/countries.fgb", "rb") as f:
+            reader = FileReader.load(f)
+            features_count = reader.header.features_count
+            tree = reader.read_node(0, reader.index_length)
+            leaves = np.frombuffer(tree, dtype=NODE_ITEM_DTYPE)[-features_count:]
+
+            x, y = 10.0, 50.0
+            dx = np.maximum(np.maximum(leaves["min_x"] - x, x - leaves["max_x"]), 0)
+            dy = np.maximum(np.maximum(leaves["min_y"] - y, y - leaves["max_y"]), 0)
+            distances = np.hypot(dx, dy)
+
+            results = list(
+                PackedRTree(
+                    features_count, reader.header.index_node_size, (x, y, x, y)
+                ).stream_nearest(reader.read_node, 20)
+            )
+
+        self.assertEqual(len(results), 20)
+        self.assertListEqual(
+            [distance for _, _, _, distance in results],
+            np.sort(distances)[:20].tolist(),
+        )
+        for offset, idx, length, distance in results:
+            self.assertEqual(offset, leaves["offset"][idx])
+            self.assertEqual(distance, distances[idx])
+            if idx < features_count - 1:
+                self.assertEqual(length, leaves["offset"][idx + 1] - offset)
+            else:
+                self.assertIsNone(length)
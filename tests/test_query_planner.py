@@ -0,0 +1,84 @@
+from dataclasses import replace
+from unittest import TestCase
+
+from flatgeobuf.file_reader import FileReader
+from flatgeobuf.generic.feature import parse_properties
+from flatgeobuf.query_planner import AUTO, HYBRID, INDEX, REMOTE, SCAN, CostModel
+
+ISL_BBOX = (-26.5699, 63.1191, -12.1087, 67.0137)
+EUROPE_BBOX = (-10.0, 35.0, 30.0, 60.0)
+WORLD_BBOX = (-180, -90, 180, 90)
+
+
+class TestQueryPlanner(TestCase):
+    def setUp(self):
+        self.file = open("tests/data/countries.fgb", "rb")
+        self.reader = FileReader.load(self.file)
+
+    def tearDown(self):
+        self.file.close()
+
+    def ids(self, rect, strategy=INDEX) -> list:
+        return [
+            parse_properties(f, self.reader.header.columns)["id"]
+            for f in self.reader.select_bbox(rect, strategy)
+        ]
+
+    def test_plan(self):
+        plan = self.reader.plan(WORLD_BBOX)
+        self.assertEqual(plan.first_item, 0)
+        self.assertEqual(plan.end_item, 179)
+        self.assertAlmostEqual(plan.selectivity, 1.0)
+        self.assertSetEqual(set(plan.costs), {INDEX, HYBRID, SCAN})
+
+        plan = self.reader.plan(ISL_BBOX)
+        self.assertLessEqual(plan.first_item, 162)
+        self.assertGreaterEqual(plan.end_item, 165)
+        self.assertLess(plan.selectivity, 0.1)
+
+        plan = self.reader.plan((1000, 1000, 1001, 1001))
+        self.assertEqual(plan.strategy, INDEX)
+        self.assertEqual(plan.candidates(), 0)
+
+    def test_cost_model(self):
+        # Requests are cheap locally, but not remotely
+        self.reader.cost_model = CostModel(request_latency=0, bytes_per_second=1e9)
+        self.assertEqual(self.reader.plan(EUROPE_BBOX).strategy, INDEX)
+
+        self.reader.cost_model = replace(
+            REMOTE, feature_seconds=1.0, scan_feature_seconds=0
+        )
+        self.assertEqual(self.reader.plan(EUROPE_BBOX).strategy, SCAN)
+
+    def test_strategies(self):
+        for rect in [ISL_BBOX, EUROPE_BBOX, WORLD_BBOX]:
+            results = [
+                self.ids(rect, strategy) for strategy in [INDEX, HYBRID, SCAN, AUTO]
+            ]
+            for result in results[1:]:
+                self.assertListEqual(result, results[0])
+
+        self.assertEqual(len(results[0]), 179)
+
+        with self.assertRaises(ValueError):
+            self.ids(ISL_BBOX, "fastest")
+
+    def test_planning_opt_in(self):
+        # Queries only pay for planning when asked to
+        planned = []
+        plan = self.reader.plan
+
+        def spy(rect):
+            planned.append(rect)
+            return plan(rect)
+
+        self.reader.plan = spy
+        self.assertListEqual(self.ids(ISL_BBOX), ["RUS", "ISL", "GRL"])
+        self.assertListEqual(planned, [])
+        self.ids(ISL_BBOX, AUTO)
+        self.assertListEqual(planned, [ISL_BBOX])
+
+    def test_item_offset(self):
+        hits = self.reader.select_index(EUROPE_BBOX)
+        for item, offset in zip(hits.feature_idxs.tolist(), hits.offsets.tolist()):
+            self.assertEqual(self.reader.item_offset(item), offset)
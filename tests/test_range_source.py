@@ -0,0 +1,101 @@
+import asyncio
+import os
+import tempfile
+from unittest import TestCase, skipIf
+
+import flatgeobuf as fgb
+from flatgeobuf.async_http_reader import AsyncHTTPReader
+from flatgeobuf.file_reader import FileReader
+from flatgeobuf.fsspec_source import FsspecRangeSource, fsspec
+from flatgeobuf.generic.feature import parse_properties
+from flatgeobuf.http_reader import HTTPReader
+from flatgeobuf.range_source import RangeSource
+
+EUROPE_BBOX = (-10.0, 35.0, 30.0, 60.0)
+
+
+class BytesRangeSource:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.requests_ever_made = 0
+
+    def get_range(self, begin: int, length: int, purpose: str) -> bytes:
+        self.requests_ever_made += 1
+        return self.data[begin : begin + length]
+
+    def size(self) -> int:
+        return len(self.data)
+
+
+class TestRangeSource(TestCase):
+    def setUp(self):
+        with open("tests/data/countries.fgb", "rb") as f:
+            self.data = f.read()
+            reader = FileReader.load(f)
+            self.expected = self.select_ids(reader)
+
+    def select_ids(self, reader):
+        return [
+            parse_properties(feature, reader.header.columns)["id"]
+            for feature, _ in reader.select_bboxes([EUROPE_BBOX])
+        ]
+
+    def select_ids_async(self, source):
+        async def select_ids():
+            reader = await AsyncHTTPReader.open(source)
+            return [
+                parse_properties(feature, reader.header.columns)["id"]
+                async for feature, _ in reader.select_bboxes([EUROPE_BBOX])
+            ]
+
+        return asyncio.run(select_ids())
+
+    def test_readers(self):
+        source = BytesRangeSource(self.data)
+        self.assertIsInstance(source, RangeSource)
+
+        self.assertListEqual(self.select_ids(FileReader.load(source)), self.expected)
+        self.assertListEqual(self.select_ids(HTTPReader.open(source)), self.expected)
+        self.assertListEqual(self.select_ids_async(source), self.expected)
+        self.assertGreater(source.requests_ever_made, 0)
+
+    def test_load(self):
+        # Loaded like a file, rather than through the HTTP readers
+        with open("tests/data/countries.fgb", "rb") as f:
+            expected = fgb.load(f, bbox=EUROPE_BBOX)
+        source = BytesRangeSource(self.data)
+        self.assertEqual(fgb.load(source, bbox=EUROPE_BBOX), expected)
+        self.assertEqual(len(fgb.load(source)["features"]), 179)
+
+    def test_unknown_source(self):
+        with self.assertRaises(ValueError):
+            FileReader.load(object())
+
+    @skipIf(fsspec is None, "fsspec is not installed")
+    def test_fsspec(self):
+        fs = fsspec.filesystem("memory")
+        fs.pipe_file("/countries.fgb", self.data)
+        try:
+            source = FsspecRangeSource.open("memory://countries.fgb")
+            self.assertEqual(source.size(), len(self.data))
+            self.assertListEqual(
+                self.select_ids(HTTPReader.open(source)), self.expected
+            )
+            self.assertListEqual(
+                self.select_ids(FileReader.load(source)), self.expected
+            )
+            self.assertListEqual(self.select_ids_async(source), self.expected)
+        finally:
+            fs.rm("/countries.fgb")
+
+    @skipIf(fsspec is None, "fsspec is not installed")
+    def test_fsspec_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = FsspecRangeSource.open(
+                "simplecache::file://" + os.path.abspath("tests/data/countries.fgb"),
+                simplecache={"cache_storage": directory},
+            )
+            self.assertListEqual(
+                self.select_ids(HTTPReader.open(source)), self.expected
+            )
+            self.assertGreater(len(os.listdir(directory)), 0)
@@ -0,0 +1,81 @@
+import asyncio
+from unittest import TestCase
+
+from range_server import RangeServer
+
+from flatgeobuf.async_http_reader import AsyncHTTPReader
+from flatgeobuf.config import Config
+from flatgeobuf.http_reader import HTTPReader
+from flatgeobuf.reader_state import ReaderStateCache
+
+EUROPE_BBOX = (-10.0, 35.0, 30.0, 60.0)
+
+
+class TestReaderState(TestCase):
+    def setUp(self):
+        config = Config.global_instance
+        self.max_entries = config.reader_state_cache_max_entries()
+        self.ttl = config.reader_state_ttl()
+        config.set_reader_state_cache_max_entries(128)
+        ReaderStateCache.global_instance.clear()
+
+    def tearDown(self):
+        config = Config.global_instance
+        config.set_reader_state_cache_max_entries(self.max_entries)
+        config.set_reader_state_ttl(self.ttl)
+        ReaderStateCache.global_instance.clear()
+
+    def test_reopen(self):
+        with RangeServer() as server:
+            reader = HTTPReader.open(server.url("countries.fgb"))
+            count = reader.count(EUROPE_BBOX)
+            requests = server.requests
+
+            reader = HTTPReader.open(server.url("countries.fgb"))
+            self.assertEqual(server.requests, requests)
+            self.assertEqual(reader.header.features_count, 179)
+            self.assertEqual(reader.count(EUROPE_BBOX), count)
+            # Each reader has a header of its own
+            reader.header.title = "changed"
+            reopened = HTTPReader.open(server.url("countries.fgb"))
+            self.assertIsNot(reopened.header, reader.header)
+            self.assertNotEqual(reopened.header.title, "changed")
+
+            # Shared with the async reader
+            async def open_async():
+                return await AsyncHTTPReader.open(server.url("countries.fgb"))
+
+            requests = server.requests
+            reader = asyncio.run(open_async())
+            self.assertEqual(server.requests, requests)
+            self.assertEqual(reader.header.features_count, 179)
+
+    def test_ttl(self):
+        Config.global_instance.set_reader_state_ttl(0)
+        with RangeServer() as server:
+            HTTPReader.open(server.url("countries.fgb"))
+            requests = server.requests
+            HTTPReader.open(server.url("countries.fgb"))
+            self.assertGreater(server.requests, requests)
+
+    def test_max_entries(self):
+        Config.global_instance.set_reader_state_cache_max_entries(1)
+        with RangeServer() as server:
+            HTTPReader.open(server.url("countries.fgb"))
+            # Another URL for the same file
+            HTTPReader.open(server.url("countries.fgb?copy"))
+            requests = server.requests
+
+            HTTPReader.open(server.url("countries.fgb?copy"))
+            self.assertEqual(server.requests, requests)
+            HTTPReader.open(server.url("countries.fgb"))
+            self.assertGreater(server.requests, requests)
+
+        Config.global_instance.set_reader_state_cache_max_entries(0)
+        ReaderStateCache.global_instance.clear()
+        with RangeServer() as server:
+            HTTPReader.open(server.url("countries.fgb"))
+            self.assertDictEqual(dict(ReaderStateCache.global_instance.entries), {})
+
+    def test_disabled_by_default(self):
+        self.assertEqual(Config().reader_state_cache_max_entries(), 0)
@@ -0,0 +1,147 @@
+import asyncio
+import socket
+import time
+import urllib.error
+from unittest import TestCase
+
+from range_server import RangeServer
+
+from flatgeobuf.config import Config
+from flatgeobuf.fetch_ahead import shared_executor
+from flatgeobuf.http_pool import HttpConnectionPool
+from flatgeobuf.http_range_client import HttpRangeClient
+from flatgeobuf.request_policy import (
+    HEDGE_MIN_SAMPLES,
+    RequestStats,
+    hedge_executor,
+    is_transient,
+)
+
+SLOW = 1.0
+
+
+class TestRequestPolicy(TestCase):
+    def setUp(self):
+        config = Config.global_instance
+        self.timeout = config.http_timeout()
+        self.retries = config.http_retries()
+        self.backoff = config.http_retry_backoff()
+        self.hedge_percentile = config.http_hedge_percentile()
+        config.set_http_retry_backoff(0.001)
+
+        with open("tests/data/countries.fgb", "rb") as f:
+            self.data = f.read()
+
+    def tearDown(self):
+        config = Config.global_instance
+        config.set_http_timeout(self.timeout)
+        config.set_http_retries(self.retries)
+        config.set_http_retry_backoff(self.backoff)
+        config.set_http_hedge_percentile(self.hedge_percentile)
+
+    def test_percentiles(self):
+        stats = RequestStats()
+        self.assertIsNone(stats.p50())
+        for latency in range(100, 0, -1):
+            stats.record(latency)
+        self.assertEqual(stats.p50(), 50)
+        self.assertEqual(stats.p99(), 99)
+        self.assertEqual(stats.percentile(100), 100)
+
+    def test_transient(self):
+        def http_error(code: int) -> urllib.error.HTTPError:
+            return urllib.error.HTTPError("", code, "", {}, None)
+
+        self.assertTrue(is_transient(http_error(503)))
+        self.assertTrue(is_transient(http_error(429)))
+        self.assertFalse(is_transient(http_error(404)))
+        self.assertTrue(is_transient(urllib.error.URLError(socket.timeout())))
+        self.assertTrue(is_transient(ConnectionResetError()))
+        self.assertTrue(is_transient(asyncio.TimeoutError()))
+        # Retrying won't bring up a server or resolve a host
+        self.assertFalse(is_transient(urllib.error.URLError(ConnectionRefusedError())))
+        self.assertFalse(is_transient(urllib.error.URLError(socket.gaierror())))
+        self.assertFalse(is_transient(urllib.error.URLError("unknown url type")))
+
+    def test_retry(self):
+        with RangeServer() as server:
+            server.errors = [503, 502]
+            client = HttpRangeClient(server.url("countries.fgb"))
+            self.assertEqual(client.get_range(0, 100, "test"), self.data[:100])
+            self.assertEqual(server.requests, 3)
+            self.assertEqual(client.stats.retries, 2)
+
+            # Until the retries run out
+            Config.global_instance.set_http_retries(1)
+            server.errors = [503, 503]
+            client = HttpRangeClient(server.url("countries.fgb"))
+            with self.assertRaises(urllib.error.HTTPError):
+                client.get_range(0, 100, "test")
+
+            # Errors that won't go away are not retried
+            server.errors = [404]
+            requests = server.requests
+            with self.assertRaises(urllib.error.HTTPError):
+                client.get_range(0, 100, "test")
+            self.assertEqual(server.requests, requests + 1)
+
+    def test_retry_async(self):
+        async def get_range(client):
+            client.pool = HttpConnectionPool()
+            return await client.get_range_async(0, 100, "test")
+
+        with RangeServer() as server:
+            server.errors = [503, 502]
+            client = HttpRangeClient(server.url("countries.fgb"))
+            self.assertEqual(asyncio.run(get_range(client)), self.data[:100])
+            self.assertEqual(client.stats.retries, 2)
+
+    def test_timeout(self):
+        Config.global_instance.set_http_timeout(0.2)
+        with RangeServer() as server:
+            server.delays = [SLOW]
+            client = HttpRangeClient(server.url("countries.fgb"))
+            start = time.perf_counter()
+            self.assertEqual(client.get_range(0, 100, "test"), self.data[:100])
+            self.assertLess(time.perf_counter() - start, SLOW)
+            self.assertEqual(client.stats.retries, 1)
+
+    def test_hedge(self):
+        Config.global_instance.set_http_hedge_percentile(90)
+        with RangeServer() as server:
+            client = HttpRangeClient(server.url("countries.fgb"))
+            for _ in range(HEDGE_MIN_SAMPLES):
+                client.get_range(0, 100, "test")
+            self.assertEqual(client.stats.hedges, 0)
+
+            # The duplicate of the slow request answers first
+            server.delays = [SLOW]
+            start = time.perf_counter()
+            self.assertEqual(client.get_range(100, 100, "test"), self.data[100:200])
+            self.assertLess(time.perf_counter() - start, SLOW / 2)
+            self.assertEqual(client.stats.hedges, 1)
+            self.assertLess(client.stats.p50(), SLOW / 2)
+
+        # Hedges share a pool, apart from the one fetches run on
+        executor = hedge_executor(2)
+        self.assertIs(hedge_executor(2), executor)
+        self.assertIsNot(shared_executor(2), executor)
+
+    def test_hedge_async(self):
+        Config.global_instance.set_http_hedge_percentile(90)
+
+        async def run(client):
+            client.pool = HttpConnectionPool()
+            for _ in range(HEDGE_MIN_SAMPLES):
+                await client.get_range_async(0, 100, "test")
+            server.delays = [SLOW]
+            start = time.perf_counter()
+            data = await client.get_range_async(100, 100, "test")
+            return data, time.perf_counter() - start
+
+        with RangeServer() as server:
+            client = HttpRangeClient(server.url("countries.fgb"))
+            data, elapsed = asyncio.run(run(client))
+            self.assertEqual(data, self.data[100:200])
+            self.assertLess(elapsed, SLOW / 2)
+            self.assertEqual(client.stats.hedges, 1)
@@ -0,0 +1,75 @@
+from unittest import TestCase
+
+from flatgeobuf.file_reader import FileReader
+from flatgeobuf.packedrtree import NODE_ITEM_BYTE_LEN, PackedRTree
+from flatgeobuf.spatial_index import SpatialIndex
+
+RECTS = [
+    (-26.5699, 63.1191, -12.1087, 67.0137),
+    (0.0, 0.0, 10.0, 10.0),
+    (-180.0, -90.0, 180.0, 90.0),
+]
+
+
+class TestSpatialIndex(TestCase):
+    def setUp(self):
+        self.file = open("tests/data/countries.fgb", "rb")
+        self.reader = FileReader.load(self.file)
+        self.reads = 0
+
+    def tearDown(self):
+        self.file.close()
+
+    def read_node(self, offset_into_tree: int, size: int) -> bytes:
+        self.reads += 1
+        return self.reader.read_node(offset_into_tree, size)
+
+    def test_load(self):
+        header = self.reader.header
+        index = SpatialIndex(header.features_count, header.index_node_size)
+        index.load(self.read_node)
+
+        self.assertTrue(index.is_loaded())
+        self.assertEqual(index.memory_usage(), self.reader.index_length)
+        self.assertEqual(self.reads, 1)
+
+        for rect in RECTS:
+            expected = list(
+                PackedRTree(
+                    header.features_count, header.index_node_size, rect
+                ).stream_search(self.reader.read_node)
+            )
+            self.assertListEqual(list(index.stream_search(rect)), expected)
+
+        self.assertEqual(self.reads, 1)
+
+    def test_lazy(self):
+        header = self.reader.header
+        index = SpatialIndex(header.features_count, header.index_node_size)
+        self.assertEqual(index.memory_usage(), 0)
+
+        rect = RECTS[0]
+        results = list(index.stream_search(rect, self.read_node))
+        self.assertEqual(self.reads, len(index.level_bounds))
+        self.assertTrue(index.is_loaded())
+
+        self.assertListEqual(list(index.stream_search(rect, self.read_node)), results)
+        self.assertEqual(self.reads, len(index.level_bounds))
+
+    def test_lazy_top_level_only(self):
+        header = self.reader.header
+        index = SpatialIndex(header.features_count, header.index_node_size)
+        root_level = len(index.level_bounds) - 1
+        index.load_level(root_level, self.read_node)
+
+        self.assertFalse(index.is_loaded())
+        self.assertEqual(index.memory_usage(), NODE_ITEM_BYTE_LEN)
+        with self.assertRaises(ValueError):
+            list(index.stream_search(RECTS[0]))
+
+    def test_reader_index(self):
+        index = self.reader.load_index()
+        self.assertIs(self.reader.index, index)
+
+        features = list(self.reader.select_bbox(RECTS[0]))
+        self.assertEqual(len(features), 3)
@@ -0,0 +1,64 @@
+from unittest import TestCase
+
+import numpy as np
+
+from flatgeobuf import spatial_join as spatial_join_module
+from flatgeobuf.file_reader import FileReader
+from flatgeobuf.generic.feature import parse_properties
+from flatgeobuf.spatial_join import spatial_join, spatial_join_features
+
+WORLD_BBOX = (-180.0, -90.0, 180.0, 90.0)
+
+
+class TestSpatialJoin(TestCase):
+    def setUp(self):
+        self.left_file = open("tests/data/countries.fgb", "rb")
+        self.right_file = open("tests/data/countries.fgb", "rb")
+        self.left = FileReader.load(self.left_file)
+        self.right = FileReader.load(self.right_file)
+
+    def tearDown(self):
+        self.left_file.close()
+        self.right_file.close()
+
+    def brute_force(self):
+        hits = self.left.select_index(WORLD_BBOX)
+        bboxes = hits.bboxes
+        idxs = hits.feature_idxs
+        intersecting = ~(
+            (bboxes[:, None, 2] < bboxes[None, :, 0])
+            | (bboxes[:, None, 3] < bboxes[None, :, 1])
+            | (bboxes[:, None, 0] > bboxes[None, :, 2])
+            | (bboxes[:, None, 1] > bboxes[None, :, 3])
+        )
+        left, right = np.nonzero(intersecting)
+        return set(zip(idxs[left].tolist(), idxs[right].tolist()))
+
+    def test_spatial_join(self):
+        pairs = list(spatial_join(self.left, self.right))
+        self.assertEqual(len(pairs), len(set(pairs)))
+        self.assertSetEqual(set(pairs), self.brute_force())
+
+    def test_spatial_join_small_chunks(self):
+        chunk_size = spatial_join_module.JOIN_CHUNK_SIZE
+        spatial_join_module.JOIN_CHUNK_SIZE = 3
+        try:
+            pairs = list(spatial_join(self.left, self.right))
+        finally:
+            spatial_join_module.JOIN_CHUNK_SIZE = chunk_size
+        self.assertEqual(len(pairs), len(set(pairs)))
+        self.assertSetEqual(set(pairs), self.brute_force())
+
+    def test_spatial_join_features(self):
+        columns = self.left.header.columns
+        pairs = {
+            (
+                parse_properties(left, columns)["id"],
+                parse_properties(right, columns)["id"],
+            )
+            for left, right in spatial_join_features(self.left, self.right)
+        }
+        self.assertEqual(len(pairs), len(self.brute_force()))
+        self.assertIn(("ESP", "PRT"), pairs)
+        self.assertIn(("ISL", "ISL"), pairs)
+        self.assertNotIn(("ISL", "AUS"), pairs)
@@ -0,0 +1,94 @@
+import asyncio
+from unittest import TestCase
+
+from flatgeobuf.async_http_reader import AsyncHTTPReader
+from flatgeobuf.file_reader import FileReader
+from flatgeobuf.generic.feature import parse_properties
+from flatgeobuf.tile_source import ORIGIN_SHIFT, TileSource, tile_bbox, tile_bounds
+
+
+class BytesRangeSource:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def get_range(self, begin: int, length: int, purpose: str) -> bytes:
+        return self.data[begin : begin + length]
+
+    def size(self) -> int:
+        return len(self.data)
+
+
+class TestTileSource(TestCase):
+    def setUp(self):
+        self.file = open("tests/data/countries.fgb", "rb")
+        self.reader = FileReader.load(self.file)
+
+    def tearDown(self):
+        self.file.close()
+
+    def ids(self, features) -> list:
+        return sorted(
+            parse_properties(f, self.reader.header.columns)["id"] for f in features
+        )
+
+    def test_tile_bbox(self):
+        self.assertEqual(tile_bounds(1, 0, 0), (-ORIGIN_SHIFT, 0.0, 0.0, ORIGIN_SHIFT))
+        min_lon, min_lat, max_lon, max_lat = tile_bbox(0, 0, 0)
+        self.assertAlmostEqual(min_lon, -180.0)
+        self.assertAlmostEqual(max_lon, 180.0)
+        self.assertAlmostEqual(min_lat, -85.0511287798)
+        self.assertAlmostEqual(max_lat, 85.0511287798)
+
+        # A buffer of half a tile on each side doubles the width
+        min_x, _, max_x, _ = tile_bounds(2, 1, 1, buffer=0.5)
+        self.assertAlmostEqual(max_x - min_x, ORIGIN_SHIFT)
+
+        with self.assertRaises(ValueError):
+            tile_bbox(1, 2, 0)
+
+    def test_get_tile(self):
+        source = TileSource(self.reader, cache_size=2)
+        # Iceland and its neighbours
+        tile = (3, 3, 1)
+        expected = self.ids(self.reader.select_bbox(tile_bbox(*tile)))
+        self.assertIn("ISL", expected)
+
+        self.assertListEqual(self.ids(source.get_tile(*tile)), expected)
+        self.assertListEqual(self.ids(source.get_tile(*tile)), expected)
+        self.assertEqual(source.stats.hits, 1)
+        self.assertEqual(source.stats.misses, 1)
+        self.assertAlmostEqual(source.stats.hit_rate(), 0.5)
+        self.assertEqual(len(source.stats.recent), 2)
+
+        # Least recently used tiles are evicted
+        source.get_tile(0, 0, 0)
+        source.get_tile(1, 0, 0)
+        self.assertNotIn(tile, source.cache)
+        self.assertEqual(len(source.cache), 2)
+
+    def test_buffer(self):
+        tile = (4, 7, 5)
+        ids = self.ids(TileSource(self.reader).get_tile(*tile))
+        buffered = self.ids(TileSource(self.reader, buffer=0.5).get_tile(*tile))
+        self.assertTrue(set(ids) < set(buffered))
+
+    def test_get_tile_async(self):
+        tiles = [(3, 3, 1), (4, 7, 5), (0, 0, 0)]
+        expected = [self.ids(TileSource(self.reader).get_tile(*t)) for t in tiles]
+
+        async def get_tiles():
+            with open("tests/data/countries.fgb", "rb") as f:
+                source = BytesRangeSource(f.read())
+            source = TileSource(await AsyncHTTPReader.open(source))
+            results = [await source.get_tile_async(*t) for t in tiles]
+            results.append(await source.get_tile_async(*tiles[0]))
+            return source, results
+
+        source, results = asyncio.run(get_tiles())
+        self.assertListEqual([self.ids(r) for r in results], expected + expected[:1])
+        self.assertEqual(source.stats.hits, 1)
+        self.assertTrue(
+            all(
+                source.index.levels[level] is not None for level in source.cached_levels
+            )
+        )
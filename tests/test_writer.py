@@ -0,0 +1,248 @@
+import json
+from io import BytesIO
+from unittest import TestCase
+
+import numpy as np
+
+import flatgeobuf as fgb
+from flatgeobuf.column_meta import ColumnMeta
+from flatgeobuf.constants import magicbytes
+from flatgeobuf.file_reader import FileReader
+from flatgeobuf.FlatGeobuf.ColumnType import ColumnType
+from flatgeobuf.FlatGeobuf.GeometryType import GeometryType
+from flatgeobuf import external_sort
+from flatgeobuf.generic import Writer, serialize
+from flatgeobuf.generic.feature import parse_properties
+from flatgeobuf.geojson.featurecollection import parse_feature_geometry
+from flatgeobuf.header_meta import HeaderMeta, from_byte_buffer
+from flatgeobuf.packedrtree import build_tree, generate_level_bounds
+
+ISL_BBOX = (-26.5699, 63.1191, -12.1087, 67.0137)
+
+
+class TestWriter(TestCase):
+    def setUp(self):
+        with open("tests/data/countries.geojson") as f:
+            self.feature_collection = json.load(f)
+
+    def test_roundtrip(self):
+        data = fgb.dumps(self.feature_collection)
+        reader = FileReader.load(BytesIO(data))
+
+        self.assertEqual(reader.header.features_count, 179)
+        self.assertEqual(reader.header.index_node_size, 16)
+        self.assertEqual(reader.header.geometry_type, GeometryType.MultiPolygon)
+        self.assertEqual(reader.header.envelope[0], -180.0)
+
+        ids = [
+            parse_properties(f, reader.header.columns)["id"]
+            for f in reader.select_bbox(ISL_BBOX)
+        ]
+        self.assertListEqual(ids, ["RUS", "ISL", "GRL"])
+
+        with open("tests/data/countries.fgb", "rb") as f:
+            expected = fgb.load(f)
+        self.assertEqual(fgb.load(BytesIO(data)), expected)
+
+    def test_mixed_geometries(self):
+        features = [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [1.0, 2.0, 3.0]},
+                "properties": {"n": 1, "x": 0.5, "b": True, "tags": ["a"]},
+            },
+            {
+                "type": "Feature",
+                "geometry": {
+                    "type": "Polygon",
+                    "coordinates": [
+                        [[0, 0], [4, 0], [4, 4], [0, 4], [0, 0]],
+                        [[1, 1], [2, 1], [2, 2], [1, 1]],
+                    ],
+                },
+                "properties": {"n": 2, "x": None, "b": False, "tags": {"k": 1}},
+            },
+        ]
+
+        data = fgb.dumps({"type": "FeatureCollection", "features": features})
+        reader = FileReader.load(BytesIO(data))
+        self.assertEqual(reader.header.geometry_type, GeometryType.Unknown)
+        self.assertTrue(reader.header.has_z)
+
+        results = {f["properties"]["n"]: f for f in fgb.load(BytesIO(data))["features"]}
+        self.assertEqual(results[1]["geometry"]["coordinates"], [1.0, 2.0, 3.0])
+        self.assertDictEqual(
+            results[1]["properties"], {"n": 1, "x": 0.5, "b": True, "tags": ["a"]}
+        )
+        self.assertEqual(
+            results[2]["geometry"]["coordinates"],
+            features[1]["geometry"]["coordinates"],
+        )
+        self.assertDictEqual(
+            results[2]["properties"], {"n": 2, "b": False, "tags": {"k": 1}}
+        )
+
+    def test_columns_from_all_features(self):
+        def load(properties: list) -> list:
+            features = [
+                {
+                    "type": "Feature",
+                    "geometry": {"type": "Point", "coordinates": [i, i]},
+                    "properties": p,
+                }
+                for i, p in enumerate(properties)
+            ]
+            data = fgb.dumps({"type": "FeatureCollection", "features": features})
+            self.columns = FileReader.load(BytesIO(data)).header.columns
+            results = fgb.load(BytesIO(data))["features"]
+            return [f["properties"] for f in results]
+
+        # Keys first seen in a later feature are kept
+        self.assertCountEqual(
+            load([{"a": 2}, {"a": 2, "b": "x"}]), [{"a": 2}, {"a": 2, "b": "x"}]
+        )
+
+        # None doesn't decide the type
+        self.assertCountEqual(load([{"a": None}, {"a": 3}]), [{}, {"a": 3}])
+        self.assertEqual(self.columns[0].type, ColumnType.Long)
+        load([{"a": None}])
+        self.assertEqual(self.columns[0].type, ColumnType.String)
+
+        # Ints are widened alongside floats
+        self.assertCountEqual(load([{"a": 1}, {"a": 1.5}]), [{"a": 1.0}, {"a": 1.5}])
+        self.assertEqual(self.columns[0].type, ColumnType.Double)
+
+        with self.assertRaises(ValueError):
+            load([{"a": "x"}, {"a": 1}])
+
+    def test_columns_from_first_feature(self):
+        # Features iterated once only are introspected from the first
+        def dumps(properties: list) -> bytes:
+            return fgb.dumps(
+                iter(
+                    {
+                        "type": "Feature",
+                        "geometry": {"type": "Point", "coordinates": [i, i]},
+                        "properties": p,
+                    }
+                    for i, p in enumerate(properties)
+                )
+            )
+
+        data = dumps([{"a": 1.5}, {"a": 1}, {}])
+        results = fgb.load(BytesIO(data))["features"]
+        self.assertEqual(len(results), 3)
+
+        for properties in [
+            [{"a": 1}, {"a": 1, "b": "x"}],
+            [{"a": None}, {"a": 3}],
+            [{"a": 1}, {"a": 1.5}],
+        ]:
+            with self.assertRaises(ValueError):
+                dumps(properties)
+
+    def test_full_precision(self):
+        ring = [
+            [0.123456789012345, 1e-9],
+            [10.000000000000002, 0.987654321098765],
+            [10.0, 10.333333333333334],
+            [0.123456789012345, 1e-9],
+        ]
+        geometries = [
+            {"type": "Polygon", "coordinates": [ring]},
+            {"type": "MultiPolygon", "coordinates": [[ring]]},
+            {
+                "type": "GeometryCollection",
+                "geometries": [{"type": "LineString", "coordinates": ring}],
+            },
+        ]
+        features = [
+            {"type": "Feature", "geometry": geometry, "properties": None}
+            for geometry in geometries
+        ]
+
+        data = fgb.dumps({"type": "FeatureCollection", "features": features})
+        reader = FileReader.load(BytesIO(data))
+        expected = [c for coordinate in ring for c in coordinate]
+        for feature in reader.select_all():
+            geometry = feature.Geometry()
+            if geometry.PartsLength() > 0:
+                geometry = geometry.Parts(0)
+            self.assertListEqual(geometry.XyAsNumpy().tolist(), expected)
+
+    def test_external_sort(self):
+        expected = fgb.dumps(self.feature_collection)
+
+        fan_in = external_sort.MERGE_FAN_IN
+        external_sort.MERGE_FAN_IN = 3
+        try:
+            for memory_budget in (1, 20000):
+                data = fgb.dumps(self.feature_collection, memory_budget=memory_budget)
+                self.assertEqual(data, expected)
+        finally:
+            external_sort.MERGE_FAN_IN = fan_in
+
+    def test_external_sort_known_envelope(self):
+        header_meta = FileReader.load(
+            BytesIO(fgb.dumps(self.feature_collection))
+        ).header
+        features = [
+            (parse_feature_geometry(feature), feature["properties"])
+            for feature in self.feature_collection["features"]
+        ]
+
+        output = BytesIO()
+        with Writer(output, header_meta, memory_budget=20000) as writer:
+            for geometry, properties in features:
+                writer.write(geometry, properties)
+
+        self.assertEqual(writer.stats.features_count, 179)
+        self.assertGreater(writer.stats.runs, 1)
+        self.assertGreater(writer.stats.features_per_second(), 0)
+        self.assertEqual(output.getvalue(), fgb.dumps(self.feature_collection))
+
+    def test_external_sort_larger_envelope(self):
+        header_meta = FileReader.load(
+            BytesIO(fgb.dumps(self.feature_collection))
+        ).header
+        header_meta.envelope = [-360.0, -180.0, 360.0, 180.0]
+        features = [
+            (parse_feature_geometry(feature), feature["properties"])
+            for feature in self.feature_collection["features"]
+        ]
+
+        expected = serialize(features, header_meta)
+        data = serialize(features, header_meta, memory_budget=20000)
+        self.assertEqual(data, expected)
+        # Sorted along the given extent, but with the actual bounds
+        header = FileReader.load(BytesIO(data)).header
+        self.assertEqual(header.envelope[0], -180.0)
+
+    def test_empty(self):
+        data = fgb.dumps({"type": "FeatureCollection", "features": []})
+        self.assertEqual(data[:8], magicbytes)
+        header = from_byte_buffer(data[12:])
+        self.assertEqual(header.features_count, 0)
+        self.assertEqual(header.index_node_size, 0)
+        self.assertEqual(len(data), 12 + int.from_bytes(data[8:12], "little"))
+        self.assertListEqual(list(FileReader.load(BytesIO(data)).select_all()), [])
+
+    def test_build_tree(self):
+        rng = np.random.default_rng(0)
+        mins = rng.uniform(0, 100, (100, 2))
+        bboxes = np.hstack([mins, mins + 1])
+        offsets = np.arange(100) * 10
+        nodes = build_tree(bboxes, offsets, 4)
+
+        level_bounds = generate_level_bounds(100, 4)
+        root = nodes[0]
+        self.assertEqual(root["min_x"], bboxes[:, 0].min())
+        self.assertEqual(root["max_y"], bboxes[:, 3].max())
+        for (start, end), (parent_start, parent_end) in zip(
+            level_bounds, level_bounds[1:]
+        ):
+            for i, parent in enumerate(nodes[parent_start:parent_end]):
+                self.assertEqual(parent["offset"], start + i * 4)
+        self.assertListEqual(
+            nodes[level_bounds[0][0] :]["offset"].tolist(), offsets.tolist()
+        )